@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Back-translate a monolingual corpus into synthetic parallel shards."""
+
+from __future__ import unicode_literals
+
+import codecs
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import yaml
+
+from onmt.utils.logging import init_logger
+from onmt.utils.misc import split_corpus
+from onmt.translate.translator import build_translator
+from onmt.translate.translation_server import TranslatorReplicas
+
+import onmt.opts as opts
+from onmt.utils.parse import ArgumentParser
+
+MANIFEST = "corpora.yaml"
+# manifest entry of the settings each corpus was back-translated with
+SETTINGS = "settings"
+
+
+def shard_paths(bt_dir, name, i):
+    """Paths of the synthetic source and monolingual target of shard `i`."""
+    prefix = os.path.join(os.path.abspath(bt_dir), "%s.%05d" % (name, i))
+    return prefix + ".src", prefix + ".tgt"
+
+
+def _load_manifest(bt_dir):
+    manifest = os.path.join(bt_dir, MANIFEST)
+    if not os.path.exists(manifest):
+        return {}
+    with open(manifest) as f:
+        return yaml.safe_load(f) or {}
+
+
+def _save_manifest(bt_dir, corpora):
+    manifest = os.path.join(bt_dir, MANIFEST)
+    with open(manifest + ".tmp", "w") as f:
+        yaml.safe_dump(corpora, f, default_flow_style=False)
+    os.replace(manifest + ".tmp", manifest)
+
+
+def check_settings(bt_dir, name, src, shard_size):
+    """Record the source and shard size `name` is back-translated with,
+    or check they match the ones of its existing shards.
+
+    Shards are only identified by their index, so resuming from another
+    source or shard size would mix unrelated shards.
+
+    Raises:
+        ValueError: `name` has shards back-translated differently.
+    """
+    corpora = _load_manifest(bt_dir)
+    settings = {"src": os.path.abspath(src),
+                "src_size": os.path.getsize(src),
+                "shard_size": shard_size}
+    recorded = corpora.get(SETTINGS, {}).get(name, None)
+    if recorded is None:
+        if any(os.path.exists(path)
+               for path in shard_paths(bt_dir, name, 0)):
+            raise ValueError(
+                "Shards of %s in %s have no recorded settings, remove "
+                "them to back-translate again." % (name, bt_dir))
+    elif recorded != settings:
+        raise ValueError(
+            "Shards of %s in %s were back-translated with %s, not %s. "
+            "Use another -bt_name or -bt_dir, or remove them."
+            % (name, bt_dir, recorded, settings))
+    corpora.setdefault(SETTINGS, {})[name] = settings
+    _save_manifest(bt_dir, corpora)
+
+
+def register_shard(bt_dir, name, i):
+    """Add shard `i` of `name` to the corpora manifest of `bt_dir`.
+
+    The manifest maps corpus ids to ``path_src`` and ``path_tgt`` as the
+    ``-data`` option does, next to the ``settings`` of each
+    back-translated corpus. A ``-data`` corpus with ``path_corpora`` set
+    to it stands for all the corpora it lists.
+    """
+    corpora = _load_manifest(bt_dir)
+    path_src, path_tgt = shard_paths(bt_dir, name, i)
+    corpora["%s_%05d" % (name, i)] = {
+        "path_src": path_src, "path_tgt": path_tgt}
+    _save_manifest(bt_dir, corpora)
+
+
+def write_shard(path_src, path_tgt, mono_shard, predictions):
+    """Write aligned (prediction, monolingual) pairs, one per prediction.
+
+    Both files are written aside and renamed, the target last, so that an
+    existing target file marks a complete shard.
+    """
+    with codecs.open(path_src + ".tmp", "w", "utf-8") as src_file, \
+            codecs.open(path_tgt + ".tmp", "w", "utf-8") as tgt_file:
+        for line, n_best_preds in zip(mono_shard, predictions):
+            line = line.decode("utf-8").strip()
+            for pred in n_best_preds:
+                if not line or not pred.strip():
+                    continue
+                src_file.write(pred + "\n")
+                tgt_file.write(line + "\n")
+    os.replace(path_src + ".tmp", path_src)
+    os.replace(path_tgt + ".tmp", path_tgt)
+
+
+def backtranslate(opt):
+    ArgumentParser.validate_translate_opts(opt)
+    ArgumentParser.validate_backtranslate_opts(opt)
+    logger = init_logger(opt.log_file)
+
+    name = opt.bt_name or os.path.basename(opt.src)
+    os.makedirs(opt.bt_dir, exist_ok=True)
+    check_settings(opt.bt_dir, name, opt.src, opt.shard_size)
+    translator = build_translator(
+        opt, logger=logger, report_score=False,
+        out_file=codecs.open(os.devnull, "w", "utf-8"))
+    replicas = TranslatorReplicas(translator, opt.num_workers) \
+        if opt.num_workers > 1 else None
+
+    try:
+        with ThreadPoolExecutor(max_workers=opt.num_workers) as executor:
+            for i, mono_shard in enumerate(
+                    split_corpus(opt.src, opt.shard_size)):
+                path_src, path_tgt = shard_paths(opt.bt_dir, name, i)
+                if os.path.exists(path_src) and os.path.exists(path_tgt):
+                    logger.info("Shard %d already back-translated." % i)
+                    register_shard(opt.bt_dir, name, i)
+                    continue
+                logger.info("Back-translating shard %d." % i)
+                if replicas is None:
+                    _, predictions = translator.translate(
+                        mono_shard,
+                        batch_size=opt.batch_size,
+                        batch_type=opt.batch_type)
+                else:
+                    chunk_size = max(
+                        1, -(-len(mono_shard) // opt.num_workers))
+                    futures = [
+                        executor.submit(
+                            replicas.translate,
+                            mono_shard[j:j + chunk_size],
+                            batch_size=opt.batch_size,
+                            batch_type=opt.batch_type)
+                        for j in range(0, len(mono_shard), chunk_size)]
+                    predictions = [
+                        n_best_preds for future in futures
+                        for n_best_preds in future.result()[1]]
+                write_shard(path_src, path_tgt, mono_shard, predictions)
+                register_shard(opt.bt_dir, name, i)
+    finally:
+        if replicas is not None:
+            replicas.close()
+
+
+def _get_parser():
+    parser = ArgumentParser(description='backtranslate.py')
+
+    opts.config_opts(parser)
+    opts.translate_opts(parser)
+    opts.backtranslate_opts(parser)
+    return parser
+
+
+def main():
+    parser = _get_parser()
+
+    opt = parser.parse_args()
+    backtranslate(opt)
+
+
+if __name__ == "__main__":
+    main()
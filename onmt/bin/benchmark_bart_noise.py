@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Compare the throughput of per example and batched BART noising.
+
+The lines of ``-src`` are noised by bucket of ``-bucket_size`` examples,
+with the ``bart`` transform applied on each example, then on the whole
+bucket at once. The vocabulary of random tokens is the one of ``-src``.
+"""
+
+import codecs
+import time
+from argparse import Namespace
+
+from onmt.utils.logging import init_logger
+from onmt.transforms.bart import BARTNoiseTransform
+
+import onmt.opts as opts
+from onmt.utils.parse import ArgumentParser
+
+
+def benchmark_noise(transform, examples, bucket_size, batched=False):
+    """Noise `examples` by bucket with `transform`.
+
+    Returns:
+        dict: ``ex/s`` and ``tok/s`` of the noised examples.
+    """
+    transform.warm_up(transform.vocabs)
+    n_tokens = 0
+    start_time = time.time()
+    for i in range(0, len(examples), bucket_size):
+        bucket = [{'src': list(tokens)}
+                  for tokens in examples[i:i + bucket_size]]
+        if batched:
+            bucket = transform.batch_apply(bucket, is_train=True)
+        else:
+            bucket = [transform.apply(example, is_train=True)
+                      for example in bucket]
+        n_tokens += sum(len(example['src']) for example in bucket)
+    total_time = time.time() - start_time
+    return {
+        "ex/s": len(examples) / total_time,
+        "tok/s": n_tokens / total_time,
+    }
+
+
+def benchmark(opt):
+    logger = init_logger()
+
+    with codecs.open(opt.src, "r", "utf-8") as f:
+        examples = [line.split() for line in f]
+    vocab = sorted(set(tok for tokens in examples for tok in tokens))
+    transform = BARTNoiseTransform(opt)
+    transform.warm_up({'src': Namespace(itos=vocab)})
+    logger.info("Noising %d examples with %r." % (
+        len(examples), transform.bart_noise))
+
+    all_results = []
+    for name, batched in [("per example", False), ("batched", True)]:
+        results = benchmark_noise(
+            transform, examples, opt.bucket_size, batched=batched)
+        all_results.append((name, results))
+        logger.info("%s: %s" % (name, ", ".join(
+            "%s %.2f" % item for item in results.items())))
+    logger.info("Speedup: %.2fx" % (
+        all_results[1][1]["ex/s"] / all_results[0][1]["ex/s"]))
+    return all_results
+
+
+def _get_parser():
+    parser = ArgumentParser(description='benchmark_bart_noise.py')
+
+    opts.config_opts(parser)
+    BARTNoiseTransform.add_options(parser)
+    group = parser.add_argument_group('Benchmark')
+    group.add('--src', '-src', required=True,
+              help="Tokenized text file to noise, one example per line.")
+    group.add('--src_subword_type', '-src_subword_type',
+              type=str, default='none',
+              choices=['none', 'sentencepiece', 'bpe'],
+              help="Type of subword of -src, used to find word starts.")
+    group.add('--bucket_size', '-bucket_size', type=int, default=2048,
+              help="Number of examples noised at once.")
+    group.add('--seed', '-seed', type=int, default=-1,
+              help="Set random seed used for better reproducibility "
+                   "between experiments.")
+    return parser
+
+
+def main():
+    parser = _get_parser()
+
+    opt = parser.parse_args()
+    benchmark(opt)
+
+
+if __name__ == "__main__":
+    main()
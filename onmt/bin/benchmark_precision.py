@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Compare inference precision profiles on a held-out file.
+
+For each profile of ``-profiles`` the model is loaded with ``-precision``
+set to it and ``-src`` is translated. Tokens per second, the size of the
+model weights, the peak memory allocated on GPU and, when ``-tgt``
+references are given, BLEU and its delta to the first profile are
+reported. Profiles which the device does not support are skipped.
+"""
+
+from __future__ import unicode_literals
+
+import codecs
+import copy
+import io
+import os
+import time
+
+import torch
+
+from onmt.utils.logging import init_logger
+from onmt.utils.misc import split_corpus
+from onmt.translate.translator import build_translator
+
+import onmt.opts as opts
+from onmt.utils.parse import ArgumentParser
+
+
+# precision profiles supported on each device, all by default
+PROFILES = {
+    "cpu": ["fp32", "int8", "int8_ffn", "int8_no_attn"],
+    "gpu": ["fp32", "fp16"],
+}
+
+
+def model_size(model):
+    """Size in bytes of the serialized weights of `model`, packed
+    quantized weights included."""
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell()
+
+
+def bleu(hyps, refs):
+    import sacrebleu
+    return sacrebleu.corpus_bleu(hyps, [refs]).score
+
+
+def benchmark_profile(opt, precision, src, refs=None):
+    """Translate `src` with the `precision` profile.
+
+    Returns:
+        dict: ``tok/s``, ``weights (MB)``, ``peak GPU memory (MB)`` on
+        GPU and ``bleu`` if `refs` are given.
+    """
+    opt = copy.copy(opt)
+    opt.precision = precision
+    if opt.gpu >= 0:
+        torch.cuda.reset_peak_memory_stats(opt.gpu)
+    translator = build_translator(
+        opt, report_score=False,
+        out_file=codecs.open(os.devnull, "w", "utf-8"))
+
+    start_time = time.time()
+    _, predictions = translator.translate(
+        src=src,
+        batch_size=opt.batch_size,
+        batch_type=opt.batch_type)
+    if opt.gpu >= 0:
+        torch.cuda.synchronize(opt.gpu)
+    total_time = time.time() - start_time
+
+    hyps = [n_best[0] for n_best in predictions]
+    n_tokens = sum(len(hyp.split()) for hyp in hyps)
+    results = {
+        "tok/s": n_tokens / total_time,
+        "weights (MB)": model_size(translator.model) / 2 ** 20,
+    }
+    if opt.gpu >= 0:
+        results["peak GPU memory (MB)"] = \
+            torch.cuda.max_memory_allocated(opt.gpu) / 2 ** 20
+    if refs is not None:
+        results["bleu"] = bleu(hyps, refs)
+    return results
+
+
+def benchmark(opt):
+    ArgumentParser.validate_translate_opts(opt)
+    logger = init_logger(opt.log_file)
+
+    src = next(split_corpus(opt.src, 0))
+    refs = None
+    if opt.tgt is not None:
+        with codecs.open(opt.tgt, "r", "utf-8") as f:
+            refs = [line.strip() for line in f]
+
+    device = "gpu" if opt.gpu >= 0 else "cpu"
+    profiles = opt.profiles
+    if profiles is None:
+        profiles = PROFILES[device]
+    unsupported = [p for p in profiles if p not in PROFILES[device]]
+    if unsupported:
+        logger.warning("Skipping profiles %s, not supported on %s." % (
+            ", ".join(unsupported), device.upper()))
+
+    all_results = []
+    for precision in profiles:
+        if precision in unsupported:
+            continue
+        logger.info("Benchmarking profile %s." % precision)
+        results = benchmark_profile(opt, precision, src, refs)
+        if refs is not None:
+            results["bleu delta"] = \
+                results["bleu"] - (all_results[0][1]["bleu"]
+                                   if all_results else results["bleu"])
+        all_results.append((precision, results))
+        logger.info("%s: %s" % (precision, ", ".join(
+            "%s %.2f" % item for item in results.items())))
+    return all_results
+
+
+def _get_parser():
+    parser = ArgumentParser(description='benchmark_precision.py')
+
+    opts.config_opts(parser)
+    opts.translate_opts(parser)
+    group = parser.add_argument_group('Benchmark')
+    group.add('--profiles', '-profiles', nargs='+', default=None,
+              choices=["fp32", "fp16", "int8", "int8_ffn", "int8_no_attn"],
+              help="Precision profiles to compare, by default the ones "
+                   "supported by the device: %s on CPU, %s on GPU. "
+                   "The BLEU delta is relative to the first one. -tgt "
+                   "is used as reference, BLEU needs sacrebleu." % (
+                       ", ".join(PROFILES["cpu"]),
+                       ", ".join(PROFILES["gpu"])))
+    return parser
+
+
+def main():
+    parser = _get_parser()
+
+    opt = parser.parse_args()
+    benchmark(opt)
+
+
+if __name__ == "__main__":
+    main()
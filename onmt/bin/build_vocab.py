@@ -4,7 +4,9 @@ from onmt.utils.logging import init_logger
 from onmt.utils.misc import set_random_seed, check_path
 from onmt.utils.parse import ArgumentParser
 from onmt.opts import dynamic_prepare_opts
-from onmt.inputters.corpus import build_vocab
+from onmt.constants import LangVocab
+from onmt.inputters.corpus import build_vocab, build_lang_vocabs
+from onmt.inputters.fields import get_lang_vocab_path
 from onmt.transforms import make_transforms, get_transforms_cls
 
 
@@ -18,11 +20,16 @@ def build_vocab_main(opts):
     <tok_0>\t<count_0>
     <tok_1>\t<count_1>
     ```
+    If `-src_vocab` contains `{lang}`, one vocabulary is saved per language
+    tag of the corpora instead, both sides of a corpus counting for their
+    own language.
     """
 
     ArgumentParser.validate_prepare_opts(opts, build_vocab_only=True)
     assert opts.n_sample == -1 or opts.n_sample > 1, \
         f"Illegal argument n_sample={opts.n_sample}."
+    assert opts.vocab_counter_size > 0 or not opts.merge_counts, \
+        "-merge_counts requires -vocab_counter_size."
 
     logger = init_logger()
     set_random_seed(opts.seed, False)
@@ -31,19 +38,27 @@ def build_vocab_main(opts):
 
     transforms = make_transforms(opts, transforms_cls, fields)
 
+    def save_counter(counter, save_path):
+        check_path(save_path, exist_ok=opts.overwrite, log=logger.warning)
+        with open(save_path, "w", encoding="utf8") as fo:
+            for tok, count in counter.most_common(opts.vocab_topk or None):
+                fo.write(tok + "\t" + str(count) + "\n")
+
     logger.info(f"Counter vocab from {opts.n_sample} samples.")
+    if LangVocab.PLACEHOLDER in opts.src_vocab:
+        lang_counters = build_lang_vocabs(
+            opts, transforms, n_sample=opts.n_sample)
+        for lang, counter in sorted(lang_counters.items()):
+            logger.info(f"Counters {lang}:{len(counter)}")
+            save_counter(counter, get_lang_vocab_path(opts.src_vocab, lang))
+        return
+
     src_counter, tgt_counter = build_vocab(
         opts, transforms, n_sample=opts.n_sample)
 
     logger.info(f"Counters src:{len(src_counter)}")
     logger.info(f"Counters tgt:{len(tgt_counter)}")
 
-    def save_counter(counter, save_path):
-        check_path(save_path, exist_ok=opts.overwrite, log=logger.warning)
-        with open(save_path, "w", encoding="utf8") as fo:
-            for tok, count in counter.most_common():
-                fo.write(tok + "\t" + str(count) + "\n")
-
     if opts.share_vocab:
         src_counter += tgt_counter
         tgt_counter = src_counter
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Score existing (src, tgt) pairs with a model, without decoding."""
+
+from __future__ import unicode_literals
+
+from onmt.utils.logging import init_logger
+from onmt.utils.misc import split_corpus
+from onmt.translate.translator import build_translator
+
+import onmt.opts as opts
+from onmt.utils.parse import ArgumentParser
+
+
+def score(opt):
+    ArgumentParser.validate_translate_opts(opt)
+    ArgumentParser.validate_score_opts(opt)
+    logger = init_logger(opt.log_file)
+
+    translator = build_translator(opt, logger=logger, report_score=True)
+    src_shards = split_corpus(opt.src, opt.shard_size)
+    tgt_shards = split_corpus(opt.tgt, opt.shard_size)
+    shard_pairs = zip(src_shards, tgt_shards)
+
+    for i, (src_shard, tgt_shard) in enumerate(shard_pairs):
+        logger.info("Scoring shard %d." % i)
+        translator.score(
+            src=src_shard,
+            tgt=tgt_shard,
+            batch_size=opt.batch_size,
+            batch_type=opt.batch_type,
+            token_scores=opt.token_scores
+            )
+
+
+def _get_parser():
+    parser = ArgumentParser(description='score.py')
+
+    opts.config_opts(parser)
+    opts.translate_opts(parser)
+    opts.score_opts(parser)
+    return parser
+
+
+def main():
+    parser = _get_parser()
+
+    opt = parser.parse_args()
+    score(opt)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,12 @@
 #!/usr/bin/env python
-import configargparse
-
 from flask import Flask, jsonify, request
 from waitress import serve
-from onmt.translate import TranslationServer, ServerModelError
+from onmt.translate import TranslationServer
+from onmt.translate.server_requests import STATUS_OK, STATUS_ERROR, \
+    clone_model_request, translate_request, get_server_parser
 import logging
 from logging.handlers import RotatingFileHandler
 
-STATUS_OK = "ok"
-STATUS_ERROR = "error"
-
 
 def start(config_file,
           url_root="./translator",
@@ -49,25 +46,8 @@ def start(config_file,
 
     @app.route('/clone_model/<int:model_id>', methods=['POST'])
     def clone_model(model_id):
-        out = {}
         data = request.get_json(force=True)
-        timeout = -1
-        if 'timeout' in data:
-            timeout = data['timeout']
-            del data['timeout']
-
-        opt = data.get('opt', None)
-        try:
-            model_id, load_time = translation_server.clone_model(
-                model_id, opt, timeout)
-        except ServerModelError as e:
-            out['status'] = STATUS_ERROR
-            out['error'] = str(e)
-        else:
-            out['status'] = STATUS_OK
-            out['model_id'] = model_id
-            out['load_time'] = load_time
-
+        out = clone_model_request(translation_server, model_id, data)
         return jsonify(out)
 
     @app.route('/unload_model/<int:model_id>', methods=['GET'])
@@ -88,28 +68,8 @@ def start(config_file,
         inputs = request.get_json(force=True)
         if debug:
             logger.info(inputs)
-        out = {}
-        try:
-            trans, scores, n_best, _, aligns = translation_server.run(inputs)
-            assert len(trans) == len(inputs) * n_best
-            assert len(scores) == len(inputs) * n_best
-            assert len(aligns) == len(inputs) * n_best
-
-            out = [[] for _ in range(n_best)]
-            for i in range(len(trans)):
-                response = {"src": inputs[i // n_best]['src'], "tgt": trans[i],
-                            "n_best": n_best, "pred_score": scores[i]}
-                if len(aligns[i]) > 0 and aligns[i][0] is not None:
-                    response["align"] = aligns[i]
-                out[i % n_best].append(response)
-        except ServerModelError as e:
-            model_id = inputs[0].get("id")
-            if debug:
-                logger.warning("Unload model #{} "
-                               "because of an error".format(model_id))
-            translation_server.models[model_id].unload()
-            out['error'] = str(e)
-            out['status'] = STATUS_ERROR
+        out = translate_request(translation_server, inputs,
+                                logger=logger if debug else None)
         if debug:
             logger.info(out)
         return jsonify(out)
@@ -134,16 +94,7 @@ def start(config_file,
 
 
 def _get_parser():
-    parser = configargparse.ArgumentParser(
-        config_file_parser_class=configargparse.YAMLConfigFileParser,
-        description="OpenNMT-py REST Server")
-    parser.add_argument("--ip", type=str, default="0.0.0.0")
-    parser.add_argument("--port", type=int, default="5000")
-    parser.add_argument("--url_root", type=str, default="/translator")
-    parser.add_argument("--debug", "-d", action="store_true")
-    parser.add_argument("--config", "-c", type=str,
-                        default="./available_models/conf.json")
-    return parser
+    return get_server_parser()
 
 
 def main():
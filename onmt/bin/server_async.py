@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+"""Asyncio REST server, same routes as :mod:`onmt.bin.server`.
+
+Connections are handled by an event loop and model work is handed to a
+pool of `workers` threads, so idle keep-alive connections do not hold a
+worker while busy ones are translating. Responses are serialized in full
+once the model work is done, then sent with chunked transfer encoding.
+
+Requires aiohttp (``pip install OpenNMT-py[async]``).
+"""
+import asyncio
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from logging.handlers import RotatingFileHandler
+
+from onmt.translate import TranslationServer
+from onmt.translate.server_requests import STATUS_OK, STATUS_ERROR, \
+    clone_model_request, translate_request, get_server_parser
+
+CHUNK_SIZE = 65536
+
+
+def build_app(translation_server, executor, url_root="./translator",
+              logger=None):
+    """Build the aiohttp application serving `translation_server`.
+
+    Args:
+        translation_server (TranslationServer): started server
+        executor (concurrent.futures.Executor): runs the model work
+        url_root (str): prefix of the routes
+        logger (logging.Logger): logs requests and responses if not None
+    """
+    from aiohttp import web
+
+    debug = logger is not None
+    url_root = url_root.strip("./")
+    url_root = "/" + url_root if url_root else ""
+
+    async def run_in_executor(func, *args):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(executor, func, *args)
+
+    async def chunked_json(request, out):
+        """Write `out` as a JSON response sent by chunks.
+
+        The whole body is serialized first: results are not streamed
+        as they are translated, only their transfer is chunked.
+        """
+        body = json.dumps(out).encode("utf-8")
+        response = web.StreamResponse(
+            headers={"Content-Type": "application/json"})
+        response.enable_chunked_encoding()
+        await response.prepare(request)
+        for i in range(0, len(body), CHUNK_SIZE):
+            await response.write(body[i:i + CHUNK_SIZE])
+        await response.write_eof()
+        return response
+
+    async def get_models(request):
+        out = translation_server.list_models()
+        return await chunked_json(request, out)
+
+    async def health(request):
+        out = {}
+        out['status'] = STATUS_OK
+        return await chunked_json(request, out)
+
+    async def clone_model(request):
+        model_id = int(request.match_info["model_id"])
+        data = json.loads(await request.text())
+        out = await run_in_executor(
+            clone_model_request, translation_server, model_id, data)
+        return await chunked_json(request, out)
+
+    async def unload_model(request):
+        model_id = int(request.match_info["model_id"])
+        out = {"model_id": model_id}
+
+        try:
+            await run_in_executor(translation_server.unload_model, model_id)
+            out['status'] = STATUS_OK
+        except Exception as e:
+            out['status'] = STATUS_ERROR
+            out['error'] = str(e)
+
+        return await chunked_json(request, out)
+
+    async def translate(request):
+        inputs = json.loads(await request.text())
+        if debug:
+            logger.info(inputs)
+        out = await run_in_executor(
+            translate_request, translation_server, inputs, logger)
+        if debug:
+            logger.info(out)
+        return await chunked_json(request, out)
+
+    async def to_cpu(request):
+        model_id = int(request.match_info["model_id"])
+        out = {'model_id': model_id}
+        await run_in_executor(translation_server.models[model_id].to_cpu)
+
+        out['status'] = STATUS_OK
+        return await chunked_json(request, out)
+
+    async def to_gpu(request):
+        model_id = int(request.match_info["model_id"])
+        out = {'model_id': model_id}
+        await run_in_executor(translation_server.models[model_id].to_gpu)
+
+        out['status'] = STATUS_OK
+        return await chunked_json(request, out)
+
+    app = web.Application()
+    app.add_routes([
+        web.get(url_root + '/models', get_models),
+        web.get(url_root + '/health', health),
+        web.post(url_root + r'/clone_model/{model_id:\d+}', clone_model),
+        web.get(url_root + r'/unload_model/{model_id:\d+}', unload_model),
+        web.post(url_root + '/translate', translate),
+        web.get(url_root + r'/to_cpu/{model_id:\d+}', to_cpu),
+        web.get(url_root + r'/to_gpu/{model_id:\d+}', to_gpu),
+    ])
+    return app
+
+
+def start(config_file,
+          url_root="./translator",
+          host="0.0.0.0",
+          port=5000,
+          debug=False,
+          workers=4):
+    from aiohttp import web
+
+    logger = None
+    if debug:
+        logger = logging.getLogger("main")
+        log_format = logging.Formatter(
+            "[%(asctime)s %(levelname)s] %(message)s")
+        file_handler = RotatingFileHandler(
+            "debug_requests.log",
+            maxBytes=1000000, backupCount=10)
+        file_handler.setFormatter(log_format)
+        logger.addHandler(file_handler)
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    translation_server = TranslationServer()
+    translation_server.start(config_file)
+    app = build_app(translation_server, executor, url_root=url_root,
+                    logger=logger)
+    try:
+        web.run_app(app, host=host, port=port)
+    finally:
+        executor.shutdown(wait=False)
+
+
+def _get_parser():
+    parser = get_server_parser("OpenNMT-py asyncio REST Server")
+    parser.add_argument("--workers", "-w", type=int, default=4,
+                        help="Number of threads running model work.")
+    return parser
+
+
+def main():
+    parser = _get_parser()
+    args = parser.parse_args()
+    start(args.config, url_root=args.url_root, host=args.ip, port=args.port,
+          debug=args.debug, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
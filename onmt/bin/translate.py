@@ -3,9 +3,14 @@
 
 from __future__ import unicode_literals
 
+import codecs
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 from onmt.utils.logging import init_logger
 from onmt.utils.misc import split_corpus
 from onmt.translate.translator import build_translator
+from onmt.translate.translation_server import TranslatorReplicas
 
 import onmt.opts as opts
 from onmt.utils.parse import ArgumentParser
@@ -15,11 +20,25 @@ def translate(opt):
     ArgumentParser.validate_translate_opts(opt)
     logger = init_logger(opt.log_file)
 
+    if opt.num_workers > 1:
+        translate_multiprocess(opt, logger)
+        return
+
     translator = build_translator(opt, logger=logger, report_score=True)
     src_shards = split_corpus(opt.src, opt.shard_size)
     tgt_shards = split_corpus(opt.tgt, opt.shard_size)
     shard_pairs = zip(src_shards, tgt_shards)
 
+    if opt.stream:
+        translator.translate_stream(
+            shard_pairs,
+            batch_size=opt.batch_size,
+            batch_type=opt.batch_type,
+            attn_debug=opt.attn_debug,
+            align_debug=opt.align_debug
+            )
+        return
+
     for i, (src_shard, tgt_shard) in enumerate(shard_pairs):
         logger.info("Translating shard %d." % i)
         translator.translate(
@@ -32,6 +51,42 @@ def translate(opt):
             )
 
 
+def translate_multiprocess(opt, logger):
+    """Translate with `opt.num_workers` forked CPU processes sharing the
+    model, and write their outputs in input order."""
+    translator = build_translator(
+        opt, logger=logger, report_score=False,
+        out_file=codecs.open(os.devnull, "w", "utf-8"))
+    replicas = TranslatorReplicas(translator, opt.num_workers)
+    src_shards = split_corpus(opt.src, opt.shard_size)
+    tgt_shards = split_corpus(opt.tgt, opt.shard_size)
+    shard_pairs = zip(src_shards, tgt_shards)
+
+    try:
+        with codecs.open(opt.output, "w+", "utf-8") as out_file, \
+                ThreadPoolExecutor(max_workers=opt.num_workers) as executor:
+            for i, (src_shard, tgt_shard) in enumerate(shard_pairs):
+                logger.info("Translating shard %d." % i)
+                if len(src_shard) == 0:
+                    continue
+                chunk_size = -(-len(src_shard) // opt.num_workers)
+                futures = [
+                    executor.submit(
+                        replicas.translate,
+                        src_shard[j:j + chunk_size],
+                        batch_size=opt.batch_size,
+                        tgt=tgt_shard[j:j + chunk_size]
+                        if tgt_shard is not None else None,
+                        batch_type=opt.batch_type)
+                    for j in range(0, len(src_shard), chunk_size)]
+                for future in futures:
+                    _, predictions = future.result()
+                    for n_best_preds in predictions:
+                        out_file.write("\n".join(n_best_preds) + "\n")
+    finally:
+        replicas.close()
+
+
 def _get_parser():
     parser = ArgumentParser(description='translate.py')
 
@@ -19,6 +19,10 @@ class CorpusName(object):
     SAMPLE = 'sample'
 
 
+class LangVocab(object):
+    PLACEHOLDER = '{lang}'
+
+
 class SubwordMarker(object):
     SPACER = '▁'
     JOINER = '￭'
@@ -5,12 +5,19 @@ combining their prediction distributions by averaging.
 All models in the ensemble must share a target vocabulary.
 """
 
+import copy
+
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 
 from onmt.encoders.encoder import EncoderBase
+from onmt.encoders.transformer import TransformerEncoder
 from onmt.decoders.decoder import DecoderBase
+from onmt.decoders.transformer import TransformerDecoder
 from onmt.models import NMTModel
+from onmt.modules.util_class import Cast
+from onmt.utils.logging import logger
 import onmt.model_builder
 
 
@@ -120,6 +127,240 @@ class EnsembleModel(NMTModel):
         self.models = nn.ModuleList(models)
 
 
+class StackedLinear(nn.Module):
+    """``nn.Linear`` layers of several models run as one batched matmul.
+
+    Inputs are ``(n_models * batch, ..., in_features)``, model major.
+    """
+    def __init__(self, linears):
+        super(StackedLinear, self).__init__()
+        self.weight = nn.Parameter(
+            torch.stack([linear.weight.t() for linear in linears]))
+        self.bias = None
+        if linears[0].bias is not None:
+            self.bias = nn.Parameter(
+                torch.stack([linear.bias for linear in linears]).unsqueeze(1))
+
+    def forward(self, x):
+        shape = x.shape
+        x = x.reshape(self.weight.size(0), -1, shape[-1])
+        if self.bias is None:
+            out = torch.bmm(x, self.weight)
+        else:
+            out = torch.baddbmm(self.bias, x, self.weight)
+        return out.view(shape[:-1] + (out.size(-1),))
+
+
+class StackedLayerNorm(nn.Module):
+    """``nn.LayerNorm`` layers of several models, inputs as
+    :class:`StackedLinear`."""
+    def __init__(self, layer_norms):
+        super(StackedLayerNorm, self).__init__()
+        self.normalized_shape = layer_norms[0].normalized_shape
+        self.eps = layer_norms[0].eps
+        self.weight = nn.Parameter(
+            torch.stack([ln.weight for ln in layer_norms]).unsqueeze(1))
+        self.bias = nn.Parameter(
+            torch.stack([ln.bias for ln in layer_norms]).unsqueeze(1))
+
+    def forward(self, x):
+        shape = x.shape
+        out = F.layer_norm(x, self.normalized_shape, None, None, self.eps)
+        out = out.reshape(self.weight.size(0), -1, shape[-1])
+        return (out * self.weight + self.bias).view(shape)
+
+
+class StackedEmbedding(nn.Module):
+    """``nn.Embedding`` tables of several models concatenated in a single
+    lookup. Inputs are ``(len, n_models * batch)``, model major."""
+    def __init__(self, embeddings):
+        super(StackedEmbedding, self).__init__()
+        self.n_models = len(embeddings)
+        self.num_embeddings = embeddings[0].num_embeddings
+        self.embedding_dim = embeddings[0].embedding_dim
+        self.weight = nn.Parameter(
+            torch.cat([emb.weight for emb in embeddings]))
+
+    def forward(self, x):
+        offsets = torch.arange(
+            0, self.n_models * self.num_embeddings, self.num_embeddings,
+            device=x.device)
+        x = x.view(x.size(0), self.n_models, -1) + offsets.view(1, -1, 1)
+        return F.embedding(x, self.weight).view(
+            x.size(0), -1, self.embedding_dim)
+
+
+STACKED_MODULES = {
+    nn.Linear: StackedLinear,
+    nn.LayerNorm: StackedLayerNorm,
+    nn.Embedding: StackedEmbedding,
+}
+
+
+def is_stackable(module):
+    """Whether all parameters of `module` belong to layers that
+    :func:`stack_modules` can stack."""
+    leaves = set()
+    for name, submodule in module.named_modules():
+        if type(submodule) not in STACKED_MODULES:
+            continue
+        # embeddings are time major, other layers are batch major or
+        # not indexed by batch (e.g. relative positions)
+        if (type(submodule) is nn.Embedding) != \
+                name.startswith("embeddings."):
+            return False
+        leaves.add(name)
+    return all(name.rpartition(".")[0] in leaves
+               for name, _ in module.named_parameters())
+
+
+def stack_modules(modules):
+    """Copy of ``modules[0]`` whose layers hold the parameters of all
+    `modules` along a new model dimension, see :func:`is_stackable`."""
+    stacked = copy.deepcopy(modules[0])
+    stacked_modules = dict(stacked.named_modules())
+    named_modules = [dict(module.named_modules()) for module in modules]
+    for name, module in modules[0].named_modules():
+        stacked_cls = STACKED_MODULES.get(type(module))
+        if stacked_cls is None:
+            continue
+        parent_name, _, child_name = name.rpartition(".")
+        setattr(stacked_modules[parent_name], child_name, stacked_cls(
+            [named[name] for named in named_modules]))
+    return stacked
+
+
+def _tile_models(x, n_models, dim):
+    return x.repeat(*[n_models if d == dim else 1 for d in range(x.dim())])
+
+
+class StackedEncoder(EncoderBase):
+    """Encoder running identical Transformer encoders as one, on the
+    source repeated for each model. The memory bank is returned as one
+    chunk per model, like :class:`EnsembleEncoder`."""
+    def __init__(self, stacked_encoder, n_models):
+        super(StackedEncoder, self).__init__()
+        self.stacked_encoder = stacked_encoder
+        self.n_models = n_models
+
+    def forward(self, src, lengths=None):
+        enc_hidden, memory_bank, _ = self.stacked_encoder(
+            _tile_models(src, self.n_models, 1),
+            _tile_models(lengths, self.n_models, 0))
+        return (enc_hidden.chunk(self.n_models, 1),
+                memory_bank.chunk(self.n_models, 1),
+                lengths)
+
+
+class StackedDecoder(DecoderBase):
+    """Decoder running identical Transformer decoders as one. Its state
+    holds the models along the batch dimension, model major."""
+    def __init__(self, stacked_decoder, n_models):
+        super(StackedDecoder, self).__init__(stacked_decoder.attentional)
+        self.stacked_decoder = stacked_decoder
+        self.n_models = n_models
+
+    def forward(self, tgt, memory_bank, memory_lengths=None, step=None,
+                **kwargs):
+        """See :func:`onmt.decoders.decoder.DecoderBase.forward()`."""
+        dec_outs, attns = self.stacked_decoder(
+            _tile_models(tgt, self.n_models, 1),
+            torch.cat(memory_bank, 1),
+            memory_lengths=_tile_models(memory_lengths, self.n_models, 0),
+            step=step, **kwargs)
+        return dec_outs, self.combine_attns(attns)
+
+    def combine_attns(self, attns):
+        result = {}
+        for key, attn in attns.items():
+            # "align" is batch first, the others are (tgt_len, batch, ..)
+            dim = 0 if key == "align" else 1
+            result[key] = attn.view(
+                attn.shape[:dim] + (self.n_models, -1) + attn.shape[dim + 1:]
+            ).mean(dim)
+        return result
+
+    def init_state(self, src, memory_bank, enc_hidden):
+        """ See :obj:`RNNDecoderBase.init_state()` """
+        self.stacked_decoder.init_state(
+            _tile_models(src, self.n_models, 1),
+            torch.cat(memory_bank, 1), None)
+
+    def map_state(self, fn):
+        def stacked_fn(state, dim):
+            shape = state.shape
+            state = fn(state.view(
+                shape[:dim] + (self.n_models, -1) + shape[dim + 1:]),
+                dim + 1)
+            return state.reshape(shape[:dim] + (-1,) + state.shape[dim + 2:])
+        self.stacked_decoder.map_state(stacked_fn)
+
+
+class StackedGenerator(nn.Module):
+    """Standard generators of several models run as one batched matmul,
+    followed by the averaging of :class:`EnsembleGenerator`."""
+    def __init__(self, model_generators, raw_probs=False):
+        super(StackedGenerator, self).__init__()
+        self.n_models = len(model_generators)
+        self.linear = StackedLinear(
+            [generator[0] for generator in model_generators])
+        self._raw_probs = raw_probs
+
+    def forward(self, hidden):
+        # hidden: ``(..., n_models * batch, dim)``
+        shape = hidden.shape
+        hidden = hidden.reshape(-1, self.n_models, shape[-2] // self.n_models,
+                                shape[-1]).transpose(0, 1).contiguous()
+        distributions = torch.log_softmax(
+            self.linear(hidden).float(), dim=-1)
+        if self._raw_probs:
+            distributions = torch.log(torch.exp(distributions).mean(0))
+        else:
+            distributions = distributions.mean(0)
+        return distributions.view(
+            shape[:-2] + (-1, distributions.size(-1)))
+
+
+class StackedEnsembleModel(NMTModel):
+    """Ensemble of architecturally identical Transformer models whose
+    parameters are stacked along a model dimension, so each step costs
+    batched matmuls instead of one pass per model."""
+    def __init__(self, models, raw_probs=False):
+        n_models = len(models)
+        encoder = StackedEncoder(stack_modules(
+            [model.encoder for model in models]), n_models)
+        decoder = StackedDecoder(stack_modules(
+            [model.decoder for model in models]), n_models)
+        super(StackedEnsembleModel, self).__init__(encoder, decoder)
+        self.generator = StackedGenerator(
+            [model.generator for model in models], raw_probs)
+
+    @staticmethod
+    def can_stack(models):
+        """Whether `models` are identical standard Transformers."""
+        def is_standard_generator(generator):
+            return isinstance(generator, nn.Sequential) \
+                and len(generator) == 3 \
+                and type(generator[0]) is nn.Linear \
+                and isinstance(generator[1], Cast) \
+                and isinstance(generator[2], nn.LogSoftmax)
+
+        shapes = None
+        for model in models:
+            if not (isinstance(model, NMTModel)
+                    and type(model.encoder) is TransformerEncoder
+                    and type(model.decoder) is TransformerDecoder
+                    and is_standard_generator(model.generator)):
+                return False
+            model_shapes = [(name, p.shape, p.dtype)
+                            for name, p in model.named_parameters()]
+            if shapes is not None and model_shapes != shapes:
+                return False
+            shapes = model_shapes
+        return is_stackable(models[0].encoder) \
+            and is_stackable(models[0].decoder)
+
+
 def load_test_model(opt):
     """Read in multiple models for ensemble."""
     shared_fields = None
@@ -150,5 +391,10 @@ def load_test_model(opt):
         models.append(model)
         if shared_model_opt is None:
             shared_model_opt = model_opt
-    ensemble_model = EnsembleModel(models, opt.avg_raw_probs)
+    if StackedEnsembleModel.can_stack(models):
+        logger.info("Stacking the %d models of the ensemble." % len(models))
+        ensemble_model = StackedEnsembleModel(models, opt.avg_raw_probs)
+        ensemble_model.eval()
+    else:
+        ensemble_model = EnsembleModel(models, opt.avg_raw_probs)
     return shared_fields, ensemble_model, shared_model_opt
@@ -120,7 +120,7 @@ class TransformerDecoderLayerBase(nn.Module):
     def _forward(self, *args, **kwargs):
         raise NotImplementedError
 
-    def _compute_dec_mask(self, tgt_pad_mask, future):
+    def _compute_dec_mask(self, tgt_pad_mask, future, layer_cache=None):
         tgt_len = tgt_pad_mask.size(-1)
         if not future:  # apply future_mask, result mask in (B, T, T)
             future_mask = torch.ones(
@@ -137,6 +137,12 @@ class TransformerDecoderLayerBase(nn.Module):
             dec_mask = torch.gt(tgt_pad_mask + future_mask, 0)
         else:  # only mask padding, result mask in (B, 1, T)
             dec_mask = tgt_pad_mask
+        cache = layer_cache.get("self_keys") if layer_cache else None
+        if cache is not None:
+            # several steps at once: all cached positions are visible
+            cache_mask = dec_mask.new_zeros(
+                dec_mask.shape[:-1] + (cache.size(2),))
+            dec_mask = torch.cat([cache_mask, dec_mask], dim=-1)
         return dec_mask
 
     def _forward_self_attn(self, inputs_norm, dec_mask, layer_cache, step):
@@ -255,7 +261,8 @@ class TransformerDecoderLayer(TransformerDecoderLayerBase):
 
         if inputs.size(1) > 1:
             # masking is necessary when sequence length is greater than one
-            dec_mask = self._compute_dec_mask(tgt_pad_mask, future)
+            dec_mask = self._compute_dec_mask(
+                tgt_pad_mask, future, layer_cache)
 
         inputs_norm = self.layer_norm_1(inputs)
 
@@ -338,6 +345,14 @@ class TransformerDecoderBase(DecoderBase):
         if self.state["cache"] is not None:
             _recursive_map(self.state["cache"])
 
+    def truncate_cache(self, length):
+        """Keep the self-attention cache of the first ``length`` target
+        positions only, e.g. to drop rejected speculative tokens."""
+        for layer_cache in self.state["cache"].values():
+            for key in ("self_keys", "self_values"):
+                if layer_cache.get(key) is not None:
+                    layer_cache[key] = layer_cache[key][:, :, :length]
+
     def detach_state(self):
         raise NotImplementedError
 
@@ -453,6 +468,10 @@ class TransformerDecoder(TransformerDecoderBase):
         src_max_len = self.state["src"].shape[0]
         src_pad_mask = ~sequence_mask(src_lens, src_max_len).unsqueeze(1)
         tgt_pad_mask = tgt_words.data.eq(pad_idx).unsqueeze(1)  # [B, 1, T_tgt]
+        if step is not None:
+            # stepwise decoding never masks its (cached) inputs, keep
+            # several steps at once consistent with it
+            tgt_pad_mask = torch.zeros_like(tgt_pad_mask)
 
         with_align = kwargs.pop("with_align", False)
         attn_aligns = []
@@ -550,7 +569,8 @@ class TransformerLMDecoderLayer(TransformerDecoderLayerBase):
 
         if inputs.size(1) > 1:
             # masking is necessary when sequence length is greater than one
-            dec_mask = self._compute_dec_mask(tgt_pad_mask, future)
+            dec_mask = self._compute_dec_mask(
+                tgt_pad_mask, future, layer_cache)
 
         inputs_norm = self.layer_norm_1(inputs)
 
@@ -1,16 +1,25 @@
 """Module that contain shard utils for dynamic data."""
 import os
 from onmt.utils.logging import logger
-from onmt.constants import CorpusName
+from onmt.constants import CorpusName, LangVocab
 from onmt.transforms import TransformPipe
 from onmt.inputters.dataset_base import _dynamic_dict
 from torchtext.data import Dataset as TorchtextDataset, \
     Example as TorchtextExample
 
-from collections import Counter
+from collections import Counter, OrderedDict, defaultdict
 from contextlib import contextmanager
+from itertools import groupby, islice
+from operator import itemgetter
 
+import glob
+import hashlib
+import heapq
 import multiprocessing as mp
+import pickle
+import shutil
+import socket
+import tempfile
 
 
 @contextmanager
@@ -70,11 +79,33 @@ class DatasetAdapter(object):
             example, is_train=is_train, corpus_name=cid)
         if maybe_example is None:
             return None
-        maybe_example['src'] = ' '.join(maybe_example['src'])
-        maybe_example['tgt'] = ' '.join(maybe_example['tgt'])
-        if 'align' in maybe_example:
-            maybe_example['align'] = ' '.join(maybe_example['align'])
-        return maybe_example
+        return DatasetAdapter._join_tokens(maybe_example)
+
+    @staticmethod
+    def _join_tokens(example):
+        example['src'] = ' '.join(example['src'])
+        example['tgt'] = ' '.join(example['tgt'])
+        if 'align' in example:
+            example['align'] = ' '.join(example['align'])
+        return example
+
+    @staticmethod
+    def _process_bucket(bucket, is_train):
+        """Yield valid transformed examples of `bucket`.
+
+        Items are grouped by transform pipe and corpus, so that each group
+        goes through `TransformPipe.batch_apply` at once.
+        """
+        groups = OrderedDict()
+        for example, transform, cid in bucket:
+            key = (id(transform), cid)
+            if key not in groups:
+                groups[key] = (transform, cid, [])
+            groups[key][2].append(example)
+        for transform, cid, examples in groups.values():
+            for example in transform.batch_apply(
+                    examples, is_train=is_train, corpus_name=cid):
+                yield DatasetAdapter._join_tokens(example)
 
     def _maybe_add_dynamic_dict(self, example, fields):
         """maybe update `example` with dynamic_dict related fields."""
@@ -87,15 +118,13 @@ class DatasetAdapter(object):
 
     def _to_examples(self, bucket, is_train=False):
         examples = []
-        for item in bucket:
-            maybe_example = self._process(item, is_train=is_train)
-            if maybe_example is not None:
-                example = self._maybe_add_dynamic_dict(
-                    maybe_example, self.fields_dict)
-                ex_fields = {k: [(k, v)] for k, v in self.fields_dict.items()
-                             if k in example}
-                ex = TorchtextExample.fromdict(example, ex_fields)
-                examples.append(ex)
+        for example in self._process_bucket(bucket, is_train=is_train):
+            example = self._maybe_add_dynamic_dict(
+                example, self.fields_dict)
+            ex_fields = {k: [(k, v)] for k, v in self.fields_dict.items()
+                         if k in example}
+            ex = TorchtextExample.fromdict(example, ex_fields)
+            examples.append(ex)
         return examples
 
     def __call__(self, bucket):
@@ -104,6 +133,68 @@ class DatasetAdapter(object):
         return dataset
 
 
+def _line_offsets(path, line_numbers, block_size=1 << 20):
+    """Byte offsets of the starts of the sorted `line_numbers` of `path`,
+    found by counting newlines without decoding. Lines past the end of
+    the file start at its end."""
+    offsets = []
+    targets = iter(line_numbers)
+    target = next(targets, None)
+    line, base = 0, 0
+    with open(path, 'rb') as f:
+        while target == 0:
+            offsets.append(0)
+            target = next(targets, None)
+        while target is not None:
+            block = f.read(block_size)
+            if not block:
+                break
+            n_newlines = block.count(b'\n')
+            if line + n_newlines < target:
+                line += n_newlines
+                base += len(block)
+                continue
+            i = 0
+            while target is not None:
+                j = block.find(b'\n', i)
+                if j < 0:
+                    break
+                line, i = line + 1, j + 1
+                while target == line:
+                    offsets.append(base + i)
+                    target = next(targets, None)
+            base += len(block)
+    while target is not None:
+        offsets.append(base)
+        target = next(targets, None)
+    return offsets
+
+
+def _split_lines(path, n_parts, end, block_size=1 << 20):
+    """Cut the first `end` bytes of `path` in up to `n_parts` ranges of
+    about the same size aligned on lines, return the ``(line, offset)``
+    start of each range."""
+    starts = [(0, 0)]
+    targets = [end * k // n_parts for k in range(1, n_parts)]
+    line, base = 0, 0
+    with open(path, 'rb') as f:
+        while targets:
+            block = f.read(block_size)
+            if not block:
+                break
+            while targets and targets[0] < base + len(block):
+                j = block.find(b'\n', max(targets[0] - base, 0))
+                if j < 0:
+                    break
+                start_line = line + block.count(b'\n', 0, j) + 1
+                if base + j + 1 < end:
+                    starts.append((start_line, base + j + 1))
+                targets.pop(0)
+            line += block.count(b'\n')
+            base += len(block)
+    return sorted(set(starts))
+
+
 class ParallelCorpus(object):
     """A parallel corpus file pair that can be loaded to iterate."""
 
@@ -114,17 +205,57 @@ class ParallelCorpus(object):
         self.tgt = tgt
         self.align = align
 
-    def load(self, offset=0, stride=1):
+    def split(self, n_parts, n_lines=-1):
+        """Split the first `n_lines` lines (all if -1) in `n_parts` parts
+        of about the same size, aligned on lines.
+
+        Only newlines are counted to find the parts, so each of them can
+        be read on its own without going through the other lines.
+
+        Returns:
+            list of ``(start_line, n_lines, offsets)`` parts, ``offsets``
+            being the byte offsets of ``start_line`` in the src, tgt and
+            align files. Parts missing for a small corpus are empty.
+        """
+        end = os.path.getsize(self.src) if n_lines < 0 \
+            else _line_offsets(self.src, [n_lines])[0]
+        starts = _split_lines(self.src, n_parts, end)
+        lines = [line for line, _ in starts]
+        tgt_offsets = _line_offsets(self.tgt, lines)
+        align_offsets = _line_offsets(self.align, lines) \
+            if self.align is not None else [None] * len(lines)
+        parts = []
+        for k, (line, src_offset) in enumerate(starts):
+            if k + 1 < len(starts):
+                part_lines = starts[k + 1][0] - line
+            else:
+                part_lines = n_lines - line if n_lines >= 0 else None
+            parts.append(
+                (line, part_lines, (src_offset, tgt_offsets[k],
+                                    align_offsets[k])))
+        while len(parts) < n_parts:
+            parts.append((0, 0, (None, None, None)))
+        return parts
+
+    def load(self, offset=0, stride=1, part=None):
         """
         Load file and iterate by lines.
         `offset` and `stride` allow to iterate only on every
         `stride` example, starting from `offset`.
+        `part`, one of :func:`split()`, allows to only read its lines.
         """
         with exfile_open(self.src, mode='rb') as fs,\
                 exfile_open(self.tgt, mode='rb') as ft,\
                 exfile_open(self.align, mode='rb') as fa:
             logger.info(f"Loading {repr(self)}...")
-            for i, (sline, tline, align) in enumerate(zip(fs, ft, fa)):
+            lines = zip(fs, ft, fa)
+            if part is not None:
+                _, part_lines, offsets = part
+                for f, f_offset in zip((fs, ft, fa), offsets):
+                    if f_offset is not None:
+                        f.seek(f_offset)
+                lines = islice(lines, part_lines)
+            for i, (sline, tline, align) in enumerate(lines):
                 if (i % stride) == offset:
                     sline = sline.decode('utf-8')
                     tline = tline.decode('utf-8')
@@ -164,6 +295,89 @@ def get_corpora(opts, is_train=False):
     return corpora_dict
 
 
+class TransformCache(object):
+    """On disk output of the deterministic transforms of a corpus.
+
+    The file holds pickled chunks of transformed examples, then the dict
+    of the transforms statistics over the corpus. It is written aside and
+    renamed once complete, under a name keyed by a hash of the transforms
+    configuration and of the corpus files.
+
+    Args:
+        cache_dir (str): directory of the cache files;
+        corpus (ParallelCorpus): corpus whose examples are cached;
+        transform (TransformPipe): deterministic transforms to apply;
+        stride (int): the corpus is iterated with this line stride;
+        offset (int): the corpus is iterated with this line offset.
+    """
+
+    chunk_size = 1024
+    # transform options naming files which the output depends on
+    file_opts = ('src_subword_model', 'tgt_subword_model',
+                 'src_subword_vocab', 'tgt_subword_vocab')
+
+    def __init__(self, cache_dir, corpus, transform, stride=1, offset=0):
+        self.transform = transform
+        self.path = os.path.join(cache_dir, "{}.{}.{}-{}.pkl".format(
+            corpus.id, self.config_hash(corpus, transform), offset, stride))
+
+    @staticmethod
+    def config_hash(corpus, transform):
+        """Hash of the `transform` config, of the files it refers to
+        (subword models and vocabularies) and of the `corpus` files."""
+        config = [repr(transform)]
+        paths = [corpus.src, corpus.tgt, corpus.align]
+        for t in transform.transforms:
+            paths.extend(getattr(t, name, None)
+                         for name in TransformCache.file_opts)
+        for path in paths:
+            if path and os.path.isfile(path):
+                stat = os.stat(path)
+                config.append((path, stat.st_size, stat.st_mtime_ns))
+        return hashlib.sha1(repr(config).encode('utf-8')).hexdigest()[:16]
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def load(self, statistics):
+        """Yield cached examples, then add the cached `statistics`."""
+        with open(self.path, 'rb') as f:
+            while True:
+                chunk = pickle.load(f)
+                if isinstance(chunk, dict):
+                    statistics.update(**chunk)
+                    return
+                yield from chunk
+
+    def build(self, stream, statistics, is_train=False, corpus_name=None):
+        """Yield examples of `stream` transformed, and cache them.
+
+        The transforms statistics are added to `statistics` at the end.
+        """
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = "{}.{}.tmp".format(self.path, os.getpid())
+        try:
+            with open(tmp_path, 'wb') as f:
+                while True:
+                    chunk = list(islice(stream, self.chunk_size))
+                    if len(chunk) == 0:
+                        break
+                    chunk = self.transform.batch_apply(
+                        chunk, is_train=is_train, corpus_name=corpus_name)
+                    pickle.dump(chunk, f, protocol=pickle.HIGHEST_PROTOCOL)
+                    yield from chunk
+                counters = dict(vars(self.transform.statistics))
+                self.transform.statistics.reset()
+                pickle.dump(counters, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+        finally:
+            # an incomplete pass, closed early or failed, leaves no file
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        logger.info(f"Cached transformed {corpus_name} to {self.path}.")
+        statistics.update(**counters)
+
+
 class ParallelCorpusIterator(object):
     """An iterator dedicate for ParallelCorpus.
 
@@ -173,11 +387,15 @@ class ParallelCorpusIterator(object):
         infinitely (bool): True to iterate endlessly;
         skip_empty_level (str): security level when encouter empty line;
         stride (int): iterate corpus with this line stride;
-        offset (int): iterate corpus with this line offset.
+        offset (int): iterate corpus with this line offset;
+        part (tuple): only iterate this part of :func:`corpus.split()`;
+        cache_dir (str): cache the output of the deterministic prefix of
+            `transform` there, see :class:`TransformCache`.
     """
 
     def __init__(self, corpus, transform, infinitely=False,
-                 skip_empty_level='warning', stride=1, offset=0):
+                 skip_empty_level='warning', stride=1, offset=0, part=None,
+                 cache_dir=None):
         self.cid = corpus.id
         self.corpus = corpus
         self.transform = transform
@@ -188,6 +406,13 @@ class ParallelCorpusIterator(object):
         self.skip_empty_level = skip_empty_level
         self.stride = stride
         self.offset = offset
+        self.part = part
+        self.cache = None
+        if cache_dir is not None and part is None:
+            prefix, self.transform_suffix = transform.split_deterministic()
+            if len(prefix.transforms) > 0:
+                self.cache = TransformCache(
+                    cache_dir, corpus, prefix, stride=stride, offset=offset)
 
     def _tokenize(self, stream):
         for example in stream:
@@ -198,12 +423,13 @@ class ParallelCorpusIterator(object):
                 example['align'] = example['align'].strip('\n').split()
             yield example
 
-    def _transform(self, stream):
+    def _transform(self, stream, transform=None):
+        transform = self.transform if transform is None else transform
         for example in stream:
             # NOTE: moved to DatasetAdapter._process method in iterator.py
             # item = self.transform.apply(
             # example, is_train=self.infinitely, corpus_name=self.cid)
-            item = (example, self.transform, self.cid)
+            item = (example, transform, self.cid)
             if item is not None:
                 yield item
         report_msg = self.transform.stats()
@@ -214,7 +440,10 @@ class ParallelCorpusIterator(object):
     def _add_index(self, stream):
         for i, item in enumerate(stream):
             example = item[0]
-            line_number = i * self.stride + self.offset
+            if self.part is not None:
+                line_number = self.part[0] + i
+            else:
+                line_number = i * self.stride + self.offset
             example['indices'] = line_number
             if (len(example['src']) == 0 or len(example['tgt']) == 0 or
                     ('align' in example and example['align'] == 0)):
@@ -228,13 +457,37 @@ class ParallelCorpusIterator(object):
             yield item
 
     def _iter_corpus(self):
+        if self.cache is not None:
+            yield from self._iter_cached_corpus()
+            return
         corpus_stream = self.corpus.load(
-            stride=self.stride, offset=self.offset)
+            stride=self.stride, offset=self.offset, part=self.part)
         tokenized_corpus = self._tokenize(corpus_stream)
         transformed_corpus = self._transform(tokenized_corpus)
         indexed_corpus = self._add_index(transformed_corpus)
         yield from indexed_corpus
 
+    def _iter_cached_corpus(self):
+        """Iterate examples with the deterministic transforms applied.
+
+        They are read from cache once the first pass over the corpus has
+        written it. Only the remaining transforms are left to apply.
+        """
+        if self.cache.exists():
+            examples = self.cache.load(self.transform.statistics)
+        else:
+            corpus_stream = self.corpus.load(
+                stride=self.stride, offset=self.offset)
+            tokenized_corpus = self._tokenize(corpus_stream)
+            indexed_corpus = self._add_index(
+                (example, self.cache.transform, self.cid)
+                for example in tokenized_corpus)
+            examples = self.cache.build(
+                (item[0] for item in indexed_corpus),
+                self.transform.statistics,
+                is_train=self.infinitely, corpus_name=self.cid)
+        yield from self._transform(examples, self.transform_suffix)
+
     def __iter__(self):
         if self.infinitely:
             while True:
@@ -245,8 +498,11 @@ class ParallelCorpusIterator(object):
 
 
 def build_corpora_iters(corpora, transforms, corpora_info, is_train=False,
-                        skip_empty_level='warning', stride=1, offset=0):
-    """Return `ParallelCorpusIterator` for all corpora defined in opts."""
+                        skip_empty_level='warning', stride=1, offset=0,
+                        parts=None, cache_dir=None):
+    """Return `ParallelCorpusIterator` for all corpora defined in opts.
+    `parts` optionally maps corpora to the part of them to iterate.
+    `cache_dir` enables :class:`TransformCache` of each corpus there."""
     corpora_iters = dict()
     for c_id, corpus in corpora.items():
         c_transform_names = corpora_info[c_id].get('transforms', [])
@@ -255,7 +511,9 @@ def build_corpora_iters(corpora, transforms, corpora_info, is_train=False,
         logger.info(f"{c_id}'s transforms: {str(transform_pipe)}")
         corpus_iter = ParallelCorpusIterator(
             corpus, transform_pipe, infinitely=is_train,
-            skip_empty_level=skip_empty_level, stride=stride, offset=offset)
+            skip_empty_level=skip_empty_level, stride=stride, offset=offset,
+            part=parts[c_id] if parts is not None else None,
+            cache_dir=cache_dir)
         corpora_iters[c_id] = corpus_iter
     return corpora_iters
 
@@ -264,36 +522,172 @@ def write_files_from_queues(sample_path, queues):
     """
     Standalone process that reads data from
     queues in order and write to sample files.
+
+    Each queue holds the samples of a consecutive part of the corpus, so
+    they are written to part files, concatenated in order at the end.
     """
     os.makedirs(sample_path, exist_ok=True)
     for c_name in queues.keys():
         dest_base = dest_base = os.path.join(
             sample_path, "{}.{}".format(c_name, CorpusName.SAMPLE))
-        with open(dest_base + ".src", 'w', encoding="utf-8") as f_src,\
-                open(dest_base + ".tgt", 'w', encoding="utf-8") as f_tgt:
-            while True:
-                _next = False
-                for i, q in enumerate(queues[c_name]):
-                    item = q.get()
-                    if item == "break":
-                        _next = True
-                        break
-                    j, src_line, tgt_line = item
-                    f_src.write(src_line + '\n')
-                    f_tgt.write(tgt_line + '\n')
-                if _next:
-                    break
+        part_files = [
+            (open(f"{dest_base}.src.{k}", 'w', encoding="utf-8"),
+             open(f"{dest_base}.tgt.{k}", 'w', encoding="utf-8"))
+            for k in range(len(queues[c_name]))]
+        alive = list(range(len(queues[c_name])))
+        while alive:
+            for k in list(alive):
+                item = queues[c_name][k].get()
+                if item == "break":
+                    alive.remove(k)
+                    continue
+                j, src_line, tgt_line = item
+                part_files[k][0].write(src_line + '\n')
+                part_files[k][1].write(tgt_line + '\n')
+        for side, dest in enumerate([dest_base + ".src", dest_base + ".tgt"]):
+            with open(dest, 'w', encoding="utf-8") as f_dest:
+                for k, files in enumerate(part_files):
+                    files[side].close()
+                    part_path = files[side].name
+                    with open(part_path, 'r', encoding="utf-8") as f_part:
+                        shutil.copyfileobj(f_part, f_dest)
+                    os.remove(part_path)
+
+
+class SpillCounter(object):
+    """Token counter holding at most `max_size` tokens in memory.
+
+    When full, its counts are spilled to a new file named after `prefix`,
+    in the vocabulary format but sorted by token. Such partial counts of
+    several threads or nodes are merged exactly by :func:`merge_counts`.
+    """
+
+    def __init__(self, prefix, max_size):
+        self.prefix = prefix
+        self.max_size = max_size
+        self.counter = Counter()
+        self.paths = []
+
+    def update(self, tokens):
+        self.counter.update(tokens)
+        if len(self.counter) >= self.max_size:
+            self.spill()
+
+    def spill(self):
+        """Write the counts in memory to disk, return all spilled paths."""
+        if len(self.counter) > 0:
+            path = f"{self.prefix}.{len(self.paths)}.counts"
+            _write_counts(path, ((tok, self.counter[tok])
+                                 for tok in sorted(self.counter)))
+            self.paths.append(path)
+            self.counter = Counter()
+        return self.paths
+
+
+def _write_counts(path, counts):
+    with open(path, 'w', encoding="utf-8") as f:
+        for tok, count in counts:
+            f.write(tok + "\t" + str(count) + "\n")
+
+
+def _read_counts(path):
+    with open(path, 'r', encoding="utf-8") as f:
+        for line in f:
+            tok, count = line.rstrip('\n').rsplit('\t', 1)
+            yield tok, int(count)
+
+
+def _sum_counts(paths):
+    """Yield the tokens of files sorted by token with their summed counts,
+    in token order."""
+    merged = heapq.merge(
+        *[_read_counts(path) for path in paths], key=itemgetter(0))
+    for tok, tok_counts in groupby(merged, key=itemgetter(0)):
+        yield tok, sum(c for _, c in tok_counts)
+
+
+def _top_counts(counts, topk):
+    """Counter of the `topk` most frequent of `counts`, all if 0."""
+    counter = Counter()
+    heap = []
+    for tok, count in counts:
+        if topk <= 0:
+            counter[tok] = count
+        elif len(heap) < topk:
+            heapq.heappush(heap, (count, tok))
+        elif count > heap[0][0]:
+            heapq.heapreplace(heap, (count, tok))
+    counter.update({tok: count for count, tok in heap})
+    return counter
+
+
+def merge_counts(paths, topk=0, fan_in=128):
+    """Sum the partial counts of files sorted by token.
+
+    The files are read in a streaming pass, so only the `topk` most
+    frequent tokens are held in memory, with their exact counts. All
+    tokens are kept if `topk` is 0. At most `fan_in` files are open at
+    once: beyond that, groups of files are first merged into
+    intermediate files, next to the first one.
+    """
+    if fan_in < 2:
+        raise ValueError(f"fan_in should be at least 2, got {fan_in}.")
+    tmp_dir = None
+    try:
+        while len(paths) > fan_in:
+            if tmp_dir is None:
+                tmp_dir = tempfile.mkdtemp(
+                    prefix="merge.", dir=os.path.dirname(paths[0]))
+            merged_paths = []
+            for i in range(0, len(paths), fan_in):
+                fd, path = tempfile.mkstemp(suffix=".counts", dir=tmp_dir)
+                os.close(fd)
+                _write_counts(path, _sum_counts(paths[i:i + fan_in]))
+                merged_paths.append(path)
+            for path in paths:
+                if os.path.dirname(path) == tmp_dir:
+                    os.remove(path)
+            paths = merged_paths
+        return _top_counts(_sum_counts(paths), topk)
+    finally:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir)
+
+
+def _vocab_keys(opts, c_name):
+    """Names of the counters of the src and tgt sides of corpus `c_name`:
+    its language tags with per-language vocabularies, else the sides."""
+    if LangVocab.PLACEHOLDER in opts.src_vocab:
+        corpus = opts.data[c_name]
+        return corpus['src_lang'], corpus['tgt_lang']
+    return 'src', 'tgt'
+
+
+def build_sub_vocab(corpora, transforms, opts, parts, offset):
+    """Build vocab on the `offset` part of each corpus in `parts`.
+
+    Return the counters by name (see :func:`_vocab_keys`), or the paths
+    of their spilled partial counts if `opts.vocab_counter_size` is set.
+    """
+    spill = opts.vocab_counter_size > 0
+    counters = {}
 
+    def get_counter(key):
+        if key not in counters:
+            counters[key] = SpillCounter(
+                os.path.join(opts.counts_dir,
+                             f"{key}.{opts.counts_prefix}.{offset}"),
+                opts.vocab_counter_size) if spill else Counter()
+        return counters[key]
 
-def build_sub_vocab(corpora, transforms, opts, n_sample, stride, offset):
-    """Build vocab on (strided) subpart of the data."""
-    sub_counter_src = Counter()
-    sub_counter_tgt = Counter()
     datasets_iterables = build_corpora_iters(
         corpora, transforms, opts.data, is_train=False,
         skip_empty_level=opts.skip_empty_level,
-        stride=stride, offset=offset)
+        parts={c_name: c_parts[offset] for c_name, c_parts in parts.items()})
     for c_name, c_iter in datasets_iterables.items():
+        key_src, key_tgt = _vocab_keys(opts, c_name)
+        sub_counter_src = get_counter(key_src)
+        sub_counter_tgt = get_counter(key_tgt)
         for i, item in enumerate(c_iter):
             maybe_example = DatasetAdapter._process(item, is_train=True)
             if maybe_example is None:
@@ -304,13 +698,11 @@ def build_sub_vocab(corpora, transforms, opts, n_sample, stride, offset):
             if opts.dump_samples:
                 build_sub_vocab.queues[c_name][offset].put(
                     (i, src_line, tgt_line))
-            if n_sample > 0 and ((i+1) * stride + offset) >= n_sample:
-                if opts.dump_samples:
-                    build_sub_vocab.queues[c_name][offset].put("break")
-                break
         if opts.dump_samples:
             build_sub_vocab.queues[c_name][offset].put("break")
-    return sub_counter_src, sub_counter_tgt
+    if spill:
+        return {key: counter.spill() for key, counter in counters.items()}
+    return counters
 
 
 def init_pool(queues):
@@ -318,9 +710,8 @@ def init_pool(queues):
     build_sub_vocab.queues = queues
 
 
-def build_vocab(opts, transforms, n_sample=3):
-    """Build vocabulary from data."""
-
+def _count_tokens(opts, transforms, n_sample):
+    """Count tokens of the corpora by counter name."""
     if n_sample == -1:
         logger.info(f"n_sample={n_sample}: Build vocab on full datasets.")
     elif n_sample > 0:
@@ -332,8 +723,22 @@ def build_vocab(opts, transforms, n_sample=3):
         logger.info("The samples on which the vocab is built will be "
                     "dumped to disk. It may slow down the process.")
     corpora = get_corpora(opts, is_train=True)
-    counter_src = Counter()
-    counter_tgt = Counter()
+    counters = defaultdict(Counter)
+    spill = opts.vocab_counter_size > 0
+    if spill:
+        if opts.counts_dir is None:
+            opts.counts_dir = os.path.join(
+                os.path.dirname(opts.save_data), "counts")
+        os.makedirs(opts.counts_dir, exist_ok=True)
+        if opts.counts_prefix is None:
+            # unique to this run, -counts_dir may be shared between nodes
+            opts.counts_prefix = "{}-{}".format(
+                socket.gethostname().replace('.', '-'), os.getpid())
+        elif '.' in opts.counts_prefix:
+            raise ValueError("-counts_prefix should not contain dots.")
+        logger.info(f"Partial counts will be spilled to {opts.counts_dir} "
+                    f"as {opts.counts_prefix}.")
+        paths = defaultdict(list)
     from functools import partial
     queues = {c_name: [mp.Queue(opts.vocab_sample_queue_size)
                        for i in range(opts.num_threads)]
@@ -346,17 +751,58 @@ def build_vocab(opts, transforms, n_sample=3):
             args=(sample_path, queues),
             daemon=True)
         write_process.start()
+    # each thread only reads its own part of the files
+    parts = {c_name: corpus.split(opts.num_threads, n_lines=n_sample)
+             for c_name, corpus in corpora.items()}
     with mp.Pool(opts.num_threads, init_pool, [queues]) as p:
         func = partial(
-            build_sub_vocab, corpora, transforms,
-            opts, n_sample, opts.num_threads)
-        for sub_counter_src, sub_counter_tgt in p.imap(
-                func, range(0, opts.num_threads)):
-            counter_src.update(sub_counter_src)
-            counter_tgt.update(sub_counter_tgt)
+            build_sub_vocab, corpora, transforms, opts, parts)
+        for sub_counters in p.imap(func, range(0, opts.num_threads)):
+            for key, sub_counter in sub_counters.items():
+                if spill:
+                    paths[key] += sub_counter
+                else:
+                    counters[key].update(sub_counter)
     if opts.dump_samples:
         write_process.join()
-    return counter_src, counter_tgt
+    if spill:
+        for counts_dir in opts.merge_counts:
+            for path in glob.glob(os.path.join(counts_dir, "*.counts")):
+                # named `<key>.<prefix>.<thread>.<spill>.counts`
+                paths[os.path.basename(path).rsplit('.', 4)[0]].append(path)
+        if opts.share_vocab and LangVocab.PLACEHOLDER not in opts.src_vocab:
+            paths = {'src': paths['src'] + paths['tgt']}
+        for key, key_paths in paths.items():
+            # files of this run are also found if -merge_counts lists its
+            # own -counts_dir
+            key_paths = sorted(set(os.path.realpath(path)
+                                   for path in key_paths))
+            counters[key] = merge_counts(key_paths, opts.vocab_topk)
+    return counters
+
+
+def build_vocab(opts, transforms, n_sample=3):
+    """Build vocabulary from data.
+
+    With `opts.vocab_counter_size`, the threads spill their counts to
+    `opts.counts_dir`, which are merged with the partial counts found in
+    `opts.merge_counts`. With `opts.share_vocab`, the shared counts are
+    then returned as source counts, along with empty target ones.
+    """
+    counters = _count_tokens(opts, transforms, n_sample)
+    return counters['src'], counters['tgt']
+
+
+def build_lang_vocabs(opts, transforms, n_sample=3):
+    """Build one vocabulary per language from data.
+
+    Tokens of both sides of the corpora are counted in a single pass, by
+    the `src_lang` and `tgt_lang` tags of their corpus.
+
+    Returns:
+        dict of `Counter` by language.
+    """
+    return dict(_count_tokens(opts, transforms, n_sample))
 
 
 def save_transformed_sample(opts, transforms, n_sample=3):
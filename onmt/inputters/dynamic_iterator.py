@@ -90,7 +90,9 @@ class DynamicDatasetIter(object):
         pool_factor (int): accum this number of batch before sorting;
         skip_empty_level (str): security level when encouter empty line;
         stride (int): iterate data files with this stride;
-        offset (int): iterate data files with this offset.
+        offset (int): iterate data files with this offset;
+        transforms_cache_dir (str): cache output of deterministic
+            transforms of each corpus there.
 
     Attributes:
         batch_size_fn (function): functions to calculate batch_size;
@@ -102,7 +104,8 @@ class DynamicDatasetIter(object):
     def __init__(self, corpora, corpora_info, transforms, fields, is_train,
                  batch_type, batch_size, batch_size_multiple, data_type="text",
                  bucket_size=2048, pool_factor=8192,
-                 skip_empty_level='warning', stride=1, offset=0):
+                 skip_empty_level='warning', stride=1, offset=0,
+                 transforms_cache_dir=None):
         self.corpora = corpora
         self.transforms = transforms
         self.fields = fields
@@ -124,6 +127,7 @@ class DynamicDatasetIter(object):
             raise ValueError(
                 f"Invalid argument skip_empty_level={skip_empty_level}")
         self.skip_empty_level = skip_empty_level
+        self.transforms_cache_dir = transforms_cache_dir
 
     @classmethod
     def from_opts(cls, corpora, transforms, fields, opts, is_train,
@@ -139,7 +143,9 @@ class DynamicDatasetIter(object):
             batch_size, batch_size_multiple, data_type=opts.data_type,
             bucket_size=opts.bucket_size, pool_factor=opts.pool_factor,
             skip_empty_level=opts.skip_empty_level,
-            stride=stride, offset=offset
+            stride=stride, offset=offset,
+            transforms_cache_dir=opts.transforms_cache_dir if is_train
+            else None
         )
 
     def _init_datasets(self):
@@ -147,7 +153,8 @@ class DynamicDatasetIter(object):
             self.corpora, self.transforms,
             self.corpora_info, self.is_train,
             skip_empty_level=self.skip_empty_level,
-            stride=self.stride, offset=self.offset)
+            stride=self.stride, offset=self.offset,
+            cache_dir=self.transforms_cache_dir)
         self.dataset_adapter = DatasetAdapter(self.fields, self.is_train)
         datasets_weights = {
             ds_name: int(self.corpora_info[ds_name]['weight'])
@@ -1,10 +1,11 @@
 """Module for build dynamic fields."""
 from collections import Counter, defaultdict
 import torch
+from onmt.constants import LangVocab
 from onmt.utils.logging import logger
 from onmt.utils.misc import check_path
 from onmt.inputters.inputter import get_fields, _load_vocab, \
-    _build_fields_vocab
+    _build_fields_vocab, _build_field_vocab
 
 
 def _get_dynamic_fields(opts):
@@ -22,8 +23,75 @@ def _get_dynamic_fields(opts):
     return fields
 
 
+def get_lang_vocab_path(vocab_path, lang):
+    """Vocabulary path of `lang` given a per-language `vocab_path`."""
+    return vocab_path.replace(LangVocab.PLACEHOLDER, lang)
+
+
+class LangFields(object):
+    """Fields of language pairs, with one vocabulary per language.
+
+    The vocabulary of a language is read from `opts.src_vocab`, where
+    ``{lang}`` stands for its tag. The vocabularies of a language are only
+    built when a pair first uses it, so that a modular model with an
+    encoder and a decoder per language only holds the ones it needs.
+
+    Args:
+        opts: options, with per-language `src_vocab`.
+        src_specials (list): see :func:`build_dynamic_fields`.
+        tgt_specials (list): see :func:`build_dynamic_fields`.
+    """
+
+    def __init__(self, opts, src_specials=None, tgt_specials=None):
+        self.opts = opts
+        self.specials = {'src': list(src_specials or []),
+                         'tgt': list(tgt_specials or [])}
+        self._counters = defaultdict(Counter)
+        self._vocabs = {}
+
+    def _vocab(self, lang, side):
+        if (lang, side) not in self._vocabs:
+            if lang not in self._counters:
+                _load_vocab(
+                    get_lang_vocab_path(self.opts.src_vocab, lang), lang,
+                    self._counters, min_freq=getattr(
+                        self.opts, f'{side}_words_min_frequency'))
+            field = _get_dynamic_fields(self.opts)[side].base_field
+            _build_field_vocab(
+                field, self._counters[lang],
+                size_multiple=self.opts.vocab_size_multiple,
+                max_size=getattr(self.opts, f'{side}_vocab_size'),
+                min_freq=getattr(self.opts, f'{side}_words_min_frequency'),
+                specials=self.specials[side])
+            logger.info(f" * {lang} {side} vocab size: {len(field.vocab)}.")
+            self._vocabs[(lang, side)] = field.vocab
+        return self._vocabs[(lang, side)]
+
+    def __getitem__(self, langs):
+        """Fields of the ``(src_lang, tgt_lang)`` pair `langs`."""
+        src_lang, tgt_lang = langs
+        fields = _get_dynamic_fields(self.opts)
+        fields['src'].base_field.vocab = self._vocab(src_lang, 'src')
+        fields['tgt'].base_field.vocab = self._vocab(tgt_lang, 'tgt')
+        return fields
+
+
 def build_dynamic_fields(opts, src_specials=None, tgt_specials=None):
-    """Build fields for dynamic, including load & build vocab."""
+    """Build fields for dynamic, including load & build vocab.
+
+    With per-language vocabularies, all corpora should be of the same
+    language pair, see :class:`LangFields` otherwise.
+    """
+    if LangVocab.PLACEHOLDER in opts.src_vocab:
+        pairs = {(corpus['src_lang'], corpus['tgt_lang'])
+                 for corpus in opts.data.values()}
+        if len(pairs) != 1:
+            raise ValueError("Corpora of a model should share their "
+                             f"language pair, got {sorted(pairs)}.")
+        logger.info("Building fields with per-language vocab...")
+        lang_fields = LangFields(opts, src_specials, tgt_specials)
+        return lang_fields[pairs.pop()]
+
     fields = _get_dynamic_fields(opts)
 
     counters = defaultdict(Counter)
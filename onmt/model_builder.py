@@ -13,6 +13,7 @@ from onmt.encoders import str2enc
 from onmt.decoders import str2dec
 
 from onmt.modules import Embeddings, CopyGenerator
+from onmt.modules.position_ffn import PositionwiseFeedForward
 from onmt.modules.util_class import Cast
 from onmt.utils.misc import use_gpu
 from onmt.utils.logging import logger
@@ -91,18 +92,79 @@ def load_test_model(opt, model_path=None):
 
     model = build_base_model(model_opt, fields, use_gpu(opt), checkpoint,
                              opt.gpu)
-    if opt.fp32:
-        model.float()
-    elif opt.int8:
-        if opt.gpu >= 0:
-            raise ValueError(
-                "Dynamic 8-bit quantization is not supported on GPU")
-        torch.quantization.quantize_dynamic(model, inplace=True)
+    precision = getattr(opt, "precision", None)
+    if precision is None:
+        precision = "fp32" if opt.fp32 else "int8" if opt.int8 else None
+    if precision is not None:
+        apply_precision(model, precision, opt.gpu)
     model.eval()
     model.generator.eval()
     return fields, model, model_opt
 
 
+def _quantizable_names(model, keep=None):
+    """Names of the dynamically quantizable layers of `model`, skipping
+    the ones for which `keep(name, module)` is false."""
+    quantizable = (nn.Linear, nn.LSTM, nn.GRU)
+    return {
+        name for name, module in model.named_modules()
+        if isinstance(module, quantizable)
+        and (keep is None or keep(name, module))}
+
+
+def _submodule_names(model, module_types):
+    return [name + "." for name, module in model.named_modules()
+            if isinstance(module, module_types)]
+
+
+def apply_precision(model, precision, gpu=-1):
+    """Convert a loaded model in place to an inference precision profile.
+
+    Args:
+        model (nn.Module): the model, generator included.
+        precision (str): one of
+
+            * ``fp32``: full precision.
+            * ``fp16``: half precision, GPU only.
+            * ``int8``: dynamic 8-bit quantization of every layer
+              (CPU only).
+            * ``int8_ffn``: dynamic 8-bit quantization of the
+              feed-forward layers and the generator only (CPU only).
+            * ``int8_no_attn``: dynamic 8-bit quantization of every
+              layer but the attention ones (CPU only).
+        gpu (int): device the model runs on, -1 for CPU.
+    """
+    if precision == "fp32":
+        model.float()
+        return model
+    if precision == "fp16":
+        if gpu < 0:
+            raise ValueError("fp16 inference is only supported on GPU")
+        model.half()
+        return model
+    if gpu >= 0:
+        raise ValueError(
+            "Dynamic 8-bit quantization is not supported on GPU")
+    if precision == "int8":
+        qconfig_spec = None
+    elif precision == "int8_ffn":
+        prefixes = _submodule_names(model, PositionwiseFeedForward)
+        prefixes.append("generator.")
+        qconfig_spec = _quantizable_names(
+            model, lambda name, _: name.startswith(tuple(prefixes)))
+    elif precision == "int8_no_attn":
+        prefixes = _submodule_names(
+            model, (onmt.modules.MultiHeadedAttention,
+                    onmt.modules.GlobalAttention))
+        qconfig_spec = _quantizable_names(
+            model, lambda name, _: not name.startswith(tuple(prefixes)))
+    else:
+        raise ValueError("Unknown precision profile %s" % precision)
+    torch.quantization.quantize_dynamic(
+        model, qconfig_spec=qconfig_spec, inplace=True)
+    return model
+
+
 def build_src_emb(model_opt, fields):
     # Build embeddings.
     if model_opt.model_type == "text":
@@ -111,6 +111,31 @@ def _add_dynamic_corpus_opts(parser, build_vocab_only=False):
         group.add('-vocab_sample_queue_size', '--vocab_sample_queue_size',
                   type=int, default=20,
                   help="Size of queues used in the build_vocab dump path.")
+        group.add('-vocab_counter_size', '--vocab_counter_size',
+                  type=int, default=0,
+                  help="Maximum number of distinct tokens counted in "
+                  "memory by each thread. Beyond that, counts are spilled "
+                  "to files sorted by token in -counts_dir, which are "
+                  "merged exactly at the end. Set to 0 to count in memory.")
+        group.add('-counts_dir', '--counts_dir', default=None,
+                  help="Directory of the partial counts spilled with "
+                  "-vocab_counter_size, `counts` next to -save_data by "
+                  "default. They are kept so that counts of several "
+                  "nodes can be merged with -merge_counts.")
+        group.add('-counts_prefix', '--counts_prefix', default=None,
+                  help="Prefix of the files of partial counts of this run "
+                  "in -counts_dir, without dots. Defaults to the host name "
+                  "and process id, so that nodes counting into a shared "
+                  "-counts_dir do not overwrite each other's files.")
+        group.add('-merge_counts', '--merge_counts', default=[], nargs='+',
+                  help="-counts_dir of other nodes, whose partial counts "
+                  "are added to those of this run. Requires "
+                  "-vocab_counter_size.")
+        group.add('-vocab_topk', '--vocab_topk', type=int, default=0,
+                  help="Only save this many most frequent tokens, "
+                  "with their exact counts. With -vocab_counter_size, "
+                  "only these are held in memory while merging counts. "
+                  "Set to 0 to save all tokens.")
 
 
 def _add_dynamic_fields_opts(parser, build_vocab_only=False):
@@ -124,7 +149,9 @@ def _add_dynamic_fields_opts(parser, build_vocab_only=False):
     group.add("-src_vocab", "--src_vocab", required=True,
               help=("Path to save" if build_vocab_only else "Path to")
               + " src (or shared) vocabulary file. "
-              "Format: one <word> or <word>\t<count> per line.")
+              "Format: one <word> or <word>\t<count> per line. "
+              "If it contains `{lang}`, one vocabulary per language, "
+              "for the `src_lang` and `tgt_lang` tags of the corpora.")
     group.add("-tgt_vocab", "--tgt_vocab",
               help=("Path to save" if build_vocab_only else "Path to")
               + " tgt vocabulary file. "
@@ -623,6 +650,13 @@ def _add_train_dynamic_data(parser):
     group = parser.add_argument_group("Dynamic data")
     group.add("-bucket_size", "--bucket_size", type=int, default=2048,
               help="Examples per dynamically generated torchtext Dataset.")
+    group.add("-transforms_cache_dir", "--transforms_cache_dir",
+              type=str, default=None,
+              help="Cache on disk, in this directory, the output of the "
+                   "leading deterministic transforms of each training "
+                   "corpus (e.g. tokenization without subword sampling), "
+                   "keyed by a hash of their config. Later passes over "
+                   "a corpus only apply the remaining transforms.")
 
 
 def train_opts(parser):
@@ -671,6 +705,13 @@ def _add_decoding_opts(parser):
               default=1., type=float,
               help="If doing random sampling, divide the logits by "
                    "this before computing softmax during decoding.")
+    group.add('--random_sampling_topp', '-random_sampling_topp',
+              default=0., type=float,
+              help="If in (0, 1), do nucleus sampling restricted to the "
+                   "smallest set of most likely next tokens whose "
+                   "cumulative probability reaches this value. "
+                   "Set -n_best to sample several predictions for each "
+                   "source in the same batch.")
     _add_reproducibility_opts(parser)
 
     group = parser.add_argument_group('Beam Search')
@@ -693,6 +734,11 @@ def _add_decoding_opts(parser):
               help="Length Penalty to use.")
     group.add('--ratio', '-ratio', type=float, default=-0.,
               help="Ratio based beam stop condition")
+    group.add('--early_stopping', '-early_stopping', action='store_true',
+              help="Also stop decoding a sentence once its n_best "
+                   "finished hypotheses provably cannot be beaten by any "
+                   "alive one. Only used without coverage penalty and "
+                   "with a non-decreasing length penalty (alpha >= 0).")
     group.add('--coverage_penalty', '-coverage_penalty', default='none',
               choices=['none', 'wu', 'summary'],
               help="Coverage Penalty to use.")
@@ -715,7 +761,15 @@ def translate_opts(parser):
               help="Force the model to be in FP32 "
                    "because FP16 is very slow on GTX1080(ti).")
     group.add('--int8', '-int8', action='store_true',
-              help="Enable dynamic 8-bit quantization (CPU only).")
+              help="Enable dynamic 8-bit quantization (CPU only). "
+                   "Same as -precision int8.")
+    group.add('--precision', '-precision', default=None,
+              choices=["fp32", "fp16", "int8", "int8_ffn", "int8_no_attn"],
+              help="Inference precision profile: full precision, "
+                   "half precision (GPU only), or dynamic 8-bit "
+                   "quantization (CPU only) of every layer, of the "
+                   "feed-forward layers and generator only, or of every "
+                   "layer but attention. Overrides -fp32 and -int8.")
     group.add('--avg_raw_probs', '-avg_raw_probs', action='store_true',
               help="If this is set, during ensembling scores from "
                    "different models will be combined by averaging their "
@@ -766,6 +820,64 @@ def translate_opts(parser):
                    "is sents. Tokens will do dynamic batching")
     group.add('--gpu', '-gpu', type=int, default=-1,
               help="Device to run on")
+    group.add('--stream', '-stream', action='store_true',
+              help="Pipeline reading, decoding and writing: upcoming "
+                   "shards are read in a background thread, each shard "
+                   "is decoded sorted by length and the output is "
+                   "written back in order by another thread. Memory use "
+                   "is bounded by -shard_size. Not compatible with "
+                   "-dump_beam.")
+    group.add('--num_workers', '-num_workers', type=int, default=1,
+              help="Number of CPU processes to translate with. The model "
+                   "is loaded once and shared with the workers, each "
+                   "shard is split between them and every worker gets "
+                   "its own share of the available cores (CPU only, "
+                   "without -verbose, -attn_debug, -align_debug or gold "
+                   "scores of -tgt).")
+    group.add('--shortlist', '-shortlist', type=str, default=None,
+              help="Lexical table with `src_token tgt_token [score]` "
+                   "lines, e.g. alignment-derived. When set, the output "
+                   "projection of each batch is restricted to the "
+                   "translations of its source tokens.")
+    group.add('--shortlist_topk', '-shortlist_topk', type=int, default=50,
+              help="Translations kept per source token in -shortlist.")
+    group.add('--shortlist_frequent', '-shortlist_frequent', type=int,
+              default=100,
+              help="Number of most frequent target tokens always kept "
+                   "with -shortlist.")
+    group.add('--draft_model', '-draft_model', type=str, default=None,
+              help="Path to a smaller model with the same vocabularies. "
+                   "Greedy decoding then lets it propose -draft_tokens "
+                   "tokens that the model checks in a single pass, with "
+                   "the same output as plain greedy decoding.")
+    group.add('--draft_tokens', '-draft_tokens', type=int, default=4,
+              help="Number of tokens proposed at a time by -draft_model.")
+
+
+def score_opts(parser):
+    """ Scoring options, used on top of :func:`translate_opts` """
+    group = parser.add_argument_group('Scoring')
+    group.add('--token_scores', '-token_scores', action='store_true',
+              help="Also output the log-probability of each target token "
+                   "(and of the final eos), separated from the sentence "
+                   "score by a tab.")
+
+
+def backtranslate_opts(parser):
+    """ Back-translation options, used on top of :func:`translate_opts` """
+    group = parser.add_argument_group('Back-translation')
+    group.add('--bt_dir', '-bt_dir', required=True,
+              help="Directory of the synthetic parallel shards. Each "
+                   "-shard_size lines of -src give a `name.N.src` file of "
+                   "predictions aligned with a `name.N.tgt` file of the "
+                   "monolingual lines, and are registered in its "
+                   "`corpora.yaml`, to be used as `path_corpora` of a "
+                   "-data corpus. Complete shards are skipped, so an "
+                   "interrupted run resumes where it stopped, as long as "
+                   "-src and -shard_size are unchanged.")
+    group.add('--bt_name', '-bt_name', default=None,
+              help="Name of the monolingual corpus in -bt_dir, "
+                   "defaults to the file name of -src.")
 
 
 # Copyright 2016 The Chromium Authors. All rights reserved.
@@ -242,6 +242,28 @@ diff ${DATA_DIR}/morph/tgt.valid $TMP_OUT_DIR/trans_sampling
 echo "Succeeded" | tee -a ${LOG_FILE}
 rm $TMP_OUT_DIR/trans_sampling
 
+echo -n "  [+] Testing NMT scoring..."
+${PYTHON} score.py -model ${TEST_DIR}/test_model2.pt  \
+            -src ${DATA_DIR}/morph/src.valid   \
+            -tgt ${DATA_DIR}/morph/tgt.valid   \
+            -batch_size 1024 -batch_type tokens \
+            -token_scores               \
+            -out $TMP_OUT_DIR/scores  >> ${LOG_FILE} 2>&1
+[ "$?" -eq 0 ] || error_exit
+[ "$(wc -l < $TMP_OUT_DIR/scores)" -eq "$(wc -l < ${DATA_DIR}/morph/tgt.valid)" ] || error_exit
+echo "Succeeded" | tee -a ${LOG_FILE}
+rm $TMP_OUT_DIR/scores
+
+echo -n "  [+] Testing NMT back-translation..."
+${PYTHON} backtranslate.py -model ${TEST_DIR}/test_model2.pt  \
+            -src ${DATA_DIR}/morph/src.valid   \
+            -shard_size 500 -batch_size 10 \
+            -bt_dir $TMP_OUT_DIR/bt  >> ${LOG_FILE} 2>&1
+[ "$?" -eq 0 ] || error_exit
+[ "$(cat $TMP_OUT_DIR/bt/src.valid.*.tgt | wc -l)" -eq "$(wc -l < ${DATA_DIR}/morph/src.valid)" ] || error_exit
+echo "Succeeded" | tee -a ${LOG_FILE}
+rm -r $TMP_OUT_DIR/bt
+
 echo -n "  [+] Testing LM generation..."
 head ${DATA_DIR}/src-test.txt > $TMP_OUT_DIR/src-test.txt
 ${PYTHON} translate.py -model ${TEST_DIR}/test_model_lm.pt -src $TMP_OUT_DIR/src-test.txt -verbose >> ${LOG_FILE} 2>&1
@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+
+import yaml
+
+from onmt.bin.backtranslate import MANIFEST, SETTINGS, _get_parser, \
+    backtranslate, shard_paths
+from onmt.utils.parse import ArgumentParser
+
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL = os.path.join(TEST_DIR, "test_model.pt")
+SRC = os.path.join(TEST_DIR, "..", "..", "data", "src-test.txt")
+
+
+class TestBacktranslate(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.bt_dir = os.path.join(self.tmp_dir.name, "bt")
+        self.src = os.path.join(self.tmp_dir.name, "mono.txt")
+        with open(SRC, "rb") as f_in, open(self.src, "wb") as f_out:
+            f_out.writelines(next(f_in) for _ in range(12))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _backtranslate(self, *args):
+        opt = _get_parser().parse_args(
+            ["-model", MODEL, "-src", self.src, "-bt_dir", self.bt_dir,
+             "-batch_size", "4", "-max_length", "10"] + list(args))
+        backtranslate(opt)
+        with open(os.path.join(self.bt_dir, MANIFEST)) as f:
+            return yaml.safe_load(f)
+
+    def test_resume(self):
+        corpora = self._backtranslate("-shard_size", "5")
+        self.assertEqual(
+            sorted(corpora), ["mono.txt_%05d" % i for i in range(3)]
+            + [SETTINGS])
+        self.assertEqual(corpora[SETTINGS]["mono.txt"]["shard_size"], 5)
+        path_src, _ = shard_paths(self.bt_dir, "mono.txt", 0)
+        with open(path_src, "w") as f:
+            f.write("kept\n")
+        self.assertEqual(self._backtranslate("-shard_size", "5"), corpora)
+        with open(path_src) as f:
+            self.assertEqual(f.read(), "kept\n")
+
+    def test_other_settings_are_refused(self):
+        self._backtranslate("-shard_size", "5")
+        with self.assertRaises(ValueError):
+            self._backtranslate("-shard_size", "4")
+        with open(self.src, "a") as f:
+            f.write("one more line\n")
+        with self.assertRaises(ValueError):
+            self._backtranslate("-shard_size", "5")
+        self._backtranslate("-shard_size", "4", "-bt_name", "other")
+
+    def _expand(self, weight):
+        return ArgumentParser._expand_corpora(
+            {"bt": {"path_corpora": os.path.join(self.bt_dir, MANIFEST),
+                    "weight": weight}})
+
+    def test_manifest_settings_are_not_corpora(self):
+        corpora = self._backtranslate("-shard_size", "5")
+        expanded = self._expand(3)
+        self.assertEqual(sorted(expanded), ["bt_mono.txt_%05d" % i
+                                            for i in range(3)])
+        self.assertEqual(expanded["bt_mono.txt_00000"],
+                         {**corpora["mono.txt_00000"], "weight": 1})
+
+    def test_shards_share_the_corpus_weight(self):
+        self._backtranslate("-shard_size", "5")
+        expanded = self._expand(8)
+        self.assertEqual([expanded["bt_mono.txt_%05d" % i]["weight"]
+                          for i in range(3)], [3, 3, 2])
+        self._backtranslate("-shard_size", "5", "-bt_name", "other")
+        expanded = self._expand(8)
+        self.assertEqual(len(expanded), 6)
+        self.assertEqual(
+            sum(corpus["weight"] for corpus in expanded.values()), 8)
+        with self.assertRaises(ValueError):
+            self._expand(5)
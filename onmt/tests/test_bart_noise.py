@@ -0,0 +1,97 @@
+import math
+import random
+import unittest
+
+import numpy as np
+import torch
+
+from onmt.transforms.bart import BARTNoising
+
+MASK = "<mask>"
+
+
+class TestBARTNoisingBatch(unittest.TestCase):
+    def setUp(self):
+        random.seed(0)
+        np.random.seed(0)
+        torch.manual_seed(0)
+        self.vocab = ["v%d" % i for i in range(100)]
+        self.batch = []
+        for i in range(200):
+            tokens = []
+            for j in range(random.randint(1, 30)):
+                word = random.choice("abcd.")
+                if j > 0 and word != "." and random.random() < 0.3:
+                    word = "￭" + word
+                tokens.append(word)
+            self.batch.append(tokens)
+
+    def _noised(self, **kwargs):
+        noise = BARTNoising(self.vocab, mask_tok=MASK, **kwargs)
+        return noise.apply_batch([list(tokens) for tokens in self.batch])
+
+    def test_empty_batch(self):
+        noise = BARTNoising(self.vocab, mask_tok=MASK, mask_ratio=0.5,
+                            replace_length=1)
+        self.assertEqual(noise.apply_batch([]), [])
+
+    def test_permute_sentences(self):
+        for tokens, noised in zip(self.batch,
+                                  self._noised(permute_sent_ratio=1.0,
+                                               replace_length=1)):
+            self.assertEqual(sorted(noised), sorted(tokens))
+            self.assertEqual(noised.count("."), tokens.count("."))
+
+    def test_token_masking(self):
+        for tokens, noised in zip(self.batch,
+                                  self._noised(mask_ratio=0.5,
+                                               replace_length=1)):
+            self.assertEqual(len(noised), len(tokens))
+            self.assertEqual(noised.count(MASK), math.ceil(len(tokens) * .5))
+            for tok, noised_tok in zip(tokens, noised):
+                self.assertIn(noised_tok, [tok, MASK])
+
+    def test_span_masking_keeps_order(self):
+        for tokens, noised in zip(self.batch,
+                                  self._noised(mask_ratio=0.3,
+                                               mask_length="span-poisson",
+                                               replace_length=-1,
+                                               is_joiner=True)):
+            # 0-length spans insert masks, others replace each token
+            remaining = iter(tokens)
+            self.assertTrue(all(tok in remaining for tok in noised
+                                if tok != MASK))
+            self.assertGreaterEqual(len(noised), len(tokens))
+
+    def test_insertion_noise(self):
+        for tokens, noised in zip(self.batch,
+                                  self._noised(insert_ratio=0.2,
+                                               random_ratio=0.5,
+                                               replace_length=1)):
+            n_insert = math.ceil(len(tokens) * 0.2)
+            self.assertEqual(len(noised), len(tokens) + n_insert)
+            self.assertEqual(
+                [tok for tok in noised
+                 if tok != MASK and tok not in self.vocab], tokens)
+
+    def test_rolling_noise(self):
+        for tokens, noised in zip(self.batch,
+                                  self._noised(rotate_ratio=1.0,
+                                               replace_length=1)):
+            self.assertIn(noised, [tokens[i:] + tokens[:i]
+                                   for i in range(len(tokens))])
+
+    def test_same_distribution_as_apply(self):
+        noise = BARTNoising(self.vocab, mask_tok=MASK, mask_ratio=0.3,
+                            mask_length="span-poisson", replace_length=1,
+                            random_ratio=0.2, is_joiner=True)
+        per_example, batched = [], []
+        for _ in range(20):
+            per_example += [noise.apply(list(tokens))
+                            for tokens in self.batch]
+            batched += noise.apply_batch(self.batch)
+        for count in [len, lambda tokens: tokens.count(MASK)]:
+            expected = np.mean([count(tokens) for tokens in per_example])
+            self.assertAlmostEqual(
+                np.mean([count(tokens) for tokens in batched]) / expected,
+                1.0, delta=0.05)
@@ -569,6 +569,74 @@ class TestBeamWithLengthPenalty(TestBeamSearchAgainstReferenceCase):
         self.third_step(beam, expected_beam_scores, 5)
 
 
+class TestBeamSearchEarlyStopping(unittest.TestCase):
+    BEAM_SZ = 2
+    N_WORDS = 20
+    EOS_IDX = 2
+
+    def advance_two_steps(self, early_stopping, alpha=1.,
+                          second_probs=(-3., -4.)):
+        scorer = GNMTGlobalScorer(alpha, 0., "wu", "none")
+        beam = BeamSearch(
+            self.BEAM_SZ, 1, 0, 1, self.EOS_IDX, 1,
+            scorer,
+            0, 5, False, 0, set(),
+            False, 0., early_stopping=early_stopping)
+        device_init = torch.zeros(1, 1)
+        beam.initialize(device_init, torch.randint(0, 30, (1,)))
+        # first step: best hyp goes on, second best one finishes
+        word_probs = torch.full((self.BEAM_SZ, self.N_WORDS), -float('inf'))
+        word_probs[0, 10] = -0.1
+        word_probs[0, self.EOS_IDX] = -0.2
+        beam.advance(word_probs, torch.randn(1, self.BEAM_SZ, 53))
+        self.assertFalse(beam.is_finished[0, 0])
+        self.assertTrue(beam.is_finished[0, 1])
+        beam.update_finished()
+        self.assertFalse(beam.done)
+        # second step: alive hyps become much worse than the finished one
+        word_probs = torch.full((self.BEAM_SZ, self.N_WORDS), -float('inf'))
+        word_probs[0, 11], word_probs[0, 12] = second_probs
+        beam.advance(word_probs, torch.randn(1, self.BEAM_SZ, 53))
+        return beam
+
+    def test_beam_is_done_when_finished_hyp_is_unbeatable(self):
+        beam = self.advance_two_steps(early_stopping=True)
+        self.assertTrue(beam.is_finished.all())
+        beam.update_finished()
+        self.assertTrue(beam.done)
+        self.assertEqual(beam.predictions[0][0].tolist(), [self.EOS_IDX])
+        self.assertAlmostEqual(beam.scores[0][0].item(), -0.2 / (7 / 6),
+                               places=5)
+
+    def test_tie_does_not_finish_alive_hyps(self):
+        # without length penalty, the best alive hyp scores as much as
+        # the finished one and could only be worse once finished
+        beam = self.advance_two_steps(
+            early_stopping=True, alpha=0., second_probs=(-0.1, -4.))
+        self.assertFalse(beam.is_finished.any())
+        word_probs = torch.full((self.BEAM_SZ, self.N_WORDS), -float('inf'))
+        word_probs[:, 13] = -1.
+        beam.advance(word_probs, torch.randn(1, self.BEAM_SZ, 53))
+        self.assertTrue(beam.is_finished.all())
+        beam.update_finished()
+        self.assertTrue(beam.done)
+        self.assertEqual(beam.predictions[0][0].tolist(), [self.EOS_IDX])
+        self.assertAlmostEqual(beam.scores[0][0].item(), -0.2, places=5)
+
+    def test_beam_goes_on_without_early_stopping(self):
+        beam = self.advance_two_steps(early_stopping=False)
+        self.assertFalse(beam.is_finished.any())
+
+    def test_early_stopping_needs_monotone_penalties(self):
+        scorer = GNMTGlobalScorer(0., 1., "none", "summary")
+        beam = BeamSearch(
+            self.BEAM_SZ, 1, 0, 1, self.EOS_IDX, 1,
+            scorer,
+            0, 5, False, 0, set(),
+            False, 0., early_stopping=True)
+        self.assertFalse(beam.early_stopping)
+
+
 class TestBeamSearchLM(TestBeamSearchAgainstReferenceCase):
     def finish_first_beam_step(self, beam):
         scores_finish = torch.log_softmax(torch.tensor(
@@ -0,0 +1,41 @@
+import os
+import tempfile
+import unittest
+
+from onmt.bin.benchmark_precision import PROFILES, _get_parser, benchmark
+
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL = os.path.join(TEST_DIR, "test_model.pt")
+SRC = os.path.join(TEST_DIR, "..", "..", "data", "src-test.txt")
+
+
+class TestBenchmarkPrecision(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.src = os.path.join(self.tmp_dir.name, "src.txt")
+        with open(SRC, "rb") as f_in, open(self.src, "wb") as f_out:
+            f_out.writelines(next(f_in) for _ in range(5))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _benchmark(self, *args):
+        opt = _get_parser().parse_args(
+            ["-model", MODEL, "-src", self.src, "-max_length", "10"]
+            + list(args))
+        return benchmark(opt)
+
+    def test_default_profiles(self):
+        results = self._benchmark()
+        self.assertEqual([precision for precision, _ in results],
+                         PROFILES["cpu"])
+        for _, result in results:
+            self.assertEqual(sorted(result), ["tok/s", "weights (MB)"])
+        weights = dict((precision, result["weights (MB)"])
+                       for precision, result in results)
+        self.assertLess(weights["int8"], weights["fp32"])
+
+    def test_unsupported_profiles_are_skipped(self):
+        results = self._benchmark("-profiles", "fp16", "int8")
+        self.assertEqual([precision for precision, _ in results], ["int8"])
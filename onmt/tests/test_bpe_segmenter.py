@@ -0,0 +1,50 @@
+import io
+import random
+import unittest
+
+from onmt.transforms.tokenize import BPESegmenter
+
+try:
+    from subword_nmt.apply_bpe import BPE
+except ImportError:
+    BPE = None
+
+CODES = """#version: 0.2
+a b
+ab c</w>
+b a
+c c
+ab a
+a b</w>
+cc a
+"""
+
+
+@unittest.skipIf(BPE is None, "subword_nmt is not installed")
+class TestBPESegmenter(unittest.TestCase):
+    def setUp(self):
+        random.seed(0)
+        self.bpe = BPE(io.StringIO(CODES))
+        self.words = ["".join(random.choices("abc", k=random.randint(1, 8)))
+                      for _ in range(200)]
+
+    def test_same_segmentation_as_subword_nmt(self):
+        segmenter = BPESegmenter(self.bpe, cache_size=10)
+        self.assertEqual(segmenter.segment_tokens(self.words),
+                         self.bpe.segment_tokens(self.words))
+        self.assertEqual(len(segmenter.cache), 10)
+
+    def test_segment_batch(self):
+        segmenter = BPESegmenter(self.bpe)
+        batch = [self.words[i:i + 10] for i in range(0, 200, 10)]
+        self.assertEqual(
+            segmenter.segment_batch(batch),
+            [self.bpe.segment_tokens(tokens) for tokens in batch])
+
+    def test_dropout_is_not_cached(self):
+        segmenter = BPESegmenter(self.bpe)
+        self.assertEqual(segmenter.segment_word("abab", dropout=1.0),
+                         ["a@@", "b@@", "a@@", "b"])
+        self.assertEqual(len(segmenter.cache), 0)
+        self.assertEqual(segmenter.segment_word("abab"),
+                         self.bpe.segment_tokens(["abab"]))
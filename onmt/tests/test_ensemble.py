@@ -0,0 +1,70 @@
+import unittest
+
+import torch
+import torch.nn as nn
+
+from onmt.decoders.ensemble import StackedLinear, StackedLayerNorm, \
+    StackedEmbedding, StackedGenerator, is_stackable, stack_modules
+from onmt.modules.position_ffn import PositionwiseFeedForward
+from onmt.modules.util_class import Cast
+
+
+class TestStackedModules(unittest.TestCase):
+    N_MODELS = 3
+    BATCH_SZ = 4
+
+    def per_model(self, modules, x, batch_dim=0):
+        return torch.cat([
+            module(chunk) for module, chunk in
+            zip(modules, x.chunk(self.N_MODELS, batch_dim))], batch_dim)
+
+    def test_linear(self):
+        linears = [nn.Linear(5, 7) for _ in range(self.N_MODELS)]
+        x = torch.randn(self.N_MODELS * self.BATCH_SZ, 2, 5)
+        self.assertTrue(torch.allclose(
+            StackedLinear(linears)(x), self.per_model(linears, x),
+            atol=1e-6))
+
+    def test_layer_norm(self):
+        layer_norms = [nn.LayerNorm(5) for _ in range(self.N_MODELS)]
+        for layer_norm in layer_norms:
+            nn.init.normal_(layer_norm.weight)
+            nn.init.normal_(layer_norm.bias)
+        x = torch.randn(self.N_MODELS * self.BATCH_SZ, 2, 5)
+        self.assertTrue(torch.allclose(
+            StackedLayerNorm(layer_norms)(x),
+            self.per_model(layer_norms, x), atol=1e-6))
+
+    def test_embedding(self):
+        embeddings = [nn.Embedding(10, 5) for _ in range(self.N_MODELS)]
+        x = torch.randint(0, 10, (2, self.N_MODELS * self.BATCH_SZ))
+        self.assertTrue(torch.equal(
+            StackedEmbedding(embeddings)(x),
+            self.per_model(embeddings, x, batch_dim=1)))
+
+    def test_generator(self):
+        generators = [
+            nn.Sequential(nn.Linear(5, 10), Cast(torch.float32),
+                          nn.LogSoftmax(dim=-1))
+            for _ in range(self.N_MODELS)]
+        hidden = torch.randn(self.N_MODELS * self.BATCH_SZ, 5)
+        expected = torch.stack([
+            generator(h) for generator, h in
+            zip(generators, hidden.chunk(self.N_MODELS))]).mean(0)
+        self.assertTrue(torch.allclose(
+            StackedGenerator(generators)(hidden), expected, atol=1e-6))
+
+    def test_stack_feed_forward(self):
+        ffns = [PositionwiseFeedForward(5, 8) for _ in range(self.N_MODELS)]
+        for ffn in ffns:
+            ffn.eval()
+        self.assertTrue(is_stackable(ffns[0]))
+        stacked = stack_modules(ffns)
+        x = torch.randn(self.N_MODELS * self.BATCH_SZ, 2, 5)
+        self.assertTrue(torch.allclose(
+            stacked(x), self.per_model(ffns, x), atol=1e-5))
+
+    def test_embedding_outside_embeddings_is_not_stackable(self):
+        module = nn.Module()
+        module.relative_positions_embeddings = nn.Embedding(4, 5)
+        self.assertFalse(is_stackable(module))
@@ -1,7 +1,13 @@
 import unittest
-from onmt.translate.greedy_search import GreedySearch
+from argparse import Namespace
+from collections import Counter
+
+from onmt.modules.copy_generator import collapse_copy_scores
+from onmt.translate.greedy_search import GreedySearch, \
+    sample_with_temperature
 
 import torch
+from torchtext.vocab import Vocab
 
 
 class TestGreedySearch(unittest.TestCase):
@@ -214,3 +220,82 @@ class TestGreedySearch(unittest.TestCase):
                     if b != 0 and b != 8:
                         self.assertEqual(samp.scores[b], [0])
                 self.assertTrue(samp.done)
+
+    def test_topp_samples_only_from_nucleus(self):
+        n_words = 100
+        probs = torch.full((1, n_words), 0.1 / (n_words - 3))
+        probs[0, 10], probs[0, 20], probs[0, 30] = 0.5, 0.3, 0.1
+        logits = probs.log().repeat(500, 1)
+        for topp, nucleus in [(0.5, {10}), (0.75, {10, 20}),
+                              (0.85, {10, 20, 30})]:
+            topk_ids, topk_scores = sample_with_temperature(
+                logits, 1., -1, topp)
+            self.assertTrue(set(topk_ids.view(-1).tolist()) <= nucleus)
+            # scores are the unmasked log-probabilities
+            self.assertTrue(topk_scores.allclose(
+                logits.gather(1, topk_ids)))
+
+    def test_n_samples_per_source(self):
+        batch_sz, n_samples, n_words = 3, 4, 100
+        eos_idx = 2
+        lengths = torch.randint(1, 30, (batch_sz,))
+        samp = GreedySearch(
+            0, 1, eos_idx, batch_sz, 0,
+            False, set(), False, 30, 1., -1, 0.9, n_samples)
+        memory_bank = torch.randn(30, batch_sz, 8)
+        fn_map_state, memory_bank, memory_lengths, _ = samp.initialize(
+            memory_bank, lengths)
+        self.assertEqual(memory_bank.size(1), batch_sz * n_samples)
+        self.assertTrue(memory_lengths.eq(
+            lengths.repeat_interleave(n_samples)).all())
+        state = fn_map_state(torch.arange(batch_sz), dim=0)
+        self.assertEqual(
+            state.tolist(), torch.arange(batch_sz).repeat_interleave(
+                n_samples).tolist())
+        for i in range(5):
+            word_probs = torch.randn(
+                samp.alive_seq.size(0), n_words).log_softmax(-1)
+            if i == 4:
+                word_probs.fill_(-float('inf'))
+                word_probs[:, eos_idx] = 0
+            samp.advance(word_probs, None)
+            if samp.is_finished.any():
+                samp.update_finished()
+        self.assertTrue(samp.done)
+        for b in range(batch_sz):
+            self.assertEqual(len(samp.predictions[b]), n_samples)
+            self.assertEqual(len(samp.scores[b]), n_samples)
+
+    def test_n_samples_batch_offset_maps_paths_to_sources(self):
+        batch_sz, n_samples, n_words = 3, 2, 10
+        eos_idx = 2
+        samp = GreedySearch(
+            0, 1, eos_idx, batch_sz, 0,
+            False, set(), False, 30, 1., -1, 0.9, n_samples)
+        samp.initialize(torch.randn(5, batch_sz, 8),
+                        torch.full((batch_sz,), 5))
+        self.assertEqual(samp.batch_offset.tolist(), [0, 0, 1, 1, 2, 2])
+        # second samples of sources 0 and 1 end
+        word_probs = torch.full((batch_sz * n_samples, n_words),
+                                -float('inf'))
+        word_probs[:, 5] = 0
+        word_probs[[1, 3], 5] = -float('inf')
+        word_probs[[1, 3], eos_idx] = 0
+        samp.advance(word_probs, None)
+        samp.update_finished()
+        self.assertEqual(samp.batch_offset.tolist(), [0, 1, 2, 2])
+
+        # copy scores of each path are collapsed with its source vocab
+        tgt_vocab = Vocab(Counter("abc"), specials=["<unk>"])
+        src_vocabs = [Vocab(Counter(word), specials=["<unk>"])
+                      for word in "abc"]
+        batch = Namespace(indices=torch.tensor([2, 0, 1]))
+        # all the probability is on copying the first source word
+        scores = torch.zeros(4, 1, len(tgt_vocab) + 2)
+        scores[:, :, len(tgt_vocab) + 1] = 1
+        scores = collapse_copy_scores(
+            scores, batch, tgt_vocab, src_vocabs, batch_dim=0,
+            batch_offset=samp.batch_offset)
+        copied = scores[:, 0, :len(tgt_vocab)].argmax(-1)
+        self.assertEqual(
+            [tgt_vocab.itos[i] for i in copied], ["c", "a", "b", "b"])
@@ -7,7 +7,8 @@ import onmt
 import onmt.inputters
 import onmt.opts
 from onmt.model_builder import build_embeddings, \
-    build_encoder, build_decoder
+    build_encoder, build_decoder, apply_precision
+from onmt.modules.position_ffn import PositionwiseFeedForward
 from onmt.utils.parse import ArgumentParser
 
 parser = ArgumentParser(description='train.py')
@@ -214,3 +215,41 @@ if onmt.models.sru.check_sru_requirement():
 
 for p in tests_nmtmodel:
     _add_test(p, 'nmtmodel_forward')
+
+
+class TestPrecisionProfiles(unittest.TestCase):
+
+    def build_model(self):
+        model = torch.nn.Module()
+        model.self_attn = onmt.modules.MultiHeadedAttention(2, 8)
+        model.feed_forward = PositionwiseFeedForward(8, 16)
+        # neither feed-forward nor attention, e.g. an embedding projection
+        model.emb_proj = torch.nn.Linear(8, 8)
+        model.generator = torch.nn.Sequential(torch.nn.Linear(8, 10))
+        return model
+
+    def quantized(self, model):
+        return {name for name, module in model.named_modules()
+                if isinstance(module, torch.nn.quantized.dynamic.Linear)}
+
+    def test_int8_ffn(self):
+        model = apply_precision(self.build_model(), "int8_ffn")
+        self.assertEqual(self.quantized(model), {
+            "feed_forward.w_1", "feed_forward.w_2", "generator.0"})
+        self.assertIsInstance(model.emb_proj, torch.nn.Linear)
+
+    def test_int8_no_attn(self):
+        model = apply_precision(self.build_model(), "int8_no_attn")
+        self.assertEqual(self.quantized(model), {
+            "feed_forward.w_1", "feed_forward.w_2", "emb_proj",
+            "generator.0"})
+        self.assertIsInstance(
+            model.self_attn.linear_keys, torch.nn.Linear)
+
+    def test_int8(self):
+        model = apply_precision(self.build_model(), "int8")
+        self.assertIn("self_attn.linear_keys", self.quantized(model))
+
+    def test_fp16_needs_gpu(self):
+        with self.assertRaises(ValueError):
+            apply_precision(self.build_model(), "fp16")
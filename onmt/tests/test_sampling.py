@@ -0,0 +1,97 @@
+import random
+import unittest
+from argparse import Namespace
+
+import numpy as np
+
+from onmt.transforms.sampling import HammingDistanceSampling, \
+    SwitchOutTransform, TokenDropTransform, TokenMaskTransform
+from onmt.transforms.transform import TransformStatistics
+
+
+class TestHammingDistanceSamplingBatch(unittest.TestCase):
+    def setUp(self):
+        random.seed(0)
+        np.random.seed(0)
+        self.opts = Namespace(
+            seed=-1, switchout_temperature=0.5, tokendrop_temperature=0.5,
+            tokenmask_temperature=0.5)
+        self.vocab = ["v%d" % i for i in range(5)]
+        self.vocabs = {side: Namespace(itos=self.vocab)
+                       for side in ["src", "tgt"]}
+
+    def _batch(self):
+        return [{"src": ["v%d" % random.randint(0, 4)
+                         for _ in range(random.randint(1, 20))],
+                 "tgt": ["t%d" % i for i in range(random.randint(1, 5))]}
+                for _ in range(100)]
+
+    def test_distance_distribution(self):
+        sampling = HammingDistanceSampling()
+        for n_tokens in [1, 4, 300]:
+            logits = np.arange(n_tokens) * -0.5
+            probs = np.exp(logits) / np.exp(logits).sum()
+            distances = sampling._batch_sample_distance(
+                np.full(20000, n_tokens), 0.5)
+            self.assertTrue((distances < n_tokens).all())
+            frequencies = np.bincount(distances, minlength=n_tokens) / 20000
+            self.assertLess(np.abs(frequencies - probs).max(), 0.02)
+
+    def test_switchout(self):
+        transform = SwitchOutTransform(self.opts)
+        transform.warm_up(self.vocabs)
+        batch = self._batch()
+        stats = TransformStatistics()
+        noised = transform.batch_apply(
+            [dict(example) for example in batch], is_train=True,
+            stats=stats)
+        n_switchouted = 0
+        for example, noised_example in zip(batch, noised):
+            for side in ["src", "tgt"]:
+                self.assertEqual(len(noised_example[side]),
+                                 len(example[side]))
+                n_switchouted += sum(
+                    tok != noised_tok for tok, noised_tok
+                    in zip(example[side], noised_example[side]))
+        self.assertEqual(stats.n_switchouted, n_switchouted)
+        self.assertTrue(all(tok in self.vocab for example in noised
+                            for tok in example["src"]))
+
+    def test_token_drop(self):
+        transform = TokenDropTransform(self.opts)
+        transform.warm_up(None)
+        batch = self._batch()
+        stats = TransformStatistics()
+        noised = transform.batch_apply(
+            [dict(example) for example in batch], is_train=True,
+            stats=stats)
+        n_dropped = 0
+        for example, noised_example in zip(batch, noised):
+            for side in ["src", "tgt"]:
+                kept = iter(example[side])
+                self.assertTrue(all(tok in kept
+                                    for tok in noised_example[side]))
+                n_dropped += len(example[side]) - len(noised_example[side])
+        self.assertEqual(stats.n_dropped, n_dropped)
+
+    def test_token_mask(self):
+        transform = TokenMaskTransform(self.opts)
+        transform.warm_up(None)
+        batch = self._batch()
+        noised = transform.batch_apply(
+            [dict(example) for example in batch], is_train=True)
+        for example, noised_example in zip(batch, noised):
+            for side in ["src", "tgt"]:
+                self.assertEqual(len(noised_example[side]),
+                                 len(example[side]))
+                for tok, noised_tok in zip(example[side],
+                                           noised_example[side]):
+                    self.assertIn(noised_tok,
+                                  [tok, TokenMaskTransform.MASK_TOK])
+
+    def test_not_train(self):
+        transform = TokenDropTransform(self.opts)
+        transform.warm_up(None)
+        batch = self._batch()
+        self.assertEqual(transform.batch_apply(
+            [dict(example) for example in batch]), batch)
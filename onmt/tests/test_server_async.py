@@ -0,0 +1,59 @@
+import os
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from onmt.translate import TranslationServer
+from onmt.translate.server_requests import STATUS_OK, translate_request
+from onmt.bin.server_async import build_app
+
+try:
+    from aiohttp.test_utils import TestClient, TestServer
+except ImportError:
+    TestClient = None
+
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+@unittest.skipIf(TestClient is None, "aiohttp is not installed")
+class TestAsyncServer(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.translation_server = TranslationServer()
+        self.translation_server.preload_model(
+            {"models": ["test_model.pt"]}, model_id=0, model_root=TEST_DIR,
+            load=True)
+        self.executor = ThreadPoolExecutor(max_workers=2)
+        app = build_app(self.translation_server, self.executor)
+        self.client = TestClient(TestServer(app))
+        await self.client.start_server()
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        self.executor.shutdown()
+
+    async def test_health(self):
+        response = await self.client.get("/translator/health")
+        self.assertEqual(response.status, 200)
+        self.assertEqual(await response.json(), {"status": STATUS_OK})
+
+    async def test_models(self):
+        response = await self.client.get("/translator/models")
+        models = await response.json()
+        self.assertEqual([model["model_id"] for model in models], [0])
+
+    async def test_translate(self):
+        inputs = [{"id": 0, "src": "hello how are you today"},
+                  {"id": 0, "src": "good morning to you ."}]
+        response = await self.client.post("/translator/translate",
+                                          json=inputs)
+        self.assertEqual(response.status, 200)
+        out = await response.json()
+        expected = translate_request(self.translation_server, inputs)
+        self.assertEqual([[r["tgt"] for r in best] for best in out],
+                         [[r["tgt"] for r in best] for best in expected])
+
+    async def test_unload_model(self):
+        response = await self.client.get("/translator/unload_model/0")
+        self.assertEqual(await response.json(),
+                         {"model_id": 0, "status": STATUS_OK})
+        self.assertFalse(self.translation_server.models[0].loaded)
@@ -0,0 +1,56 @@
+import unittest
+from collections import Counter
+import os
+import tempfile
+
+import torch
+import torch.nn as nn
+from torchtext.vocab import Vocab
+
+from onmt.translate.shortlist import Shortlist
+
+
+class TestShortlist(unittest.TestCase):
+
+    def setUp(self):
+        specials = ['<unk>', '<blank>', '<s>', '</s>']
+        self.src_vocab = Vocab(Counter({'a': 3, 'b': 2, 'c': 1}),
+                               specials=specials)
+        self.tgt_vocab = Vocab(Counter({'x': 3, 'y': 2, 'z': 1, 'w': 1}),
+                               specials=specials)
+        fd, self.path = tempfile.mkstemp()
+        with os.fdopen(fd, "w") as f:
+            f.write("a y 0.2\na z 0.7\nb w\nb w\nb z\nunknown z 1.\n")
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_candidates(self):
+        shortlist = Shortlist.from_file(
+            self.path, self.src_vocab, self.tgt_vocab, topk=1,
+            n_frequent=5)
+        stoi = self.src_vocab.stoi
+        src = torch.tensor([[stoi['a'], stoi['b']],
+                            [stoi['c'], 1]]).unsqueeze(2)
+        candidates = shortlist.candidates(src)
+        tgt_stoi = self.tgt_vocab.stoi
+        self.assertEqual(
+            candidates.tolist(),
+            list(range(5)) + sorted([tgt_stoi['z'], tgt_stoi['w']]))
+
+    def test_frequent_only(self):
+        shortlist = Shortlist.from_file(
+            self.path, self.src_vocab, self.tgt_vocab, topk=1,
+            n_frequent=5)
+        src = torch.tensor([[self.src_vocab.stoi['c']]]).unsqueeze(2)
+        self.assertEqual(shortlist.candidates(src).tolist(), list(range(5)))
+
+    def test_slice_generator(self):
+        generator = nn.Sequential(
+            nn.Linear(4, len(self.tgt_vocab)), nn.LogSoftmax(dim=-1))
+        candidates = torch.tensor([0, 1, 2, 3, 6])
+        generate = Shortlist.slice_generator(generator, candidates)
+        dec_out = torch.randn(3, 4)
+        scores = generator[0](dec_out)[:, candidates]
+        expected = torch.log_softmax(scores, dim=-1)
+        self.assertTrue(torch.allclose(generate(dec_out), expected))
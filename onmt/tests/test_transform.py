@@ -0,0 +1,125 @@
+import os
+import tempfile
+import unittest
+from argparse import Namespace
+
+from onmt.inputters.corpus import ParallelCorpus, ParallelCorpusIterator, \
+    TransformCache
+from onmt.transforms import TransformPipe, get_transforms_cls
+
+try:
+    import subword_nmt
+except ImportError:
+    subword_nmt = None
+
+
+def _examples():
+    sentences = [("a b c", "a"), ("ab ca bc abc", "c b"), ("c a", "b c a"),
+                 ("cab", "abc cc ab a b c"), ("ba", "ba")]
+    return [{"src": src.split(), "tgt": tgt.split(), "indices": i}
+            for i, (src, tgt) in enumerate(sentences)]
+
+
+class TestTransformPipeBatchApply(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        codes = os.path.join(self.tmp_dir.name, "codes")
+        with open(codes, "w", encoding="utf-8") as f:
+            f.write("#version: 0.2\na b\nab c</w>\nb a\nc c\n")
+        self.opts = Namespace(
+            seed=-1, src_seq_length=3, tgt_seq_length=4, share_vocab=True,
+            src_subword_model=codes, tgt_subword_model=codes,
+            src_subword_nbest=1, tgt_subword_nbest=1,
+            src_subword_alpha=0, tgt_subword_alpha=0,
+            src_subword_vocab="", tgt_subword_vocab="",
+            src_vocab_threshold=0, tgt_vocab_threshold=0,
+            bpe_cache_size=10, tokendrop_temperature=1.0)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _pipe(self, names):
+        transforms = []
+        for transform_cls in get_transforms_cls(names).values():
+            transform = transform_cls(self.opts)
+            transform.warm_up()
+            transforms.append(transform)
+        return TransformPipe.build_from(transforms)
+
+    def _check_same_as_apply(self, names):
+        pipe = self._pipe(names)
+        expected = [pipe.apply(example) for example in _examples()]
+        expected = [example for example in expected if example is not None]
+        expected_stats = pipe.stats()
+        self.assertEqual(pipe.batch_apply(_examples()), expected)
+        self.assertEqual(pipe.stats(), expected_stats)
+        return expected
+
+    def test_filter(self):
+        kept = self._check_same_as_apply(["filtertoolong"])
+        self.assertEqual([example["indices"] for example in kept], [0, 2, 4])
+
+    @unittest.skipIf(subword_nmt is None, "subword_nmt is not installed")
+    def test_bpe(self):
+        self._check_same_as_apply(["bpe", "filtertoolong"])
+
+    def test_empty_batch(self):
+        pipe = self._pipe(["filtertoolong"])
+        self.assertEqual(pipe.batch_apply([]), [])
+
+    def test_split_deterministic(self):
+        pipe = self._pipe(["filtertoolong", "tokendrop"])
+        prefix, suffix = pipe.split_deterministic()
+        self.assertEqual(prefix.transforms, pipe.transforms[:1])
+        self.assertEqual(suffix.transforms, pipe.transforms[1:])
+        self.assertIs(suffix.statistics, pipe.statistics)
+        self.assertIsNot(prefix.statistics, pipe.statistics)
+
+    def _corpus(self):
+        paths = []
+        for side in ["src", "tgt"]:
+            path = os.path.join(self.tmp_dir.name, side)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("".join(" ".join(example[side]) + "\n"
+                                for example in _examples()))
+            paths.append(path)
+        return ParallelCorpus("corpus", *paths)
+
+    def test_cached_corpus(self):
+        cache_dir = os.path.join(self.tmp_dir.name, "cache")
+        corpus_iter = ParallelCorpusIterator(
+            self._corpus(), self._pipe(["filtertoolong", "tokendrop"]),
+            cache_dir=cache_dir)
+        passes = []
+        for _ in range(2):
+            with self.assertLogs(level="INFO") as logs:
+                items = list(corpus_iter)
+            passes.append((items, [msg for msg in logs.output
+                                   if "Filtred sentence: 2" in msg]))
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+        for items, stats_msgs in passes:
+            self.assertEqual([item[0] for item in items],
+                             [_examples()[i] for i in [0, 2, 4]])
+            self.assertEqual([item[1] for item in items],
+                             [corpus_iter.transform_suffix] * 3)
+            self.assertEqual(len(stats_msgs), 1)
+
+    @unittest.skipIf(subword_nmt is None, "subword_nmt is not installed")
+    def test_cache_key_follows_subword_model(self):
+        corpus = self._corpus()
+        key = TransformCache.config_hash(corpus, self._pipe(["bpe"]))
+        with open(self.opts.src_subword_model, "a", encoding="utf-8") as f:
+            f.write("a c\n")
+        self.assertNotEqual(
+            TransformCache.config_hash(corpus, self._pipe(["bpe"])), key)
+
+    def test_incomplete_pass_leaves_no_file(self):
+        cache_dir = os.path.join(self.tmp_dir.name, "cache")
+        corpus_iter = ParallelCorpusIterator(
+            self._corpus(), self._pipe(["filtertoolong"]),
+            cache_dir=cache_dir)
+        items = iter(corpus_iter)
+        next(items)
+        items.close()
+        self.assertEqual(os.listdir(cache_dir), [])
+        self.assertFalse(corpus_iter.cache.exists())
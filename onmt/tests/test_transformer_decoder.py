@@ -0,0 +1,53 @@
+import unittest
+
+import torch
+
+from onmt.decoders.transformer import TransformerDecoder
+from onmt.modules import Embeddings
+
+
+class TestTransformerDecoderSteps(unittest.TestCase):
+    BATCH_SZ = 3
+    SRC_LEN = 5
+    TGT_LEN = 6
+    DIM = 16
+    N_WORDS = 20
+
+    def setUp(self):
+        embeddings = Embeddings(self.DIM, self.N_WORDS, 1,
+                                position_encoding=True)
+        self.decoder = TransformerDecoder(
+            2, self.DIM, 2, 32, False, "scaled-dot", 0., 0., embeddings,
+            0, False, False, 0, 0)
+        self.decoder.eval()
+        self.src = torch.randint(
+            2, self.N_WORDS, (self.SRC_LEN, self.BATCH_SZ, 1))
+        self.memory_bank = torch.randn(
+            self.SRC_LEN, self.BATCH_SZ, self.DIM)
+        self.lengths = torch.full((self.BATCH_SZ,), self.SRC_LEN,
+                                  dtype=torch.long)
+        self.tgt = torch.randint(
+            2, self.N_WORDS, (self.TGT_LEN, self.BATCH_SZ, 1))
+
+    def decode(self, start, end):
+        dec_out, _ = self.decoder(
+            self.tgt[start:end], self.memory_bank,
+            memory_lengths=self.lengths, step=start)
+        return dec_out
+
+    def stepwise(self):
+        self.decoder.init_state(self.src, self.memory_bank, None)
+        return torch.cat([self.decode(t, t + 1)
+                          for t in range(self.TGT_LEN)])
+
+    def test_several_steps_at_once(self):
+        expected = self.stepwise()
+        self.decoder.init_state(self.src, self.memory_bank, None)
+        dec_out = torch.cat([self.decode(0, 2), self.decode(2, 6)])
+        self.assertTrue(torch.allclose(dec_out, expected, atol=1e-5))
+
+    def test_truncate_cache(self):
+        expected = self.stepwise()
+        self.decoder.truncate_cache(3)
+        dec_out = self.decode(3, 6)
+        self.assertTrue(torch.allclose(dec_out, expected[3:], atol=1e-5))
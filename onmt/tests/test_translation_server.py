@@ -1,7 +1,10 @@
 import unittest
-from onmt.translate.translation_server import ServerModel, TranslationServer
+from onmt.translate.translation_server import ServerModel, \
+    TranslationServer, TranslationCache, BatchScheduler, TranslatorReplicas, \
+    ServerModelError
 
 import os
+import threading
 from textwrap import dedent
 
 import torch
@@ -129,6 +132,222 @@ class TestServerModel(unittest.TestCase):
         self.assertIsInstance(time, dict)
         self.assertIn("translation", time)
 
+    def test_run_with_token_batches(self):
+        model_id = 0
+        opt = {"models": ["test_model.pt"]}
+        model_root = TEST_DIR
+        sm = ServerModel(opt, model_id, model_root=model_root, load=True)
+        inp = [{"src": "hello how are you today"},
+               {"src": "good morning"},
+               {"src": "good morning to you ."}]
+        results, scores, _, _, _ = sm.run(inp)
+        opt = {"models": ["test_model.pt"], "batch_type": "tokens",
+               "batch_size": 8}
+        sm_tok = ServerModel(opt, model_id, model_root=model_root, load=True)
+        results2, scores2, _, _, _ = sm_tok.run(inp)
+        self.assertEqual(results, results2)
+        for score, score2 in zip(scores, scores2):
+            self.assertAlmostEqual(score, score2, places=4)
+
+    def test_run_with_cache(self):
+        model_id = 0
+        opt = {"models": ["test_model.pt"]}
+        model_root = TEST_DIR
+        sm = ServerModel(opt, model_id, model_root=model_root, load=True,
+                         cache_opt={"size": 10})
+        inp = [{"src": "hello how are you today"},
+               {"src": "good morning to you ."}]
+        results, scores, n_best, _, aligns = sm.run(inp)
+        self.assertEqual(sm.cache.misses, 2)
+        self.assertEqual(sm.cache.hits, 0)
+        inp = [{"src": "good morning to you ."},
+               {"src": ""},
+               {"src": "hello how are you today"}]
+        results2, scores2, _, _, aligns2 = sm.run(inp)
+        self.assertEqual(sm.cache.hits, 2)
+        self.assertEqual(results2, [results[1], "", results[0]])
+        self.assertEqual(scores2, [scores[1], 0, scores[0]])
+        self.assertIn("cache", sm.to_dict())
+
+    def test_run_with_batching(self):
+        model_id = 0
+        opt = {"models": ["test_model.pt"]}
+        model_root = TEST_DIR
+        sm = ServerModel(opt, model_id, model_root=model_root, load=True)
+        inp = [{"src": "hello how are you today"},
+               {"src": "good morning to you ."}]
+        results, scores, _, _, _ = sm.run(inp)
+        sm_batched = ServerModel(opt, model_id, model_root=model_root,
+                                 load=True, batching_opt={"max_delay": 20})
+        outputs = [None] * len(inp)
+
+        def run(i):
+            outputs[i] = sm_batched.run([inp[i]])
+        threads = [threading.Thread(target=run, args=(i,))
+                   for i in range(len(inp))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([out[0][0] for out in outputs], results)
+        for out, score in zip(outputs, scores):
+            self.assertAlmostEqual(out[1][0], score, places=4)
+        scheduler = sm_batched.batch_scheduler
+        sm_batched.unload()
+        scheduler.worker.join(timeout=5)
+        self.assertFalse(scheduler.worker.is_alive())
+        self.assertEqual(sm_batched.run(inp[:1])[0], results[:1])
+        sm_batched.unload()
+
+    def test_run_with_replicas(self):
+        model_id = 0
+        opt = {"models": ["test_model.pt"]}
+        model_root = TEST_DIR
+        sm = ServerModel(opt, model_id, model_root=model_root, load=True)
+        inp = [{"src": "hello how are you today"},
+               {"src": "good morning to you ."}]
+        results, scores, _, _, _ = sm.run(inp)
+        sm_replicas = ServerModel(opt, model_id, model_root=model_root,
+                                  load=True, replicas_opt={"num": 2,
+                                                           "threads": 1})
+        self.assertIsInstance(sm_replicas.translator, TranslatorReplicas)
+        results2, scores2, _, _, _ = sm_replicas.run(inp)
+        self.assertEqual(results, results2)
+        for score, score2 in zip(scores, scores2):
+            self.assertAlmostEqual(score, score2, places=4)
+        sm_replicas.unload()
+        self.assertFalse(sm_replicas.loaded)
+
+    def test_replicas_run_concurrently_and_unload_waits(self):
+        model_id = 0
+        opt = {"models": ["test_model.pt"]}
+        model_root = TEST_DIR
+        sm = ServerModel(opt, model_id, model_root=model_root, load=True,
+                         replicas_opt={"num": 2, "threads": 1})
+        inp = [{"src": "hello how are you today"}]
+        results, _, _, _, _ = sm.run(inp)
+        # both requests must be inside a replica at once to pass the barrier
+        both_running = threading.Barrier(3, timeout=10)
+        release = threading.Event()
+        translate = sm.translator.translate
+
+        def blocking_translate(*args, **kwargs):
+            both_running.wait()
+            release.wait()
+            return translate(*args, **kwargs)
+        sm.translator.translate = blocking_translate
+        outputs = []
+        threads = [threading.Thread(target=lambda: outputs.append(
+            sm.run(inp))) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        both_running.wait()
+        unload = threading.Thread(target=sm.unload)
+        unload.start()
+        unload.join(timeout=0.5)
+        self.assertTrue(unload.is_alive())
+        self.assertTrue(sm.loaded)
+        release.set()
+        for thread in threads + [unload]:
+            thread.join()
+        self.assertFalse(sm.loaded)
+        self.assertEqual([out[0] for out in outputs], [results, results])
+
+
+class TestBatchScheduler(unittest.TestCase):
+    @staticmethod
+    def translate_fn(texts, refs):
+        # one "prediction" per segment, reversed words, scored by length
+        scores = [[float(len(text.split()))] for text in texts]
+        preds = [[" ".join(reversed(text.split()))] for text in texts]
+        return scores, preds
+
+    def test_concurrent_requests_are_gathered(self):
+        calls = []
+
+        def translate_fn(texts, refs):
+            calls.append(texts)
+            return self.translate_fn(texts, refs)
+        scheduler = BatchScheduler(translate_fn, max_delay=200)
+        requests = [["a b c", "d"], ["e f"], ["g h i j"]]
+        outputs = [None] * len(requests)
+
+        def submit(i):
+            outputs[i] = scheduler.submit(requests[i])
+        threads = [threading.Thread(target=submit, args=(i,))
+                   for i in range(len(requests))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        # batch is sorted by length
+        self.assertEqual(calls[0], ["d", "e f", "a b c", "g h i j"])
+        for texts, (scores, preds) in zip(requests, outputs):
+            self.assertEqual(scores, self.translate_fn(texts, None)[0])
+            self.assertEqual(preds, self.translate_fn(texts, None)[1])
+
+    def test_max_tokens_flushes(self):
+        calls = []
+
+        def translate_fn(texts, refs):
+            calls.append(texts)
+            return self.translate_fn(texts, refs)
+        scheduler = BatchScheduler(translate_fn, max_delay=10000,
+                                   max_tokens=2)
+        scores, preds = scheduler.submit(["a b c"])
+        self.assertEqual(preds, [["c b a"]])
+        self.assertEqual(len(calls), 1)
+
+    def test_errors_are_raised_to_callers(self):
+        def translate_fn(texts, refs):
+            raise RuntimeError("boom")
+        scheduler = BatchScheduler(translate_fn, max_delay=1)
+        with self.assertRaises(RuntimeError):
+            scheduler.submit(["a b"])
+
+    def test_close_stops_worker(self):
+        scheduler = BatchScheduler(self.translate_fn, max_delay=1)
+        self.assertEqual(scheduler.submit(["a b"])[1], [["b a"]])
+        scheduler.close()
+        scheduler.worker.join(timeout=5)
+        self.assertFalse(scheduler.worker.is_alive())
+        with self.assertRaises(ServerModelError):
+            scheduler.submit(["a b"])
+
+    def test_wedged_worker_times_out(self):
+        release = threading.Event()
+
+        def translate_fn(texts, refs):
+            release.wait()
+            return self.translate_fn(texts, refs)
+        scheduler = BatchScheduler(translate_fn, max_delay=1, timeout=0.1)
+        with self.assertRaises(ServerModelError):
+            scheduler.submit(["a b"])
+        release.set()
+        scheduler.close()
+
+
+class TestTranslationCache(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = TranslationCache(size=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.put("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.hits, 3)
+        self.assertEqual(cache.misses, 1)
+
+    def test_ttl_expiration(self):
+        cache = TranslationCache(size=2, ttl=0)
+        cache.put("a", 1)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 0)
+
 
 class TestTranslationServer(unittest.TestCase):
     # this could be considered an integration test because it touches
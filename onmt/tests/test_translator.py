@@ -0,0 +1,235 @@
+import io
+import os
+import tempfile
+import threading
+import unittest
+
+import torch
+
+import onmt.opts
+from onmt.bin.translate import translate
+from onmt.model_builder import build_base_model, load_test_model
+from onmt.translate.translator import build_translator
+from onmt.utils.parse import ArgumentParser
+
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL = os.path.join(TEST_DIR, "test_model.pt")
+SRC = os.path.join(TEST_DIR, "..", "..", "data", "src-test.txt")
+
+
+def _opt(*args):
+    parser = ArgumentParser()
+    onmt.opts.translate_opts(parser)
+    opt = parser.parse_args(["-model", MODEL, "-src", SRC] + list(args))
+    ArgumentParser.validate_translate_opts(opt)
+    return opt
+
+
+def _translator(*args):
+    out_file = io.StringIO()
+    translator = build_translator(_opt(*args), report_score=False,
+                                  out_file=out_file)
+    return translator, out_file
+
+
+class TestTranslateStream(unittest.TestCase):
+    def setUp(self):
+        with open(SRC, "rb") as f:
+            self.src = [next(f) for _ in range(40)]
+
+    def _shards(self, shard_size=7):
+        return [(self.src[i:i + shard_size], None)
+                for i in range(0, len(self.src), shard_size)]
+
+    def test_same_output_as_translate(self):
+        translator, out_file = _translator("-n_best", "2")
+        translator.translate(self.src, batch_size=5)
+        stream_translator, stream_out_file = _translator("-n_best", "2")
+        n_translated = stream_translator.translate_stream(
+            self._shards(), batch_size=5, prefetch=1)
+        self.assertEqual(n_translated, len(self.src))
+        self.assertEqual(stream_out_file.getvalue(), out_file.getvalue())
+
+    def test_reader_error_is_raised(self):
+        def shards():
+            yield from self._shards()[:2]
+            raise IOError("unreadable shard")
+        threads = set(threading.enumerate())
+        translator, out_file = _translator()
+        with self.assertRaises(IOError):
+            translator.translate_stream(shards(), batch_size=5)
+        self.assertEqual(set(threading.enumerate()), threads)
+
+    def test_decoding_error_stops_threads(self):
+        threads = set(threading.enumerate())
+        translator, out_file = _translator()
+
+        def translate_batch(*args):
+            raise RuntimeError("decoding failed")
+        translator.translate_batch = translate_batch
+        with self.assertRaises(RuntimeError):
+            translator.translate_stream(
+                self._shards(shard_size=1), batch_size=5, prefetch=1)
+        self.assertEqual(set(threading.enumerate()), threads)
+        self.assertEqual(out_file.getvalue(), "")
+
+    def test_dump_beam_is_rejected(self):
+        with self.assertRaises(ValueError):
+            _opt("-stream", "-dump_beam", "beam.json")
+
+
+class TestTranslateMultiprocess(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.src = os.path.join(self.tmp_dir.name, "src.txt")
+        with open(SRC, "rb") as f_in, open(self.src, "wb") as f_out:
+            f_out.writelines(next(f_in) for _ in range(25))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _translate(self, name, *args):
+        output = os.path.join(self.tmp_dir.name, name)
+        opt = _opt("-src", self.src, "-output", output, "-shard_size", "10",
+                   "-batch_size", "4", *args)
+        translate(opt)
+        with open(output) as f:
+            return f.read()
+
+    def test_same_output_as_single_process(self):
+        expected = self._translate("single.txt", "-n_best", "2")
+        self.assertEqual(len(expected.splitlines()), 50)
+        self.assertEqual(
+            self._translate("multi.txt", "-n_best", "2", "-num_workers", "2"),
+            expected)
+
+    def test_empty_src(self):
+        open(self.src, "w").close()
+        self.assertEqual(self._translate("multi.txt", "-num_workers", "2",
+                                         "-shard_size", "0"), "")
+
+    def test_unsupported_options(self):
+        for args in [["-verbose"], ["-attn_debug"], ["-tgt", self.src]]:
+            with self.assertRaises(ValueError):
+                _opt("-num_workers", "2", *args)
+
+
+class TestSpeculativeDecoding(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.fields, _, _ = load_test_model(_opt())
+        with open(SRC, "rb") as f:
+            self.src = [next(f) for _ in range(20)]
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _save_model(self, name, layers, seed, noise_of=None):
+        """Save a small random Transformer, or `noise_of` one with its
+        parameters slightly moved, with an EOS bias so that sentences
+        end after various numbers of steps."""
+        parser = ArgumentParser()
+        onmt.opts.model_opts(parser)
+        onmt.opts._add_train_general_opts(parser)
+        model_opt = parser.parse_known_args(
+            ["-data", "dummy", "-encoder_type", "transformer",
+             "-decoder_type", "transformer", "-position_encoding",
+             "-layers", str(layers), "-rnn_size", "16",
+             "-word_vec_size", "16", "-transformer_ff", "32",
+             "-heads", "2"])[0]
+        ArgumentParser.update_model_opts(model_opt)
+        ArgumentParser.validate_model_opts(model_opt)
+        torch.manual_seed(seed)
+        model = build_base_model(model_opt, self.fields, False)
+        if noise_of is None:
+            for p in model.parameters():
+                p.data.uniform_(-0.5, 0.5)
+            eos = self.fields["tgt"].base_field.vocab.stoi["</s>"]
+            model.generator[0].bias.data[eos] += 2.2
+        else:
+            model.load_state_dict(noise_of.state_dict())
+            for p in model.parameters():
+                p.data.add_(torch.randn_like(p), alpha=0.02)
+        path = os.path.join(self.tmp_dir.name, name)
+        torch.save({
+            "model": {k: v for k, v in model.state_dict().items()
+                      if "generator" not in k},
+            "generator": model.generator.state_dict(),
+            "vocab": self.fields, "opt": model_opt}, path)
+        return model, path
+
+    def _translate(self, *args):
+        translator, _ = _translator(
+            "-model", self.model_path, "-beam_size", "1",
+            "-max_length", "30", *args)
+        scores, predictions = translator.translate(self.src, batch_size=7)
+        return [s[0].item() for s in scores], [p[0] for p in predictions]
+
+    def test_same_output_as_greedy(self):
+        model, self.model_path = self._save_model("model.pt", 2, 1)
+        _, other_draft = self._save_model("other.pt", 1, 2)
+        _, close_draft = self._save_model("close.pt", 2, 3, noise_of=model)
+        scores, predictions = self._translate()
+        self.assertGreater(len({len(p.split()) for p in predictions}), 2)
+        for draft in [self.model_path, other_draft, close_draft]:
+            for k in ["1", "3", "8"]:
+                with self.subTest(draft=os.path.basename(draft), k=k):
+                    draft_scores, draft_predictions = self._translate(
+                        "-draft_model", draft, "-draft_tokens", k)
+                    self.assertEqual(draft_predictions, predictions)
+                    for score, draft_score in zip(scores, draft_scores):
+                        self.assertAlmostEqual(draft_score, score, places=4)
+
+
+class TestShortlistTranslation(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        with open(SRC, "rb") as f:
+            self.src = [next(f) for _ in range(20)]
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _translate(self, model, *args):
+        translator, _ = _translator("-model", model, "-max_length", "20",
+                                    *args)
+        scores, predictions = translator.translate(self.src, batch_size=7)
+        return [score.item() for n_best in scores for score in n_best], \
+            predictions
+
+    def test_covering_shortlist_keeps_output(self):
+        # the model only outputs the 10 most frequent target tokens or
+        # scattered ones, all listed as translations of every source token
+        checkpoint = torch.load(MODEL, map_location="cpu")
+        tgt_vocab = dict(checkpoint["vocab"])["tgt"].base_field.vocab
+        listed = list(range(10, len(tgt_vocab), 37))
+        bias = checkpoint["generator"]["0.bias"]
+        kept = torch.zeros_like(bias, dtype=torch.bool)
+        kept[:10] = True
+        kept[listed] = True
+        bias.masked_fill_(~kept, -1e4)
+        model = os.path.join(self.tmp_dir.name, "model.pt")
+        torch.save(checkpoint, model)
+        shortlist = os.path.join(self.tmp_dir.name, "shortlist.txt")
+        src_tokens = {tok for line in self.src
+                      for tok in line.decode("utf-8").split()}
+        with open(shortlist, "w", encoding="utf-8") as f:
+            f.writelines("%s %s\n" % (tok, tgt_vocab.itos[i])
+                         for tok in sorted(src_tokens) for i in listed)
+
+        scores, predictions = self._translate(model)
+        self.assertTrue(any(tgt_vocab.stoi[tok] >= 10
+                            for n_best in predictions
+                            for hyp in n_best for tok in hyp.split()))
+        for args in [["-n_best", "2"], ["-beam_size", "1"]]:
+            with self.subTest(args=args):
+                expected_scores, expected_predictions = \
+                    self._translate(model, *args)
+                shortlist_scores, shortlist_predictions = self._translate(
+                    model, "-shortlist", shortlist, "-shortlist_frequent",
+                    "10", "-shortlist_topk", str(len(listed)), *args)
+                self.assertEqual(shortlist_predictions, expected_predictions)
+                for score, expected in zip(shortlist_scores,
+                                           expected_scores):
+                    self.assertAlmostEqual(score, expected, places=4)
@@ -0,0 +1,170 @@
+import os
+import random
+import tempfile
+import unittest
+from argparse import Namespace
+from collections import Counter
+
+from onmt.constants import ModelTask
+from onmt.inputters.corpus import ParallelCorpus, SpillCounter, \
+    merge_counts, _count_tokens
+from onmt.inputters.fields import LangFields
+
+
+class TestSpillCounter(unittest.TestCase):
+    def setUp(self):
+        random.seed(0)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        words = ["w%d" % i for i in range(50)] + ["", "é", "a\tb"]
+        self.lines = [random.choices(words, k=10) for _ in range(100)]
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _spill(self, name, lines, max_size):
+        counter = SpillCounter(
+            os.path.join(self.tmp_dir.name, name), max_size)
+        for tokens in lines:
+            counter.update(tokens)
+        return counter.spill()
+
+    def test_merged_counts_are_exact(self):
+        expected = Counter(tok for tokens in self.lines for tok in tokens)
+        paths = self._spill("src.0", self.lines[:40], 7) \
+            + self._spill("src.1", self.lines[40:], 20)
+        self.assertGreater(len(paths), 2)
+        self.assertEqual(merge_counts(paths), expected)
+
+    def test_topk_keeps_most_frequent(self):
+        expected = Counter(tok for tokens in self.lines for tok in tokens)
+        paths = self._spill("src.0", self.lines, 5)
+        topk = merge_counts(paths, topk=10)
+        self.assertEqual(len(topk), 10)
+        kth_count = sorted(expected.values(), reverse=True)[9]
+        for tok, count in topk.items():
+            self.assertEqual(count, expected[tok])
+            self.assertGreaterEqual(count, kth_count)
+
+    def test_nothing_to_spill(self):
+        self.assertEqual(self._spill("src.0", [], 5), [])
+        self.assertEqual(merge_counts([]), Counter())
+
+    def test_merge_in_rounds(self):
+        expected = Counter(tok for tokens in self.lines for tok in tokens)
+        paths = self._spill("src.0", self.lines, 3)
+        self.assertGreater(len(paths), 4)
+        self.assertEqual(merge_counts(paths, fan_in=2), expected)
+        self.assertEqual(merge_counts(paths, topk=10, fan_in=3),
+                         merge_counts(paths, topk=10))
+        # intermediate files are removed
+        self.assertEqual(sorted(os.listdir(self.tmp_dir.name)),
+                         sorted(os.path.basename(path) for path in paths))
+
+    def _count_tokens(self, corpus_lines, **kwargs):
+        data = {}
+        for i, lines in enumerate(corpus_lines):
+            path = os.path.join(self.tmp_dir.name, "corpus%d.txt" % i)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("".join(" ".join(tokens) + "\n" for tokens in lines))
+            data["corpus%d" % i] = {"path_src": path, "path_tgt": path,
+                                    "path_align": None, "transforms": []}
+        opts = Namespace(
+            data=data, skip_empty_level="silent", num_threads=2,
+            vocab_sample_queue_size=20, dump_samples=False,
+            save_data=os.path.join(self.tmp_dir.name, "vocab"),
+            share_vocab=False, src_vocab="vocab.src", vocab_counter_size=5,
+            counts_dir=os.path.join(self.tmp_dir.name, "counts"),
+            counts_prefix=None, merge_counts=[], vocab_topk=0)
+        for key, value in kwargs.items():
+            setattr(opts, key, value)
+        return _count_tokens(opts, {}, -1)
+
+    def test_nodes_share_counts_dir(self):
+        words = [[tok for tok in tokens if tok.strip() and "\t" not in tok]
+                 for tokens in self.lines]
+        for node, lines in enumerate([words[:50], words[50:]]):
+            self._count_tokens([lines], counts_prefix="node%d" % node)
+        counts_dir = os.path.join(self.tmp_dir.name, "counts")
+        # this run's files are found again in its own -counts_dir
+        counters = self._count_tokens(
+            [words[:10]], counts_prefix="merger", merge_counts=[counts_dir])
+        expected = Counter(tok for tokens in words + words[:10]
+                           for tok in tokens)
+        self.assertEqual(counters["src"], expected)
+
+
+class TestCorpusSplit(unittest.TestCase):
+    def setUp(self):
+        random.seed(0)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.src = ["s%d %s" % (i, "x" * random.randint(0, 50))
+                    for i in range(37)]
+        self.tgt = ["t%d %s" % (i, "y" * random.randint(0, 5))
+                    for i in range(37)]
+        paths = []
+        for name, lines in [("src", self.src), ("tgt", self.tgt)]:
+            path = os.path.join(self.tmp_dir.name, name)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+            paths.append(path)
+        self.corpus = ParallelCorpus("corpus", *paths)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _read_parts(self, parts):
+        return [(ex["src"].strip("\n"), ex["tgt"].strip("\n"))
+                for part in parts for ex in self.corpus.load(part=part)]
+
+    def test_parts_cover_corpus_in_order(self):
+        for n_parts in [1, 3, 8, 50]:
+            parts = self.corpus.split(n_parts)
+            self.assertEqual(len(parts), n_parts)
+            self.assertEqual(self._read_parts(parts),
+                             list(zip(self.src, self.tgt)))
+
+    def test_parts_stop_after_n_lines(self):
+        for n_lines in [0, 5, 100]:
+            parts = self.corpus.split(4, n_lines=n_lines)
+            self.assertEqual(self._read_parts(parts),
+                             list(zip(self.src, self.tgt))[:n_lines])
+
+
+class TestLangFields(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.vocabs = {"en": ["the", "cat"], "de": ["die", "katze"],
+                       "fr": ["le", "chat"]}
+        for lang, tokens in self.vocabs.items():
+            path = os.path.join(self.tmp_dir.name, "vocab." + lang)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("".join("%s\t%d\n" % (tok, 10 - i)
+                                for i, tok in enumerate(tokens)))
+        self.opts = Namespace(
+            src_vocab=os.path.join(self.tmp_dir.name, "vocab.{lang}"),
+            copy_attn=False, lambda_align=0.0, data_task=ModelTask.SEQ2SEQ,
+            src_seq_length_trunc=None, tgt_seq_length_trunc=None,
+            vocab_size_multiple=1, src_vocab_size=50, tgt_vocab_size=50,
+            src_words_min_frequency=0, tgt_words_min_frequency=0)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_vocab_per_language(self):
+        lang_fields = LangFields(self.opts)
+        fields = lang_fields["en", "de"]
+        src_vocab = fields["src"].base_field.vocab
+        tgt_vocab = fields["tgt"].base_field.vocab
+        self.assertIn("cat", src_vocab.stoi)
+        self.assertNotIn("katze", src_vocab.stoi)
+        self.assertIn("katze", tgt_vocab.stoi)
+        self.assertNotIn("cat", tgt_vocab.stoi)
+        self.assertIs(lang_fields["en", "fr"]["src"].base_field.vocab,
+                      src_vocab)
+
+    def test_vocab_loaded_on_first_use(self):
+        os.remove(os.path.join(self.tmp_dir.name, "vocab.fr"))
+        lang_fields = LangFields(self.opts)
+        lang_fields["en", "de"]
+        with self.assertRaises(RuntimeError):
+            lang_fields["en", "fr"]
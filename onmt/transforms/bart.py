@@ -4,6 +4,7 @@ import numpy as np
 import torch
 from functools import partial
 from onmt.constants import DefaultTokens, SubwordMarker
+from onmt.utils.misc import rank_in_groups
 from onmt.transforms import register_transform
 from .transform import Transform
 
@@ -19,6 +20,12 @@ def word_start(x, ignore_subword=False, is_joiner=False):
         return True
 
 
+def _concat_ranges(starts, lengths):
+    """Concatenation of `range(start, start + length)` for each pair."""
+    offsets = np.cumsum(lengths) - lengths
+    return np.repeat(starts - offsets, lengths) + np.arange(lengths.sum())
+
+
 class BARTNoising(object):
     """Noise from BART."""
 
@@ -28,6 +35,8 @@ class BARTNoising(object):
                  random_ratio=0.0, is_joiner=False,
                  full_stop_token=DefaultTokens.SENT_FULL_STOPS):
         self.vocab = vocab
+        self._vocab_array = np.array(vocab, dtype=object) \
+            if vocab is not None else None
 
         self.mask_tok = mask_tok
 
@@ -60,6 +69,9 @@ class BARTNoising(object):
         self.mask_span_distribution = None
         if mask_length == 'span-poisson':
             self.mask_span_distribution = self._make_poisson(poisson_lambda)
+            self._mask_span_cdf = np.cumsum(
+                self.mask_span_distribution.probs.double().numpy())
+            self._mask_span_cdf /= self._mask_span_cdf[-1]
         self.mask_length = mask_length
         self.poisson_lambda = poisson_lambda
 
@@ -284,6 +296,225 @@ class BARTNoising(object):
             tokens = self.rolling_noise(tokens, self.rotate_ratio)
         return tokens
 
+    def _random_tokens(self, n):
+        return self._vocab_array[np.random.randint(0, len(self.vocab), n)]
+
+    def _batch_permute_sentences(self, tokens, lengths, p=1.0):
+        """Batched :func:`permute_sentences()` on flat `tokens`."""
+        n_examples = len(lengths)
+        ends = np.cumsum(lengths)
+        starts = ends - lengths
+        example = np.repeat(np.arange(n_examples), lengths)
+        full_stops = np.array(
+            [self._is_full_stop(token) for token in tokens.tolist()],
+            dtype=bool)
+        # Pretend each ends with a full stop so last span is a sentence
+        full_stops[ends[lengths > 0] - 1] = True
+        # Tokens that are full stops, where the previous token is not
+        is_end = full_stops.copy()
+        is_end[1:] &= ~full_stops[:-1]
+        is_end[starts[lengths > 0]] = False
+        n_sentences = np.bincount(example[is_end], minlength=n_examples)
+
+        # Pieces are the sentences and what follows the last one
+        is_start = np.zeros(len(tokens), dtype=bool)
+        is_start[starts[lengths > 0]] = True
+        next_starts = is_end.nonzero()[0] + 1
+        is_start[next_starts[next_starts < len(tokens)]] = True
+        piece_starts = is_start.nonzero()[0]
+        piece_lengths = np.diff(np.append(piece_starts, len(tokens)))
+        piece_example = example[piece_starts]
+        movable = is_end[piece_starts + piece_lengths - 1] \
+            & (n_sentences[piece_example] > 1)
+
+        # Permute a random subset of ceil(n_sentences * p) sentences
+        n_to_permute = np.ceil(n_sentences * p).astype(np.int64)
+        keys = np.where(movable, np.random.random(len(piece_starts)), 1.0)
+        ranks = rank_in_groups(keys, piece_example, n_examples)
+        substitutions = (
+            movable & (ranks < n_to_permute[piece_example])).nonzero()[0]
+        ordering = np.arange(len(piece_starts))
+        ordering[substitutions] = substitutions[np.lexsort((
+            np.random.random(len(substitutions)),
+            piece_example[substitutions]))]
+        index = _concat_ranges(
+            piece_starts[ordering], piece_lengths[ordering])
+        return tokens[index], lengths
+
+    def _batch_span_lengths(self, n_mask):
+        """Sample span lengths until the masking budget of each example.
+
+        Return the example of each span and its length, grouped by
+        example, with the last span of each example trimmed to budget.
+        """
+        n_examples = len(n_mask)
+        span_example = [np.repeat(np.arange(n_examples), n_mask)]
+        span_lengths = [np.searchsorted(
+            self._mask_span_cdf, np.random.random(len(span_example[0])),
+            side='right')]
+        total = np.bincount(span_example[0], weights=span_lengths[0],
+                            minlength=n_examples)
+        # Make sure we have enough to mask
+        short = (total < n_mask).nonzero()[0]
+        while len(short) > 0:
+            more_example = np.repeat(short, n_mask[short])
+            more_lengths = np.searchsorted(
+                self._mask_span_cdf, np.random.random(len(more_example)),
+                side='right')
+            span_example.append(more_example)
+            span_lengths.append(more_lengths)
+            total += np.bincount(more_example, weights=more_lengths,
+                                 minlength=n_examples)
+            short = (total < n_mask).nonzero()[0]
+        span_example = np.concatenate(span_example)
+        span_lengths = np.concatenate(span_lengths)
+        order = np.argsort(span_example, kind='stable')
+        span_example, span_lengths = span_example[order], span_lengths[order]
+
+        # Trim to masking budget
+        counts = np.bincount(span_example, minlength=n_examples)
+        before = np.cumsum(span_lengths) - span_lengths
+        before -= before[(np.cumsum(counts) - counts)[span_example]]
+        budget = n_mask[span_example]
+        in_budget = before < budget
+        span_lengths = np.minimum(span_lengths, budget - before)[in_budget]
+        return span_example[in_budget], span_lengths
+
+    def _batch_whole_word_mask(self, tokens, lengths, p=1.0):
+        """Batched :func:`whole_word_mask()` on flat `tokens`.
+
+        Return the masked tokens, their lengths and the number of tokens
+        to insert in each example for spans of length 0.
+        """
+        n_examples = len(lengths)
+        ends = np.cumsum(lengths)
+        example = np.repeat(np.arange(n_examples), lengths)
+        is_word_start = np.array(
+            [self._is_word_start(token) for token in tokens.tolist()],
+            dtype=bool)
+        n_mask = np.ceil(np.bincount(
+            example[is_word_start], minlength=n_examples) * p).astype(
+                np.int64)
+        n_insert = np.zeros(n_examples, dtype=np.int64)
+
+        if self.mask_span_distribution is not None:  # Text (span) Infilling
+            span_example, span_lengths = self._batch_span_lengths(n_mask)
+            # Handle 0-length mask (inserts) separately
+            n_insert = np.bincount(
+                span_example[span_lengths == 0], minlength=n_examples)
+            span_example = span_example[span_lengths > 0]
+            span_lengths = span_lengths[span_lengths > 0]
+            n_mask = np.bincount(span_example, minlength=n_examples)
+        else:  # Token Masking
+            span_example = np.repeat(np.arange(n_examples), n_mask)
+            span_lengths = np.ones(len(span_example), dtype=np.int64)
+
+        # Spans start on random word starts, each one at most once
+        word_starts = is_word_start.nonzero()[0]
+        ranks = rank_in_groups(np.random.random(len(word_starts)),
+                               example[word_starts], n_examples)
+        chosen = ranks < n_mask[example[word_starts]]
+        span_offsets = np.cumsum(n_mask) - n_mask
+        span_starts = np.empty(len(span_example), dtype=np.int64)
+        span_starts[span_offsets[example[word_starts[chosen]]]
+                    + ranks[chosen]] = word_starts[chosen]
+        mask_random = np.random.random(len(span_starts)) < self.random_ratio
+
+        # A span covers its length in words, but not the last token
+        cum_word_starts = np.cumsum(is_word_start)
+        span_ends = np.minimum(
+            np.searchsorted(cum_word_starts,
+                            cum_word_starts[span_starts] + span_lengths),
+            ends[span_example] - 1)
+        extend_lengths = np.maximum(span_ends - span_starts - 1, 0)
+        extended = _concat_ranges(span_starts + 1, extend_lengths)
+        extended_random = np.repeat(mask_random, extend_lengths)
+
+        tokens = tokens.copy()
+        to_keep = np.ones(len(tokens), dtype=bool)
+        if self.replace_length == 0:
+            to_keep[span_starts] = False
+        else:
+            # keep index, but replace it with [MASK]
+            tokens[span_starts] = self.mask_tok
+            random_starts = span_starts[mask_random]
+            tokens[random_starts] = self._random_tokens(len(random_starts))
+        if self.replace_length != -1:
+            # delete token: 1 mask/remove per span
+            to_keep[extended] = False
+        else:
+            # keep index, but replace it with [MASK]: 1 mask per token
+            tokens[extended] = self.mask_tok
+            random_extended = extended[extended_random]
+            tokens[random_extended] = self._random_tokens(
+                len(random_extended))
+        lengths = np.bincount(example[to_keep], minlength=n_examples)
+        return tokens[to_keep], lengths, n_insert
+
+    def _batch_insertion_noise(self, tokens, lengths, n_insert):
+        """Batched :func:`insertion_noise()` of `n_insert` tokens each."""
+        n_examples = len(lengths)
+        n_random = np.ceil(n_insert * self.random_ratio).astype(np.int64)
+        lengths = lengths + n_insert
+        example = np.repeat(np.arange(n_examples), lengths)
+        ranks = rank_in_groups(
+            np.random.random(len(example)), example, n_examples)
+        noise_mask = ranks < n_insert[example]
+        random_mask = ranks < n_random[example]
+
+        result = np.empty(len(example), dtype=object)
+        result[~noise_mask] = tokens
+        result[noise_mask] = self.mask_tok
+        result[random_mask] = self._random_tokens(random_mask.sum())
+        return result, lengths
+
+    def _batch_rolling_noise(self, tokens, lengths, p=1.0):
+        """Batched :func:`rolling_noise()` on flat `tokens`."""
+        n_examples = len(lengths)
+        offsets = np.random.randint(0, np.maximum(1, lengths - 1) + 1)
+        offsets[np.random.random(n_examples) >= p] = 0
+        example = np.repeat(np.arange(n_examples), lengths)
+        starts = (np.cumsum(lengths) - lengths)[example]
+        positions = np.arange(len(tokens)) - starts + offsets[example]
+        index = starts + positions % lengths[example]
+        return tokens[index], lengths
+
+    def apply_batch(self, batch):
+        """Noise a list of token lists, as :func:`apply()` on each one.
+
+        The examples are concatenated in one NumPy array and each noise
+        is applied to all of them at once, with the same distribution.
+        """
+        if self.vocab is None:
+            raise ValueError("Inject BART noise requires a valid vocabulary.")
+        if len(batch) == 0:
+            return []
+        lengths = np.array([len(tokens) for tokens in batch], dtype=np.int64)
+        tokens = np.array(
+            [token for example in batch for token in example], dtype=object)
+
+        if self.permute_sent_ratio > 0.0:
+            tokens, lengths = self._batch_permute_sentences(
+                tokens, lengths, self.permute_sent_ratio)
+
+        if self.mask_ratio > 0.0:
+            tokens, lengths, n_insert = self._batch_whole_word_mask(
+                tokens, lengths, self.mask_ratio)
+            if n_insert.any():
+                tokens, lengths = self._batch_insertion_noise(
+                    tokens, lengths, n_insert)
+
+        if self.insert_ratio > 0.0:
+            n_insert = np.ceil(lengths * self.insert_ratio).astype(np.int64)
+            tokens, lengths = self._batch_insertion_noise(
+                tokens, lengths, n_insert)
+
+        if self.rotate_ratio > 0.0:
+            tokens, lengths = self._batch_rolling_noise(
+                tokens, lengths, self.rotate_ratio)
+        return [example.tolist()
+                for example in np.split(tokens, np.cumsum(lengths)[:-1])]
+
     def __repr__(self):
         cls_name = type(self).__name__
         kwargs = {}
@@ -382,6 +613,15 @@ class BARTNoiseTransform(Transform):
             example['src'] = src
         return example
 
+    def batch_apply(self, batch, is_train=False, stats=None, **kwargs):
+        """Apply BART noise to src side tokens of all `batch` at once."""
+        if is_train and self.vocabs is not None:
+            noised = self.bart_noise.apply_batch(
+                [example['src'] for example in batch])
+            for example, src in zip(batch, noised):
+                example['src'] = src
+        return batch
+
     def _repr_args(self):
         """Return str represent key arguments for BART."""
         return repr(self.bart_noise)
@@ -23,6 +23,9 @@ class FilterTooLongTransform(Transform):
         self.src_seq_length = self.opts.src_seq_length
         self.tgt_seq_length = self.opts.tgt_seq_length
 
+    def is_deterministic(self):
+        return True
+
     def apply(self, example, is_train=False, stats=None, **kwargs):
         """Return None if too long else return as is."""
         if (len(example['src']) > self.src_seq_length or
@@ -86,6 +89,9 @@ class PrefixTransform(Transform):
         super().warm_up(None)
         self.prefix_dict = self.get_prefix_dict(self.opts)
 
+    def is_deterministic(self):
+        return True
+
     def _prepend(self, example, prefix):
         """Prepend `prefix` to `tokens`."""
         for side, side_prefix in prefix.items():
@@ -3,6 +3,7 @@ import random
 import numpy as np
 from onmt.utils.logging import logger
 from onmt.constants import DefaultTokens
+from onmt.utils.misc import rank_in_groups
 from onmt.transforms import register_transform
 from .transform import Transform
 
@@ -35,6 +36,53 @@ class HammingDistanceSampling(object):
         chosen_indices = random.sample(range(n_tokens), k=distance)
         return chosen_indices
 
+    def _cum_distance_weights(self, n_tokens, temperature):
+        """Cumulative unnormalized probabilities of distances.
+
+        The distribution of `_sample_distance` for `n_tokens` tokens is
+        the first `n_tokens` ones divided by the last of them, so they are
+        only computed once, for the longest length seen.
+        """
+        cached = getattr(self, '_cum_weights', None)
+        if cached is None or cached[0] != temperature \
+                or len(cached[1]) < n_tokens:
+            size = max(n_tokens, 256 if cached is None else 2 * len(cached[1]))
+            logits = np.arange(size) * -1 * temperature
+            cached = (temperature, np.cumsum(np.exp(logits)))
+            self._cum_weights = cached
+        return cached[1]
+
+    def _batch_sample_distance(self, lengths, temperature):
+        """Sample number of tokens to corrupt for examples of `lengths`."""
+        max_distances = np.maximum(lengths - 1, 0)
+        cum_weights = self._cum_distance_weights(
+            lengths.max(initial=0), temperature)
+        thresholds = np.random.random(len(lengths)) \
+            * cum_weights[max_distances]
+        distances = np.searchsorted(cum_weights, thresholds, side='right')
+        return np.minimum(distances, max_distances)
+
+    def _batch_sample_position(self, lengths, distances):
+        """Mask of the positions to corrupt in concatenated examples.
+
+        Each example of `lengths` has its `distances` positions chosen
+        uniformly.
+        """
+        example = np.repeat(np.arange(len(lengths)), lengths)
+        ranks = rank_in_groups(
+            np.random.random(len(example)), example, len(lengths))
+        return ranks < distances[example]
+
+    def _batch_sample_replace(self, vocab, reject):
+        """Sample a token from `vocab` array other than each of `reject`."""
+        tokens = vocab[np.random.randint(0, len(vocab), len(reject))]
+        rejected = (tokens == reject).nonzero()[0]
+        while len(rejected) > 0:
+            tokens[rejected] = vocab[
+                np.random.randint(0, len(vocab), len(rejected))]
+            rejected = rejected[tokens[rejected] == reject[rejected]]
+        return tokens
+
 
 class HammingDistanceSamplingTransform(Transform, HammingDistanceSampling):
     """Abstract Transform class based on HammingDistanceSampling."""
@@ -44,6 +92,30 @@ class HammingDistanceSamplingTransform(Transform, HammingDistanceSampling):
         np.random.seed(seed)
         random.seed(seed)
 
+    def _sample_batch(self, batch, side):
+        """Sample the tokens to corrupt on `side` of `batch` examples.
+
+        Returns:
+            (numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray):
+            concatenated tokens, example lengths, number of tokens to
+            corrupt per example and mask of the tokens to corrupt.
+        """
+        lengths = np.array(
+            [len(example[side]) for example in batch], dtype=np.int64)
+        tokens = np.array(
+            [tok for example in batch for tok in example[side]],
+            dtype=object)
+        distances = self._batch_sample_distance(lengths, self.temperature)
+        chosen = self._batch_sample_position(lengths, distances)
+        return tokens, lengths, distances, chosen
+
+    @staticmethod
+    def _split_batch(batch, side, tokens, lengths):
+        """Set `side` of `batch` examples from concatenated `tokens`."""
+        for example, example_tokens in zip(
+                batch, np.split(tokens, np.cumsum(lengths)[:-1])):
+            example[side] = example_tokens.tolist()
+
 
 @register_transform(name='switchout')
 class SwitchOutTransform(HammingDistanceSamplingTransform):
@@ -61,6 +133,10 @@ class SwitchOutTransform(HammingDistanceSamplingTransform):
         if vocabs is None:
             logger.warning(
                 "Switchout disable as no vocab, shouldn't happen in training!")
+        else:
+            self._vocab_arrays = {
+                side: np.array(vocab.itos, dtype=object)
+                for side, vocab in vocabs.items()}
 
     @classmethod
     def add_options(cls, parser):
@@ -103,6 +179,20 @@ class SwitchOutTransform(HammingDistanceSamplingTransform):
             example['src'], example['tgt'] = src, tgt
         return example
 
+    def batch_apply(self, batch, is_train=False, stats=None, **kwargs):
+        """Apply switchout to src and tgt side tokens of all `batch`."""
+        if is_train and self.vocabs is not None:
+            for side in ['src', 'tgt']:
+                tokens, lengths, n_chosen, chosen = self._sample_batch(
+                    batch, side)
+                tokens[chosen] = self._batch_sample_replace(
+                    self._vocab_arrays[side], tokens[chosen])
+                self._split_batch(batch, side, tokens, lengths)
+                if stats is not None:
+                    stats.switchout(n_switchout=int(n_chosen.sum()),
+                                    n_total=int(lengths.sum()))
+        return batch
+
     def _repr_args(self):
         """Return str represent key arguments for class."""
         return '{}={}'.format('switchout_temperature', self.temperature)
@@ -146,6 +236,19 @@ class TokenDropTransform(HammingDistanceSamplingTransform):
             example['src'], example['tgt'] = src, tgt
         return example
 
+    def batch_apply(self, batch, is_train=False, stats=None, **kwargs):
+        """Apply token drop to src and tgt side tokens of all `batch`."""
+        if is_train:
+            for side in ['src', 'tgt']:
+                tokens, lengths, n_chosen, chosen = self._sample_batch(
+                    batch, side)
+                self._split_batch(
+                    batch, side, tokens[~chosen], lengths - n_chosen)
+                if stats is not None:
+                    stats.token_drop(n_dropped=int(n_chosen.sum()),
+                                     n_total=int(lengths.sum()))
+        return batch
+
     def _repr_args(self):
         """Return str represent key arguments for class."""
         return '{}={}'.format('worddrop_temperature', self.temperature)
@@ -198,6 +301,19 @@ class TokenMaskTransform(HammingDistanceSamplingTransform):
             example['src'], example['tgt'] = src, tgt
         return example
 
+    def batch_apply(self, batch, is_train=False, stats=None, **kwargs):
+        """Apply token mask to src and tgt side tokens of all `batch`."""
+        if is_train:
+            for side in ['src', 'tgt']:
+                tokens, lengths, n_chosen, chosen = self._sample_batch(
+                    batch, side)
+                tokens[chosen] = self.MASK_TOK
+                self._split_batch(batch, side, tokens, lengths)
+                if stats is not None:
+                    stats.token_mask(n_masked=int(n_chosen.sum()),
+                                     n_total=int(lengths.sum()))
+        return batch
+
     def _repr_args(self):
         """Return str represent key arguments for class."""
         return '{}={}'.format('tokenmask_temperature', self.temperature)
@@ -1,4 +1,6 @@
 """Transforms relate to tokenization/subword."""
+import random
+from collections import OrderedDict
 from onmt.utils.logging import logger
 from onmt.transforms import register_transform
 from .transform import Transform
@@ -91,6 +93,27 @@ class TokenizerTransform(Transform):
         self.src_vocab_threshold = self.opts.src_vocab_threshold
         self.tgt_vocab_threshold = self.opts.tgt_vocab_threshold
 
+    def _tokenize(self, tokens, side='src', is_train=False):
+        """Tokenize a list of words `tokens` of `side`."""
+        raise NotImplementedError
+
+    def _tokenize_batch(self, batch, side='src', is_train=False):
+        """Tokenize a list of token lists, see :func:`_tokenize()`."""
+        return [self._tokenize(tokens, side, is_train) for tokens in batch]
+
+    def batch_apply(self, batch, is_train=False, stats=None, **kwargs):
+        """Apply subword encode to src & tgt of all examples of `batch`."""
+        src_out = self._tokenize_batch(
+            [example['src'] for example in batch], 'src', is_train)
+        tgt_out = self._tokenize_batch(
+            [example['tgt'] for example in batch], 'tgt', is_train)
+        for example, src, tgt in zip(batch, src_out, tgt_out):
+            if stats is not None:
+                n_words = len(example['src']) + len(example['tgt'])
+                stats.subword(len(src) + len(tgt), n_words)
+            example['src'], example['tgt'] = src, tgt
+        return batch
+
     def _repr_args(self):
         """Return str represent key arguments for TokenizerTransform."""
         kwargs = {
@@ -166,6 +189,25 @@ class SentencePieceTransform(TokenizerTransform):
                 alpha=alpha, nbest_size=nbest_size)
         return segmented
 
+    def is_deterministic(self):
+        """Deterministic without subword sampling."""
+        return self.src_subword_nbest in [0, 1] and \
+            self.tgt_subword_nbest in [0, 1]
+
+    def _tokenize_batch(self, batch, side='src', is_train=False):
+        """Do sentencepiece subword tokenize, in one call for `batch`."""
+        sp_model = self.load_models[side]
+        sentences = [' '.join(tokens) for tokens in batch]
+        nbest_size = self.tgt_subword_nbest if side == 'tgt' else \
+            self.src_subword_nbest
+        alpha = self.tgt_subword_alpha if side == 'tgt' else \
+            self.src_subword_alpha
+        if is_train is False or nbest_size in [0, 1]:
+            return sp_model.encode(sentences, out_type=str)
+        return sp_model.encode(
+            sentences, out_type=str, enable_sampling=True,
+            alpha=alpha, nbest_size=nbest_size)
+
     def apply(self, example, is_train=False, stats=None, **kwargs):
         """Apply sentencepiece subword encode to src & tgt."""
         src_out = self._tokenize(example['src'], 'src', is_train)
@@ -186,6 +228,136 @@ class SentencePieceTransform(TokenizerTransform):
         return kwargs_str + ', ' + additional_str
 
 
+class BPESegmenter(object):
+    """Segment tokens like `subword_nmt.apply_bpe.BPE`, faster.
+
+    Symbols are mapped to ids and the merge ranks are precomputed in a
+    dict of id pairs, so that merges only hash small int tuples. Words
+    segmented without dropout are kept in a bounded LRU cache.
+
+    Args:
+        bpe (subword_nmt.apply_bpe.BPE): loaded model, for its codes,
+            version, separator, vocabulary and glossaries.
+        cache_size (int): maximum number of cached words, 0 to disable.
+    """
+
+    def __init__(self, bpe, cache_size=100000):
+        self.bpe = bpe
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.symbols = []
+        self.symbol_ids = {}
+        self.merges = {}
+        for (first, second), rank in bpe.bpe_codes.items():
+            pair = (self._symbol_id(first), self._symbol_id(second))
+            self.merges[pair] = (rank, self._symbol_id(first + second))
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['cache'] = OrderedDict()
+        return state
+
+    def _symbol_id(self, symbol):
+        symbol_id = self.symbol_ids.get(symbol)
+        if symbol_id is None:
+            symbol_id = self.symbol_ids[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+        return symbol_id
+
+    def _merge(self, ids, dropout=0):
+        """Apply the merges to symbol `ids` by rank, like subword_nmt."""
+        merges = self.merges
+        while len(ids) > 1:
+            best_rank, best_id, positions = None, None, []
+            for i, pair in enumerate(zip(ids, ids[1:])):
+                merge = merges.get(pair)
+                if merge is None or (dropout and random.random() <= dropout):
+                    continue
+                if best_rank is None or merge[0] < best_rank:
+                    best_rank, best_id = merge
+                    positions = [i]
+                elif merge[0] == best_rank:
+                    positions.append(i)
+            if best_rank is None:
+                break
+            new_ids, i = [], 0
+            for j in positions:
+                # skip overlapping occurrences, e.g. x x x -> xx x
+                if j < i:
+                    continue
+                new_ids.extend(ids[i:j])
+                new_ids.append(best_id)
+                i = j + 2
+            new_ids.extend(ids[i:])
+            ids = new_ids
+        return ids
+
+    def _encode(self, orig, dropout=0):
+        """Subwords of a word segment, without separators."""
+        glossaries_regex = getattr(self.bpe, 'glossaries_regex', None)
+        if glossaries_regex and glossaries_regex.match(orig):
+            return (orig,)
+        if len(orig) == 1:
+            return (orig,)
+        if self.bpe.version == (0, 1):
+            word = list(orig) + ['</w>']
+        elif self.bpe.version == (0, 2):
+            word = list(orig[:-1]) + [orig[-1] + '</w>']
+        else:
+            raise NotImplementedError
+        ids = self._merge([self._symbol_id(s) for s in word], dropout)
+        word = [self.symbols[i] for i in ids]
+        # don't output end-of-word symbols
+        if word[-1] == '</w>':
+            word = word[:-1]
+        elif word[-1].endswith('</w>'):
+            word[-1] = word[-1][:-4]
+        if self.bpe.vocab:
+            from subword_nmt.apply_bpe import check_vocab_and_split
+            word = check_vocab_and_split(
+                tuple(word), self.bpe.bpe_codes_reverse, self.bpe.vocab,
+                self.bpe.separator)
+        return word
+
+    def segment_word(self, word, dropout=0):
+        """Subwords of `word`, with separators."""
+        if not dropout:
+            subwords = self.cache.get(word)
+            if subwords is not None:
+                self.cache.move_to_end(word)
+                return subwords
+        new_word = [out for segment in self.bpe._isolate_glossaries(word)
+                    for out in self._encode(segment, dropout)]
+        subwords = [item + self.bpe.separator for item in new_word[:-1]]
+        subwords.append(new_word[-1])
+        if not dropout and self.cache_size > 0:
+            self.cache[word] = subwords
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return subwords
+
+    def segment_tokens(self, tokens, dropout=0):
+        """Segment a list of tokens, see :func:`segment_word()`."""
+        return [subword for word in tokens if word
+                for subword in self.segment_word(word, dropout)]
+
+    def segment_batch(self, batch, dropout=0):
+        """Segment a list of token lists, e.g. the examples of a bucket.
+
+        Without dropout, each distinct word of the batch is only looked up
+        or segmented once.
+        """
+        if dropout:
+            return [self.segment_tokens(tokens, dropout) for tokens in batch]
+        segmented = {}
+        for tokens in batch:
+            for word in tokens:
+                if word and word not in segmented:
+                    segmented[word] = self.segment_word(word)
+        return [[subword for word in tokens if word
+                 for subword in segmented[word]] for tokens in batch]
+
+
 @register_transform(name='bpe')
 class BPETransform(TokenizerTransform):
     """subword_nmt: official BPE subword transform class."""
@@ -194,16 +366,33 @@ class BPETransform(TokenizerTransform):
         """Initialize necessary options for subword_nmt."""
         super().__init__(opts)
 
+    @classmethod
+    def add_options(cls, parser):
+        """Available options relate to BPE."""
+        super().add_options(parser)
+        group = parser.add_argument_group('Transform/Subword/BPE')
+        group.add('-bpe_cache_size', '--bpe_cache_size',
+                  type=int, default=100000,
+                  help="Number of most recent words whose segmentation "
+                       "is cached, for each subword model. Words are not "
+                       "cached when segmented with BPE-dropout. "
+                       "Set to 0 to disable the cache.")
+
     def _parse_opts(self):
         super()._parse_opts()
         self.dropout = {'src': self.src_subword_alpha,
                         'tgt': self.tgt_subword_alpha}
+        self.bpe_cache_size = self.opts.bpe_cache_size
 
     def _set_seed(self, seed):
         """set seed to ensure reproducibility."""
         import random
         random.seed(seed)
 
+    def is_deterministic(self):
+        """Deterministic without BPE-dropout."""
+        return self.dropout['src'] == 0 and self.dropout['tgt'] == 0
+
     def warm_up(self, vocabs=None):
         """Load subword models."""
         super().warm_up(None)
@@ -219,7 +408,9 @@ class BPETransform(TokenizerTransform):
             tgt_vocabulary = read_vocabulary(
                 codecs.open(self.tgt_subword_vocab, encoding='utf-8'),
                 self.tgt_vocab_threshold)
-        load_src_model = BPE(codes=src_codes, vocab=src_vocabulary)
+        load_src_model = BPESegmenter(
+            BPE(codes=src_codes, vocab=src_vocabulary),
+            cache_size=self.bpe_cache_size)
         if self.share_vocab and (src_vocabulary == tgt_vocabulary):
             self.load_models = {
                 'src': load_src_model,
@@ -227,7 +418,9 @@ class BPETransform(TokenizerTransform):
             }
         else:
             tgt_codes = codecs.open(self.tgt_subword_model, encoding='utf-8')
-            load_tgt_model = BPE(codes=tgt_codes, vocab=tgt_vocabulary)
+            load_tgt_model = BPESegmenter(
+                BPE(codes=tgt_codes, vocab=tgt_vocabulary),
+                cache_size=self.bpe_cache_size)
             self.load_models = {
                 'src': load_src_model,
                 'tgt': load_tgt_model
@@ -240,6 +433,12 @@ class BPETransform(TokenizerTransform):
         segmented = bpe_model.segment_tokens(tokens, dropout=dropout)
         return segmented
 
+    def _tokenize_batch(self, batch, side='src', is_train=False):
+        """Do bpe subword tokenize, sharing segmentations in `batch`."""
+        bpe_model = self.load_models[side]
+        dropout = self.dropout[side] if is_train else 0
+        return bpe_model.segment_batch(batch, dropout=dropout)
+
     def apply(self, example, is_train=False, stats=None, **kwargs):
         """Apply bpe subword encode to src & tgt."""
         src_out = self._tokenize(example['src'], 'src', is_train)
@@ -312,6 +511,22 @@ class ONMTTokenizerTransform(TokenizerTransform):
         self.src_other_kwargs = self.opts.src_onmttok_kwargs
         self.tgt_other_kwargs = self.opts.tgt_onmttok_kwargs
 
+    def is_deterministic(self):
+        """Deterministic without BPE-dropout nor subword sampling."""
+        for side in ['src', 'tgt']:
+            subword_type = self.tgt_subword_type if side == 'tgt' \
+                else self.src_subword_type
+            subword_nbest = self.tgt_subword_nbest if side == 'tgt' \
+                else self.src_subword_nbest
+            subword_alpha = self.tgt_subword_alpha if side == 'tgt' \
+                else self.src_subword_alpha
+            if subword_type == 'bpe' and subword_alpha > 0:
+                return False
+            if subword_type == 'sentencepiece' and \
+                    subword_nbest not in [0, 1]:
+                return False
+        return True
+
     @classmethod
     def get_specials(cls, opts):
         src_specials, tgt_specials = set(), set()
@@ -392,6 +607,16 @@ class ONMTTokenizerTransform(TokenizerTransform):
         segmented, _ = tokenizer.tokenize(sentence)
         return segmented
 
+    def _tokenize_batch(self, batch, side='src', is_train=False):
+        """Do OpenNMT Tokenizer's tokenize, in one call for `batch`."""
+        tokenizer = self.load_models[side]
+        if not hasattr(tokenizer, 'tokenize_batch'):
+            # pyonmttok releases before batch tokenization
+            return super()._tokenize_batch(batch, side, is_train)
+        segmented, _ = tokenizer.tokenize_batch(
+            [' '.join(tokens) for tokens in batch])
+        return segmented
+
     def apply(self, example, is_train=False, stats=None, **kwargs):
         """Apply OpenNMT Tokenizer to src & tgt."""
         src_out = self._tokenize(example['src'], 'src')
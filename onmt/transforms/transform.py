@@ -41,6 +41,15 @@ class Transform(object):
     def get_specials(cls, opts):
         return (set(), set())
 
+    def is_deterministic(self):
+        """Return True if training examples always get the same output.
+
+        Leading deterministic transforms of a corpus can have their output
+        cached, see `TransformPipe.split_deterministic`. This should be
+        override to return True only when `apply` is free of randomness.
+        """
+        return False
+
     def apply(self, example, is_train=False, stats=None, **kwargs):
         """Apply transform to `example`.
 
@@ -51,6 +60,24 @@ class Transform(object):
         """
         raise NotImplementedError
 
+    def batch_apply(self, batch, is_train=False, stats=None, **kwargs):
+        """Apply transform to a list of examples `batch`.
+
+        This may be override to process all examples at once, e.g. with a
+        batched call to a subword library. It should be equivalent to
+        calling `apply` on each example.
+
+        Args:
+            batch (list[dict]): examples, all from the same corpus;
+            is_train (bool): Indicate if src/tgt is training data;
+            stats (TransformStatistics): a statistic object.
+
+        Returns:
+            list: transformed examples, None for filtered ones.
+        """
+        return [self.apply(example, is_train=is_train, stats=stats, **kwargs)
+                for example in batch]
+
     def __getstate__(self):
         """Pickling following for rebuild."""
         state = {"opts": self.opts}
@@ -128,6 +155,11 @@ class TransformStatistics(object):
         self.n_masked += n_masked
         self.tm_total += n_total
 
+    def update(self, **counters):
+        """Add `counters`, i.e. `vars()` of another statistic object."""
+        for name, value in counters.items():
+            setattr(self, name, getattr(self, name) + value)
+
     def report(self):
         """Return transform statistics report and reset counter."""
         msg = ''
@@ -192,6 +224,44 @@ class TransformPipe(Transform):
                 break
         return example
 
+    def split_deterministic(self):
+        """Split pipe into its longest deterministic prefix and the rest.
+
+        Returns:
+            (TransformPipe, TransformPipe): the prefix, with statistics of
+            its own, and the suffix, sharing the statistics of this pipe.
+        """
+        n_deterministic = 0
+        for transform in self.transforms:
+            if not transform.is_deterministic():
+                break
+            n_deterministic += 1
+        prefix = self.build_from(self.transforms[:n_deterministic])
+        suffix = self.build_from(self.transforms[n_deterministic:])
+        suffix.statistics = self.statistics
+        return prefix, suffix
+
+    def batch_apply(self, batch, is_train=False, **kwargs):
+        """Apply transform pipe to a list of examples `batch`.
+
+        Each transform is given the examples left by the previous one
+        through its `batch_apply`.
+
+        Args:
+            batch (list[dict]): examples, all from the same corpus.
+
+        Returns:
+            list: transformed examples which are not filtered out,
+            in order.
+        """
+        for transform in self.transforms:
+            batch = transform.batch_apply(
+                batch, is_train=is_train, stats=self.statistics, **kwargs)
+            batch = [example for example in batch if example is not None]
+            if len(batch) == 0:
+                break
+        return batch
+
     def __getstate__(self):
         """Pickling following for rebuild."""
         return (self.opts, self.transforms, self.statistics)
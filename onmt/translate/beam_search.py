@@ -28,6 +28,10 @@ class BeamSearchBase(DecodeStrategy):
         return_attention (bool): See base.
         block_ngram_repeat (int): See base.
         exclusion_tokens (set[int]): See base.
+        early_stopping (bool): Also stop a batch element as soon as no
+            alive hypothesis can score better than its ``n_best``-th
+            finished one, which is provable when ``global_scorer`` has
+            monotone penalties (see :class:`GNMTGlobalScorer`).
 
     Attributes:
         top_beam_finished (ByteTensor): Shape ``(B,)``.
@@ -51,13 +55,15 @@ class BeamSearchBase(DecodeStrategy):
             ``(B, beam_size)``. Initialized to ``None``.
         _coverage (FloatTensor or NoneType): Shape
             ``(1, B x beam_size, inp_seq_len)``.
+        _finished_topk (FloatTensor or NoneType): Shape ``(B, n_best)``.
+            Best scores of finished hypotheses, used for early stopping.
         hypotheses (list[list[Tuple[Tensor]]]): Contains a tuple
             of score (float), sequence (long), and attention (float or None).
     """
     def __init__(self, beam_size, batch_size, pad, bos, eos, n_best,
                  global_scorer, min_length, max_length, return_attention,
                  block_ngram_repeat, exclusion_tokens,
-                 stepwise_penalty, ratio):
+                 stepwise_penalty, ratio, early_stopping=False):
         super(BeamSearchBase, self).__init__(
             pad, bos, eos, batch_size, beam_size, min_length,
             block_ngram_repeat, exclusion_tokens, return_attention,
@@ -92,6 +98,10 @@ class BeamSearchBase(DecodeStrategy):
             not stepwise_penalty and self.global_scorer.has_cov_pen)
         self._cov_pen = self.global_scorer.has_cov_pen
 
+        self.early_stopping = (
+            early_stopping and self.global_scorer.has_monotone_penalties)
+        self._finished_topk = None
+
         self.memory_lengths = None
 
     def initialize(self, *args, **kwargs):
@@ -117,6 +127,10 @@ class BeamSearchBase(DecodeStrategy):
                                     dtype=torch.long, device=device)
         self._batch_index = torch.empty([self.batch_size, self.beam_size],
                                         dtype=torch.long, device=device)
+        if self.early_stopping:
+            self._finished_topk = torch.full(
+                [self.batch_size, self.n_best], float("-inf"),
+                dtype=torch.float, device=device)
 
     @property
     def current_predictions(self):
@@ -226,6 +240,9 @@ class BeamSearchBase(DecodeStrategy):
             .view(-1, self.alive_seq.size(-1))
         self.topk_scores = self.topk_scores.index_select(0, non_finished)
         self.topk_ids = self.topk_ids.index_select(0, non_finished)
+        if self._finished_topk is not None:
+            self._finished_topk = self._finished_topk.index_select(
+                0, non_finished)
         self.maybe_update_target_prefix(self.select_indices)
         if self.alive_attn is not None:
             inp_seq_len = self.alive_attn.size(-1)
@@ -320,6 +337,36 @@ class BeamSearchBase(DecodeStrategy):
 
         self.is_finished = self.topk_ids.eq(self.eos)
         self.ensure_max_length()
+        if self.early_stopping:
+            self.finish_unbeatable()
+
+    def finish_unbeatable(self):
+        """Mark every beam of a batch element finished when its ``n_best``
+        finished hypotheses can no longer be beaten.
+
+        Log probs only decrease as hypotheses grow and the length penalty
+        only increases, so an alive hypothesis can at best reach its
+        current log prob divided by the penalty at ``max_length``.
+
+        The bound must be strictly beaten: the alive hypotheses are then
+        stored by :func:`update_finished()` too, with scores below it, so
+        they never make it to the ``n_best`` output.
+        """
+        # finished scores, including the hypotheses ending at this step
+        finishing = self.topk_scores.masked_fill(
+            ~self.is_finished, float("-inf"))
+        self._finished_topk, _ = torch.topk(
+            torch.cat([self._finished_topk, finishing], dim=-1),
+            self.n_best, dim=-1)
+        max_penalty = self.global_scorer.length_penalty(
+            self.max_length + 1, alpha=self.global_scorer.alpha)
+        best_alive = self.topk_log_probs.view(-1, self.beam_size) \
+            .masked_fill(self.is_finished, float("-inf")) \
+            .max(dim=-1)[0] / max_penalty
+        nth_finished = self._finished_topk[:, -1]
+        unbeatable = nth_finished.gt(best_alive) \
+            & nth_finished.gt(float("-inf"))
+        self.is_finished |= unbeatable.unsqueeze(1)
 
 
 class BeamSearch(BeamSearchBase):
@@ -422,6 +469,9 @@ class GNMTGlobalScorer(object):
         coverage_penalty (callable): See :class:`penalties.PenaltyBuilder`.
         has_cov_pen (bool): See :class:`penalties.PenaltyBuilder`.
         has_len_pen (bool): See :class:`penalties.PenaltyBuilder`.
+        has_monotone_penalties (bool): Whether the score of a hypothesis
+            can only decrease as it grows, i.e. no coverage penalty and a
+            non-decreasing length penalty.
     """
 
     @classmethod
@@ -446,6 +496,8 @@ class GNMTGlobalScorer(object):
         # Probability will be divided by this
         self.length_penalty = penalty_builder.length_penalty
 
+        self.has_monotone_penalties = not self.has_cov_pen and alpha >= 0
+
     @classmethod
     def _validate(cls, alpha, beta, length_penalty, coverage_penalty):
         # these warnings indicate that either the alpha/beta
@@ -1,13 +1,15 @@
 import torch
 
 from onmt.translate.decode_strategy import DecodeStrategy
+from onmt.utils.misc import tile
 
 
-def sample_with_temperature(logits, sampling_temp, keep_topk):
+def sample_with_temperature(logits, sampling_temp, keep_topk, keep_topp=0.):
     """Select next tokens randomly from the top k possible next tokens.
 
     Samples from a categorical distribution over the ``keep_topk`` words using
-    the category probabilities ``logits / sampling_temp``.
+    the category probabilities ``logits / sampling_temp``, optionally
+    restricted further to the nucleus of probability ``keep_topp``.
 
     Args:
         logits (FloatTensor): Shaped ``(batch_size, vocab_size)``.
@@ -20,6 +22,10 @@ def sample_with_temperature(logits, sampling_temp, keep_topk):
             sampled.
         keep_topk (int): This many words could potentially be chosen. The
             other logits are set to have probability 0.
+        keep_topp (float): If in ``(0, 1)``, only the smallest set of most
+            likely words whose probability reaches ``keep_topp`` could be
+            chosen (nucleus sampling). The other logits are set to have
+            probability 0.
 
     Returns:
         (LongTensor, FloatTensor):
@@ -49,6 +55,16 @@ def sample_with_temperature(logits, sampling_temp, keep_topk):
             ignore = torch.lt(logits, kth_best)
             logits = logits.masked_fill(ignore, -10000)
 
+        if 0 < keep_topp < 1:
+            sorted_logits, sorted_indices = torch.sort(
+                logits, dim=1, descending=True)
+            sorted_probs = torch.softmax(sorted_logits.float(), dim=1)
+            # probability of the more likely words
+            cumulative_probs = sorted_probs.cumsum(dim=1) - sorted_probs
+            sorted_ignore = cumulative_probs.ge(keep_topp)
+            ignore = sorted_ignore.scatter(1, sorted_indices, sorted_ignore)
+            logits = logits.masked_fill(ignore, -10000)
+
         dist = torch.distributions.Multinomial(
             logits=logits, total_count=1)
         topk_ids = torch.argmax(dist.sample(), dim=1, keepdim=True)
@@ -78,23 +94,44 @@ class GreedySearch(DecodeStrategy):
             :func:`~onmt.translate.greedy_search.sample_with_temperature()`.
         keep_topk (int): See
             :func:`~onmt.translate.greedy_search.sample_with_temperature()`.
+        keep_topp (float): See
+            :func:`~onmt.translate.greedy_search.sample_with_temperature()`.
+        n_samples (int): Number of predictions sampled for each example.
+            The batch is repeated this many times at initialization, so
+            all samples are decoded in the same batched pass.
     """
 
     def __init__(self, pad, bos, eos, batch_size, min_length,
                  block_ngram_repeat, exclusion_tokens, return_attention,
-                 max_length, sampling_temp, keep_topk):
+                 max_length, sampling_temp, keep_topk, keep_topp=0.,
+                 n_samples=1):
         assert block_ngram_repeat == 0
         super(GreedySearch, self).__init__(
             pad, bos, eos, batch_size, 1, min_length, block_ngram_repeat,
             exclusion_tokens, return_attention, max_length)
         self.sampling_temp = sampling_temp
         self.keep_topk = keep_topk
+        self.keep_topp = keep_topp
+        self.n_samples = n_samples
         self.topk_scores = None
 
     def initialize(self, memory_bank, src_lengths, src_map=None, device=None,
                    target_prefix=None):
-        """Initialize for decoding."""
-        fn_map_state = None
+        """Initialize for decoding.
+        Repeat src objects `n_samples` times.
+        """
+        def fn_map_state(state, dim):
+            return tile(state, self.n_samples, dim=dim)
+
+        if self.n_samples > 1:
+            if isinstance(memory_bank, tuple):
+                memory_bank = tuple(fn_map_state(x, dim=1)
+                                    for x in memory_bank)
+            else:
+                memory_bank = fn_map_state(memory_bank, dim=1)
+            if src_map is not None:
+                src_map = fn_map_state(src_map, dim=1)
+            src_lengths = fn_map_state(src_lengths, dim=0)
 
         if isinstance(memory_bank, tuple):
             mb_device = memory_bank[0].device
@@ -106,11 +143,21 @@ class GreedySearch(DecodeStrategy):
         self.memory_lengths = src_lengths
         super(GreedySearch, self).initialize(
             memory_bank, src_lengths, src_map, device, target_prefix)
+        n_paths = self.batch_size * self.n_samples
+        if self.n_samples > 1:
+            self.alive_seq = fn_map_state(self.alive_seq, dim=0)
+            if self.target_prefix is not None:
+                self.target_prefix = fn_map_state(self.target_prefix, dim=0)
         self.select_indices = torch.arange(
-            self.batch_size, dtype=torch.long, device=device)
+            n_paths, dtype=torch.long, device=device)
         self.original_batch_idx = torch.arange(
             self.batch_size, dtype=torch.long, device=device)
-        return fn_map_state, memory_bank, self.memory_lengths, src_map
+        if self.n_samples > 1:
+            self.original_batch_idx = fn_map_state(
+                self.original_batch_idx, dim=0)
+        # nothing to repeat in the decoder state for a single sample
+        return (fn_map_state if self.n_samples > 1 else None), \
+            memory_bank, self.memory_lengths, src_map
 
     @property
     def current_predictions(self):
@@ -118,7 +165,8 @@ class GreedySearch(DecodeStrategy):
 
     @property
     def batch_offset(self):
-        return self.select_indices
+        # index in the original batch of the example of each alive path
+        return self.original_batch_idx
 
     def _pick(self, log_probs):
         """Function used to pick next tokens.
@@ -129,7 +177,7 @@ class GreedySearch(DecodeStrategy):
         # maybe fix some prediction at this step by modifying log_probs
         log_probs = self.target_prefixing(log_probs)
         topk_ids, topk_scores = sample_with_temperature(
-            log_probs, self.sampling_temp, self.keep_topk)
+            log_probs, self.sampling_temp, self.keep_topk, self.keep_topp)
         return topk_ids, topk_scores
 
     def advance(self, log_probs, attn):
@@ -0,0 +1,72 @@
+"""Request handling shared by the REST servers, independent of the web
+framework serving them."""
+import configargparse
+
+from onmt.translate.translation_server import ServerModelError
+
+STATUS_OK = "ok"
+STATUS_ERROR = "error"
+
+
+def clone_model_request(translation_server, model_id, data):
+    """Clone `model_id` with the options of a `/clone_model` request."""
+    out = {}
+    timeout = -1
+    if 'timeout' in data:
+        timeout = data['timeout']
+        del data['timeout']
+
+    opt = data.get('opt', None)
+    try:
+        model_id, load_time = translation_server.clone_model(
+            model_id, opt, timeout)
+    except ServerModelError as e:
+        out['status'] = STATUS_ERROR
+        out['error'] = str(e)
+    else:
+        out['status'] = STATUS_OK
+        out['model_id'] = model_id
+        out['load_time'] = load_time
+    return out
+
+
+def translate_request(translation_server, inputs, logger=None):
+    """Translate the `inputs` of a `/translate` request and build the
+    response, unloading the model if it failed."""
+    out = {}
+    try:
+        trans, scores, n_best, _, aligns = translation_server.run(inputs)
+        assert len(trans) == len(inputs) * n_best
+        assert len(scores) == len(inputs) * n_best
+        assert len(aligns) == len(inputs) * n_best
+
+        out = [[] for _ in range(n_best)]
+        for i in range(len(trans)):
+            response = {"src": inputs[i // n_best]['src'], "tgt": trans[i],
+                        "n_best": n_best, "pred_score": scores[i]}
+            if len(aligns[i]) > 0 and aligns[i][0] is not None:
+                response["align"] = aligns[i]
+            out[i % n_best].append(response)
+    except ServerModelError as e:
+        model_id = inputs[0].get("id")
+        if logger is not None:
+            logger.warning("Unload model #{} "
+                           "because of an error".format(model_id))
+        translation_server.models[model_id].unload()
+        out['error'] = str(e)
+        out['status'] = STATUS_ERROR
+    return out
+
+
+def get_server_parser(description="OpenNMT-py REST Server"):
+    """Command line options shared by the REST servers."""
+    parser = configargparse.ArgumentParser(
+        config_file_parser_class=configargparse.YAMLConfigFileParser,
+        description=description)
+    parser.add_argument("--ip", type=str, default="0.0.0.0")
+    parser.add_argument("--port", type=int, default="5000")
+    parser.add_argument("--url_root", type=str, default="/translator")
+    parser.add_argument("--debug", "-d", action="store_true")
+    parser.add_argument("--config", "-c", type=str,
+                        default="./available_models/conf.json")
+    return parser
@@ -0,0 +1,125 @@
+""" Lexical shortlist of the target vocabulary """
+import codecs
+from collections import defaultdict
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+
+class Shortlist(object):
+    """Restrict the output vocabulary of a batch to the likely translations
+    of its source tokens.
+
+    The candidates of a batch are the most frequent target tokens, which
+    include the special ones, plus the `topk` best translations of each
+    of its source tokens. Target vocabularies are sorted by frequency,
+    so candidate ids below `n_frequent` keep their value in the reduced
+    space, special tokens included.
+
+    Args:
+        table (LongTensor): ``(src_vocab_size, topk)`` target ids of the
+            translations of each source id, padded with -1.
+        n_frequent (int): number of most frequent target tokens that are
+            always candidates.
+    """
+
+    def __init__(self, table, n_frequent):
+        self.table = table
+        self.n_frequent = n_frequent
+
+    @classmethod
+    def from_file(cls, path, src_vocab, tgt_vocab, topk=50,
+                  n_frequent=100):
+        """Build a shortlist from a lexical table.
+
+        Args:
+            path (str): file with one ``src_token tgt_token [score]``
+                entry per line, e.g. an alignment-derived lexical table.
+                Scores of repeated pairs add up and default to 1, so
+                aligned or co-occurring pairs can also be listed as is.
+            src_vocab (torchtext.vocab.Vocab): source vocabulary.
+            tgt_vocab (torchtext.vocab.Vocab): target vocabulary.
+            topk (int): translations kept per source token.
+            n_frequent (int): see :func:`__init__()`.
+        """
+        scores = defaultdict(lambda: defaultdict(float))
+        with codecs.open(path, "r", "utf-8") as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 2:
+                    continue
+                src_id = src_vocab.stoi.get(fields[0])
+                tgt_id = tgt_vocab.stoi.get(fields[1])
+                if src_id is None or tgt_id is None:
+                    continue
+                score = float(fields[2]) if len(fields) > 2 else 1.
+                scores[src_id][tgt_id] += score
+
+        table = torch.full((len(src_vocab), topk), -1, dtype=torch.long)
+        for src_id, tgt_scores in scores.items():
+            best = sorted(tgt_scores, key=tgt_scores.get, reverse=True)
+            best = best[:topk]
+            table[src_id, :len(best)] = torch.tensor(best)
+        return cls(table, min(n_frequent, len(tgt_vocab)))
+
+    @classmethod
+    def from_opt(cls, opt, fields):
+        src_vocab = dict(fields)["src"].base_field.vocab
+        tgt_field = dict(fields)["tgt"].base_field
+        tgt_vocab = tgt_field.vocab
+        specials = [tgt_field.unk_token, tgt_field.pad_token,
+                    tgt_field.init_token, tgt_field.eos_token]
+        n_specials = max(tgt_vocab.stoi[tok] for tok in specials) + 1
+        return cls.from_file(
+            opt.shortlist, src_vocab, tgt_vocab,
+            topk=opt.shortlist_topk,
+            n_frequent=max(opt.shortlist_frequent, n_specials))
+
+    def to(self, device):
+        self.table = self.table.to(device)
+        return self
+
+    def candidates(self, src):
+        """Sorted target ids allowed for a batch.
+
+        Args:
+            src (LongTensor): ``(src_len, batch, nfeats)`` source ids.
+
+        Returns:
+            LongTensor: ``(n_candidates,)`` target ids, starting with
+            ``0 .. n_frequent - 1``.
+        """
+        if self.table.device != src.device:
+            self.to(src.device)
+        translations = self.table[src[:, :, 0].unique()].view(-1)
+        frequent = torch.arange(self.n_frequent, device=src.device)
+        return torch.cat(
+            [frequent, translations[translations >= self.n_frequent]]
+        ).unique(sorted=True)
+
+    @staticmethod
+    def slice_generator(generator, candidates):
+        """Generator projecting to `candidates` only.
+
+        Args:
+            generator (nn.Sequential): a standard generator, starting with
+                its output projection.
+            candidates (LongTensor): see :func:`candidates()`.
+
+        Returns:
+            callable: maps decoder outputs to log-probabilities over the
+            candidates.
+        """
+        if not isinstance(generator, nn.Sequential) \
+                or type(generator[0]) is not nn.Linear:
+            raise ValueError(
+                "Shortlist requires a standard, non quantized generator.")
+        linear, rest = generator[0], generator[1:]
+        weight = linear.weight.index_select(0, candidates)
+        bias = linear.bias.index_select(0, candidates) \
+            if linear.bias is not None else None
+
+        def generate(dec_out):
+            return rest(F.linear(dec_out, weight, bias))
+        return generate
@@ -7,12 +7,14 @@ import os
 import time
 import json
 import threading
+import queue
 import re
 import traceback
 import importlib
 import torch
 import onmt.opts
 
+from collections import OrderedDict
 from itertools import islice, zip_longest
 from copy import deepcopy
 
@@ -75,6 +77,215 @@ class ServerModelError(Exception):
     pass
 
 
+class TranslationCache(object):
+    """Bounded exact-match cache of translated segments.
+
+    Entries are evicted in least recently used order once `size` is
+    reached, and considered stale after `ttl` seconds (if positive).
+
+    Args:
+        size (int): Maximum number of cached segments
+        ttl (int): Seconds before an entry expires.
+            Negative values means no expiration
+    """
+
+    def __init__(self, size=10000, ttl=-1):
+        if size <= 0:
+            raise ValueError("Cache size must be positive, got %d" % size)
+        self.size = size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_opt(cls, cache_opt):
+        """Alternate constructor from the `cache` section of the config."""
+        return cls(size=cache_opt.get("size", 10000),
+                   ttl=cache_opt.get("ttl", -1))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Return the value stored for `key` or None, counting hit/miss."""
+        with self._lock:
+            entry = self._entries.get(key, None)
+            if entry is not None:
+                stamp, value = entry
+                if self.ttl < 0 or time.time() - stamp < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def to_dict(self):
+        return {"size": self.size,
+                "ttl": self.ttl,
+                "entries": len(self),
+                "hits": self.hits,
+                "misses": self.misses}
+
+
+class _QueuedRequest(object):
+    """Segments of one request waiting in the :class:`BatchScheduler`."""
+
+    def __init__(self, texts, refs):
+        self.texts = texts
+        self.refs = refs
+        self.n_tokens = sum(len(text.split()) for text in texts)
+        self.scores = None
+        self.predictions = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class BatchScheduler(object):
+    """Gather segments of concurrent requests into shared batches.
+
+    A worker thread waits for a first request, then keeps collecting
+    requests for up to `max_delay` milliseconds or until `max_tokens`
+    source tokens are queued. Everything gathered is translated as one
+    length-sorted batch and results are handed back to each caller.
+
+    Args:
+        translate_fn (callable): ``(texts, refs) -> (scores, predictions)``
+            translating tokenized segments, `refs` being None or a list
+        max_delay (int): Milliseconds to wait for more requests
+        max_tokens (int): Number of queued source tokens that triggers
+            translation without waiting for `max_delay`
+        timeout (int): Seconds :func:`submit()` waits for a translation
+            before raising. Negative values means no timeout
+    """
+
+    def __init__(self, translate_fn, max_delay=10, max_tokens=4096,
+                 timeout=120):
+        self.translate_fn = translate_fn
+        self.max_delay = max_delay
+        self.max_tokens = max_tokens
+        self.timeout = timeout
+        self.closed = False
+        self.queue = queue.Queue()
+        self.worker = threading.Thread(target=self._loop, daemon=True)
+        self.worker.start()
+
+    @classmethod
+    def from_opt(cls, translate_fn, batching_opt):
+        """Alternate constructor from the `batching` section of the config.
+        """
+        return cls(translate_fn,
+                   max_delay=batching_opt.get("max_delay", 10),
+                   max_tokens=batching_opt.get("max_tokens", 4096),
+                   timeout=batching_opt.get("timeout", 120))
+
+    def submit(self, texts, refs=None):
+        """Queue tokenized segments and block until they are translated.
+
+        Same args/returns as `translate_fn`.
+        """
+        if self.closed:
+            raise ServerModelError("Batch scheduler is closed")
+        request = _QueuedRequest(texts, refs)
+        self.queue.put(request)
+        if not request.done.wait(
+                self.timeout if self.timeout >= 0 else None):
+            raise ServerModelError(
+                "Batched translation timeout after %s seconds"
+                % self.timeout)
+        if request.error is not None:
+            raise request.error
+        return request.scores, request.predictions
+
+    def close(self):
+        """Stop the worker thread once the batch in progress is done.
+
+        Requests still queued, or submitted afterwards, fail with a
+        :class:`ServerModelError`.
+        """
+        self.closed = True
+        self.queue.put(None)
+
+    def _gather(self):
+        request = self.queue.get()
+        if request is None:
+            return []
+        requests = [request]
+        n_tokens = request.n_tokens
+        deadline = time.time() + self.max_delay / 1000.
+        while n_tokens < self.max_tokens:
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                break
+            try:
+                request = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if request is None:
+                break
+            requests.append(request)
+            n_tokens += request.n_tokens
+        return requests
+
+    def _loop(self):
+        while not self.closed:
+            requests = self._gather()
+            # translator takes references for all segments or for none
+            with_refs = [r for r in requests if r.refs is not None]
+            without_refs = [r for r in requests if r.refs is None]
+            for group in [with_refs, without_refs]:
+                if len(group) > 0:
+                    self._process(group)
+        error = ServerModelError("Batch scheduler is closed")
+        while True:
+            try:
+                request = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None:
+                request.error = error
+                request.done.set()
+
+    def _process(self, requests):
+        texts = [text for r in requests for text in r.texts]
+        refs = [ref for r in requests if r.refs is not None for ref in r.refs]
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i].split()))
+        try:
+            sorted_scores, sorted_preds = self.translate_fn(
+                [texts[i] for i in order],
+                [refs[i] for i in order] if len(refs) > 0 else None)
+        except Exception as e:
+            for request in requests:
+                request.error = e
+                request.done.set()
+            return
+        scores = [None] * len(texts)
+        predictions = [None] * len(texts)
+        for k, i in enumerate(order):
+            scores[i] = sorted_scores[k]
+            predictions[i] = sorted_preds[k]
+        offset = 0
+        for request in requests:
+            n = len(request.texts)
+            request.scores = scores[offset:offset + n]
+            request.predictions = predictions[offset:offset + n]
+            offset += n
+            request.done.set()
+
+
 class CTranslate2Translator(object):
     """
     This class wraps the ctranslate2.Translator object to
@@ -103,7 +314,9 @@ class CTranslate2Translator(object):
             time.sleep(1)
             self.translator.unload_model(to_cpu=True)
 
-    def translate(self, texts_to_translate, batch_size=8, tgt=None):
+    def translate(self, texts_to_translate, batch_size=8, tgt=None,
+                  batch_type="sents"):
+        # NOTE: ctranslate2 does its own batching, `batch_type` is ignored
         batch = [item.split(" ") for item in texts_to_translate]
         if tgt is not None:
             tgt = [item.split(" ") for item in tgt]
@@ -126,6 +339,106 @@ class CTranslate2Translator(object):
         self.translator.load_model()
 
 
+def _replica_worker(translator, n_threads, cores, conn):
+    """Serve translation requests received on `conn` in a replica process.
+    """
+    if cores is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(n_threads)
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+        texts_to_translate, batch_size, batch_type, tgt = request
+        try:
+            scores, predictions = translator.translate(
+                texts_to_translate, tgt=tgt, batch_size=batch_size,
+                batch_type=batch_type)
+            scores = [[score.item() if type(score) is torch.Tensor
+                       else score for score in ex] for ex in scores]
+            conn.send((scores, predictions, None))
+        except (RuntimeError, Exception) as e:
+            conn.send((None, None, "%s\n%s" % (e, traceback.format_exc())))
+
+
+class TranslatorReplicas(object):
+    """
+    This class serves a CPU translator from `n_replicas` forked processes
+    to reproduce the onmt.translate.translator API. Model weights are moved
+    to shared memory before forking so replicas do not copy them, and
+    requests go to the replica with the fewest pending segments.
+
+    Args:
+        translator (onmt.translate.Translator): loaded CPU translator
+        n_replicas (int): number of worker processes
+        threads (int): torch threads per replica, by default the
+            available cores are split evenly between replicas. Each replica
+            is pinned to its own cores when they are enough to go around.
+    """
+
+    def __init__(self, translator, n_replicas, threads=None):
+        cores = sorted(os.sched_getaffinity(0)) \
+            if hasattr(os, "sched_getaffinity") \
+            else list(range(os.cpu_count()))
+        if threads is None:
+            threads = max(1, len(cores) // n_replicas)
+        pin = threads * n_replicas <= len(cores)
+
+        translator.model.share_memory()
+        ctx = torch.multiprocessing.get_context("fork")
+        self.processes = []
+        self.conns = []
+        for i in range(n_replicas):
+            parent_conn, child_conn = ctx.Pipe()
+            replica_cores = cores[i * threads:(i + 1) * threads] \
+                if pin else None
+            process = ctx.Process(
+                target=_replica_worker,
+                args=(translator, threads, replica_cores, child_conn),
+                daemon=True)
+            process.start()
+            self.processes.append(process)
+            self.conns.append(parent_conn)
+        self.pending = [0] * n_replicas
+        self.conn_locks = [threading.Lock() for _ in range(n_replicas)]
+        self.dispatch_lock = threading.Lock()
+
+    def translate(self, texts_to_translate, batch_size=8, tgt=None,
+                  batch_type="sents"):
+        with self.dispatch_lock:
+            i = min(range(len(self.pending)), key=self.pending.__getitem__)
+            self.pending[i] += len(texts_to_translate)
+        try:
+            with self.conn_locks[i]:
+                self.conns[i].send(
+                    (texts_to_translate, batch_size, batch_type, tgt))
+                scores, predictions, error = self.conns[i].recv()
+        finally:
+            with self.dispatch_lock:
+                self.pending[i] -= len(texts_to_translate)
+        if error is not None:
+            raise RuntimeError("Replica %d: %s" % (i, error))
+        return scores, predictions
+
+    def close(self):
+        for conn, lock in zip(self.conns, self.conn_locks):
+            with lock:
+                conn.send(None)
+        for process in self.processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+
+    def to_cpu(self):
+        pass
+
+    def to_gpu(self):
+        raise ServerModelError("Model replicas only run on CPU")
+
+
 class TranslationServer(object):
     def __init__(self):
         self.models = {}
@@ -155,7 +468,10 @@ class TranslationServer(object):
                       'custom_opt': conf.get('custom_opt', None),
                       'on_timeout': conf.get('on_timeout', None),
                       'model_root': conf.get('model_root', self.models_root),
-                      'ct2_model': conf.get('ct2_model', None)
+                      'ct2_model': conf.get('ct2_model', None),
+                      'cache_opt': conf.get('cache', None),
+                      'batching_opt': conf.get('batching', None),
+                      'replicas_opt': conf.get('replicas', None)
                       }
             kwargs = {k: v for (k, v) in kwargs.items() if v is not None}
             model_id = conf.get("id", None)
@@ -258,11 +574,22 @@ class ServerModel(object):
             timeout (see :func:`do_timeout()`.)
         model_root (str): Path to the model directory
             it must contain the model and tokenizer file
+        cache_opt (dict): Options for the translation cache
+            (``{"size": int, "ttl": int}``) or None to disable it
+        batching_opt (dict): Options to batch concurrent requests
+            together (``{"max_delay": int, "max_tokens": int,
+            "timeout": int}``, see
+            :class:`BatchScheduler`) or None to translate each request
+            on its own
+        replicas_opt (dict): Options to serve the model from several CPU
+            processes (``{"num": int, "threads": int}``, see
+            :class:`TranslatorReplicas`) or None to serve it in-process
     """
 
     def __init__(self, opt, model_id, preprocess_opt=None, tokenizer_opt=None,
                  postprocess_opt=None, custom_opt=None, load=False, timeout=-1,
-                 on_timeout="to_cpu", model_root="./", ct2_model=None):
+                 on_timeout="to_cpu", model_root="./", ct2_model=None,
+                 cache_opt=None, batching_opt=None, replicas_opt=None):
         self.model_root = model_root
         self.opt = self.parse_opt(opt)
         self.custom_opt = custom_opt
@@ -277,10 +604,26 @@ class ServerModel(object):
         self.ct2_model = os.path.join(model_root, ct2_model) \
             if ct2_model is not None else None
 
+        self.replicas_opt = replicas_opt
+        if self.replicas_opt is not None and \
+                (self.opt.cuda or self.ct2_model is not None):
+            raise ValueError("Model replicas are only supported for "
+                             "OpenNMT-py models on CPU")
+
         self.unload_timer = None
         self.user_opt = opt
         self.tokenizers = None
 
+        self.cache_opt = cache_opt
+        self.cache = None
+        if self.cache_opt is not None:
+            self.cache = TranslationCache.from_opt(self.cache_opt)
+            # decoding options are fixed for a given model, but keep them
+            # in the key so entries can never be mixed up between setups
+            self._cache_opt_key = tuple(sorted(
+                (k, str(v)) for k, v in self.opt.__dict__.items()
+                if k not in ["models", "src", "tgt", "output", "log_file"]))
+
         if len(self.opt.log_file) > 0:
             log_file = os.path.join(model_root, self.opt.log_file)
         else:
@@ -292,6 +635,13 @@ class ServerModel(object):
         self.loading_lock = threading.Event()
         self.loading_lock.set()
         self.running_lock = threading.Semaphore(value=1)
+        # each replica can run a translation concurrently, requests in
+        # flight are counted so that unloading waits for them
+        self.replica_slots = threading.BoundedSemaphore(
+            value=1 if self.replicas_opt is None
+            else self.replicas_opt.get("num", 1))
+        self.in_flight = 0
+        self.in_flight_cond = threading.Condition()
 
         set_random_seed(self.opt.seed, self.opt.cuda)
 
@@ -330,6 +680,12 @@ class ServerModel(object):
                 function = get_function_by_path(function_path)
                 self.postprocessor.append(function)
 
+        self.batching_opt = batching_opt
+        self.batch_scheduler = None
+        self.scheduler_lock = threading.Lock()
+        if self.batching_opt is not None:
+            self.get_batch_scheduler()
+
         if load:
             self.load(preload=True)
             self.stop_unload_timer()
@@ -398,6 +754,11 @@ class ServerModel(object):
                 self.translator = build_translator(
                     self.opt, report_score=False,
                     out_file=codecs.open(os.devnull, "w", "utf-8"))
+                if self.replicas_opt is not None:
+                    self.translator = TranslatorReplicas(
+                        self.translator,
+                        self.replicas_opt.get("num", 1),
+                        threads=self.replicas_opt.get("threads", None))
         except RuntimeError as e:
             raise ServerModelError("Runtime Error: %s" % str(e))
 
@@ -406,7 +767,27 @@ class ServerModel(object):
         self.reset_unload_timer()
         self.loading_lock.set()
 
-    @critical
+    def maybe_load(self, timer=None):
+        """Load the model or move it to GPU if needed, waiting for any
+        loading in progress in another thread."""
+        if not self.loading_lock.is_set():
+            self.logger.info(
+                "Model #%d is being loaded by another thread, waiting"
+                % self.model_id)
+            if not self.loading_lock.wait(timeout=30):
+                raise ServerModelError("Model %d loading timeout"
+                                       % self.model_id)
+
+        else:
+            if not self.loaded:
+                self.load()
+                if timer is not None:
+                    timer.tick(name="load")
+            elif self.opt.cuda:
+                self.to_gpu()
+                if timer is not None:
+                    timer.tick(name="to_gpu")
+
     def run(self, inputs):
         """Translate `inputs` using this model
 
@@ -417,29 +798,68 @@ class ServerModel(object):
             result (list): translations
             times (dict): containing times
         """
+        if self.batching_opt is not None:
+            # segments are queued and the scheduler thread translates them
+            # under the running lock, together with other pending requests
+            return self._run(inputs)
+        if self.replicas_opt is not None:
+            # replicas translate concurrently, the running lock is only
+            # held to load the model and register the request
+            self._start_request()
+            try:
+                return self._run(inputs)
+            finally:
+                self._end_request()
+        return self._run_exclusive(inputs)
+
+    def get_batch_scheduler(self):
+        """Return the :class:`BatchScheduler`, restarting it after an
+        unload."""
+        with self.scheduler_lock:
+            if self.batch_scheduler is None:
+                self.batch_scheduler = BatchScheduler.from_opt(
+                    self.translate_queued, self.batching_opt)
+            return self.batch_scheduler
 
-        self.stop_unload_timer()
+    @critical
+    def _run_exclusive(self, inputs):
+        return self._run(inputs, exclusive=True)
+
+    @critical
+    def _start_request(self):
+        self.maybe_load()
+        with self.in_flight_cond:
+            self.stop_unload_timer()
+            self.in_flight += 1
+
+    def _end_request(self):
+        with self.in_flight_cond:
+            self.in_flight -= 1
+            if self.in_flight == 0:
+                self.reset_unload_timer()
+                self.in_flight_cond.notify_all()
+
+    def _wait_requests(self, timeout=120):
+        """Wait for the requests in flight to complete."""
+        with self.in_flight_cond:
+            if not self.in_flight_cond.wait_for(
+                    lambda: self.in_flight == 0, timeout=timeout):
+                raise ServerModelError(
+                    "Model %d requests still running after %d seconds"
+                    % (self.model_id, timeout))
+
+    def _run(self, inputs, exclusive=False):
+        batched = self.batching_opt is not None
+        if exclusive:
+            self.stop_unload_timer()
 
         timer = Timer()
         timer.start()
 
         self.logger.info("Running translation using %d" % self.model_id)
 
-        if not self.loading_lock.is_set():
-            self.logger.info(
-                "Model #%d is being loaded by another thread, waiting"
-                % self.model_id)
-            if not self.loading_lock.wait(timeout=30):
-                raise ServerModelError("Model %d loading timeout"
-                                       % self.model_id)
-
-        else:
-            if not self.loaded:
-                self.load()
-                timer.tick(name="load")
-            elif self.opt.cuda:
-                self.to_gpu()
-                timer.tick(name="to_gpu")
+        if exclusive:
+            self.maybe_load(timer)
 
         texts = []
         head_spaces = []
@@ -466,13 +886,20 @@ class ServerModel(object):
             tail_spaces.append(whitespaces_after)
 
         empty_indices = []
+        cached = {}
         texts_to_translate, texts_ref = [], []
         for i, (tok, ref_tok) in enumerate(texts):
             if tok == "":
                 empty_indices.append(i)
-            else:
-                texts_to_translate.append(tok)
-                texts_ref.append(ref_tok)
+                continue
+            if self.cache is not None:
+                hit = self.cache.get(self.cache_key(tok, ref_tok))
+                if hit is not None:
+                    cached[i] = hit
+                    continue
+            texts_to_translate.append(tok)
+            texts_ref.append(ref_tok)
+        cache_refs = texts_ref
         if any([item is None for item in texts_ref]):
             texts_ref = None
 
@@ -480,29 +907,22 @@ class ServerModel(object):
         predictions = []
 
         if len(texts_to_translate) > 0:
-            try:
-                scores, predictions = self.translator.translate(
-                    texts_to_translate,
-                    tgt=texts_ref,
-                    batch_size=len(texts_to_translate)
-                    if self.opt.batch_size == 0
-                    else self.opt.batch_size)
-            except (RuntimeError, Exception) as e:
-                err = "Error: %s" % str(e)
-                self.logger.error(err)
-                self.logger.error("repr(text_to_translate): "
-                                  + repr(texts_to_translate))
-                self.logger.error("model: #%s" % self.model_id)
-                self.logger.error("model opt: " + str(self.opt.__dict__))
-                self.logger.error(traceback.format_exc())
-
-                raise ServerModelError(err)
+            if batched:
+                scores, predictions = self.get_batch_scheduler().submit(
+                    texts_to_translate, texts_ref)
+            else:
+                scores, predictions = self.translate(
+                    texts_to_translate, texts_ref)
 
         timer.tick(name="translation")
         self.logger.info("""Using model #%d\t%d inputs
                \ttranslation time: %f""" % (self.model_id, len(texts),
                                             timer.times['translation']))
-        self.reset_unload_timer()
+        if self.cache is not None:
+            self.logger.info("Translation cache: %d hits in %d inputs"
+                             % (len(cached), len(texts)))
+        if exclusive:
+            self.reset_unload_timer()
 
         # NOTE: translator returns lists of `n_best` list
         def flatten_list(_list): return sum(_list, [])
@@ -520,12 +940,27 @@ class ServerModel(object):
         aligns = [align for _, align in results]
         results = [tokens for tokens, _ in results]
 
-        # build back results with empty texts
-        for i in empty_indices:
+        if self.cache is not None:
+            n_best = self.opt.n_best
+            for k, (tok, ref_tok) in enumerate(
+                    zip(texts_to_translate, cache_refs)):
+                self.cache.put(self.cache_key(tok, ref_tok), (
+                    results[k * n_best:(k + 1) * n_best],
+                    scores[k * n_best:(k + 1) * n_best],
+                    aligns[k * n_best:(k + 1) * n_best]))
+
+        # build back results with empty and cached texts
+        for i in sorted(empty_indices + list(cached.keys())):
             j = i * self.opt.n_best
-            results = results[:j] + [""] * self.opt.n_best + results[j:]
-            aligns = aligns[:j] + [None] * self.opt.n_best + aligns[j:]
-            scores = scores[:j] + [0] * self.opt.n_best + scores[j:]
+            if i in cached:
+                sub_results, sub_scores, sub_aligns = cached[i]
+            else:
+                sub_results = [""] * self.opt.n_best
+                sub_scores = [0] * self.opt.n_best
+                sub_aligns = [None] * self.opt.n_best
+            results = results[:j] + list(sub_results) + results[j:]
+            aligns = aligns[:j] + list(sub_aligns) + aligns[j:]
+            scores = scores[:j] + list(sub_scores) + scores[j:]
 
         rebuilt_segs, scores, aligns = self.rebuild_seg_packages(
             all_preprocessed, results, scores, aligns, self.opt.n_best)
@@ -541,6 +976,61 @@ class ServerModel(object):
 
         return results, scores, self.opt.n_best, timer.times, aligns
 
+    def translate(self, texts_to_translate, texts_ref=None):
+        """Run the translator on already tokenized segments.
+
+        Args:
+            texts_to_translate (List[str]): tokenized source segments
+            texts_ref (List[str]): tokenized references or None
+
+        Returns:
+            scores (list): `n_best` scores per segment
+            predictions (list): `n_best` predictions per segment
+        """
+        if self.opt.batch_size == 0:
+            batch_size, batch_type = len(texts_to_translate), "sents"
+        else:
+            batch_size, batch_type = self.opt.batch_size, self.opt.batch_type
+        # translate segments sorted by length so that batches (token
+        # budgeted with `-batch_type tokens`) need little padding
+        order = sorted(range(len(texts_to_translate)),
+                       key=lambda i: len(texts_to_translate[i].split()))
+        try:
+            with self.replica_slots:
+                sorted_scores, sorted_predictions = \
+                    self.translator.translate(
+                        [texts_to_translate[i] for i in order],
+                        tgt=[texts_ref[i] for i in order]
+                        if texts_ref is not None else None,
+                        batch_size=batch_size,
+                        batch_type=batch_type)
+        except (RuntimeError, Exception) as e:
+            err = "Error: %s" % str(e)
+            self.logger.error(err)
+            self.logger.error("repr(text_to_translate): "
+                              + repr(texts_to_translate))
+            self.logger.error("model: #%s" % self.model_id)
+            self.logger.error("model opt: " + str(self.opt.__dict__))
+            self.logger.error(traceback.format_exc())
+
+            raise ServerModelError(err)
+        scores = [None] * len(texts_to_translate)
+        predictions = [None] * len(texts_to_translate)
+        for k, i in enumerate(order):
+            scores[i] = sorted_scores[k]
+            predictions[i] = sorted_predictions[k]
+        return scores, predictions
+
+    @critical
+    def translate_queued(self, texts_to_translate, texts_ref=None):
+        """Translate a batch gathered by the :class:`BatchScheduler`."""
+        self.stop_unload_timer()
+        self.maybe_load()
+        try:
+            return self.translate(texts_to_translate, texts_ref)
+        finally:
+            self.reset_unload_timer()
+
     def rebuild_seg_packages(self, all_preprocessed, results,
                              scores, aligns, n_best):
         """
@@ -567,6 +1057,10 @@ class ServerModel(object):
             offset += n_seg
         return rebuilt_segs, avg_scores, merged_aligns
 
+    def cache_key(self, tok, ref_tok=None):
+        """Key of a preprocessed segment in the translation cache."""
+        return (tok, ref_tok, self._cache_opt_key)
+
     def do_timeout(self):
         """Timeout function that frees GPU memory.
 
@@ -584,7 +1078,14 @@ class ServerModel(object):
 
     @critical
     def unload(self):
+        self._wait_requests()
         self.logger.info("Unloading model %d" % self.model_id)
+        with self.scheduler_lock:
+            if self.batch_scheduler is not None:
+                self.batch_scheduler.close()
+                self.batch_scheduler = None
+        if isinstance(self.translator, TranslatorReplicas):
+            self.translator.close()
         del self.translator
         if self.opt.cuda:
             torch.cuda.empty_cache()
@@ -614,12 +1115,18 @@ class ServerModel(object):
              }
         if self.tokenizers_opt is not None:
             d["tokenizer"] = self.tokenizers_opt
+        if self.cache is not None:
+            d["cache"] = self.cache.to_dict()
+        if self.replicas_opt is not None:
+            d["replicas"] = self.replicas_opt
         return d
 
     @critical
     def to_cpu(self):
         """Move the model to CPU and clear CUDA cache."""
-        if type(self.translator) == CTranslate2Translator:
+        self._wait_requests()
+        if type(self.translator) in (CTranslate2Translator,
+                                     TranslatorReplicas):
             self.translator.to_cpu()
         else:
             self.translator.model.cpu()
@@ -628,7 +1135,8 @@ class ServerModel(object):
 
     def to_gpu(self):
         """Move the model to GPU."""
-        if type(self.translator) == CTranslate2Translator:
+        if type(self.translator) in (CTranslate2Translator,
+                                     TranslatorReplicas):
             self.translator.to_gpu()
         else:
             torch.cuda.set_device(self.opt.gpu)
@@ -4,6 +4,8 @@ from __future__ import print_function
 import codecs
 import os
 import time
+import queue
+import threading
 import numpy as np
 from itertools import count, zip_longest
 
@@ -13,8 +15,11 @@ from onmt.constants import DefaultTokens
 import onmt.model_builder
 import onmt.inputters as inputters
 import onmt.decoders.ensemble
+from onmt.decoders.transformer import TransformerDecoder
+from onmt.modules import MultiHeadedAttention
 from onmt.translate.beam_search import BeamSearch, BeamSearchLM
 from onmt.translate.greedy_search import GreedySearch, GreedySearchLM
+from onmt.translate.shortlist import Shortlist
 from onmt.utils.misc import tile, set_random_seed, report_matrix
 from onmt.utils.alignment import extract_alignment, build_align_pharaoh
 from onmt.modules.copy_generator import collapse_copy_scores
@@ -100,8 +105,13 @@ class Inference(object):
             :class:`onmt.translate.greedy_search.GreedySearch`.
         random_sampling_temp (int): See
             :class:`onmt.translate.greedy_search.GreedySearch`.
+        random_sampling_topp (float): See
+            :class:`onmt.translate.greedy_search.GreedySearch`. When
+            sampling, ``n_best`` predictions are sampled for each source.
         stepwise_penalty (bool): Whether coverage penalty is applied every step
             or not.
+        early_stopping (bool): See
+            :class:`onmt.translate.beam_search.BeamSearchBase`.
         dump_beam (bool): Debugging option.
         block_ngram_repeat (int): See
             :class:`onmt.translate.decode_strategy.DecodeStrategy`.
@@ -118,6 +128,12 @@ class Inference(object):
         out_file (TextIO or codecs.StreamReaderWriter): Output file.
         report_score (bool) : Whether to report scores
         logger (logging.Logger or NoneType): Logger.
+        shortlist (onmt.translate.shortlist.Shortlist or NoneType):
+            Restricts the output vocabulary of each batch when decoding.
+        draft_model (onmt.modules.NMTModel or NoneType): Smaller model
+            proposing tokens for speculative greedy decoding.
+        draft_tokens (int): Number of tokens the draft model proposes
+            at a time.
     """
 
     def __init__(
@@ -134,7 +150,9 @@ class Inference(object):
         beam_size=30,
         random_sampling_topk=1,
         random_sampling_temp=1,
+        random_sampling_topp=0.,
         stepwise_penalty=None,
+        early_stopping=False,
         dump_beam=False,
         block_ngram_repeat=0,
         ignore_when_blocking=frozenset(),
@@ -151,6 +169,9 @@ class Inference(object):
         report_score=True,
         logger=None,
         seed=-1,
+        shortlist=None,
+        draft_model=None,
+        draft_tokens=4,
     ):
         self.model = model
         self.fields = fields
@@ -176,10 +197,14 @@ class Inference(object):
         self.beam_size = beam_size
         self.random_sampling_temp = random_sampling_temp
         self.sample_from_topk = random_sampling_topk
+        self.sample_from_topp = random_sampling_topp
+        sampling = random_sampling_topk != 1 and random_sampling_temp != 0
+        self.n_samples = n_best if sampling else 1
 
         self.min_length = min_length
         self.ratio = ratio
         self.stepwise_penalty = stepwise_penalty
+        self.early_stopping = early_stopping
         self.dump_beam = dump_beam
         self.block_ngram_repeat = block_ngram_repeat
         self.ignore_when_blocking = ignore_when_blocking
@@ -215,6 +240,16 @@ class Inference(object):
         self.use_filter_pred = False
         self._filter_pred = None
 
+        self.shortlist = shortlist
+        if self.shortlist is not None and (self.copy_attn or tgt_prefix):
+            raise ValueError(
+                "Shortlist is not compatible with copy_attn or tgt_prefix.")
+
+        self.draft_model = draft_model
+        self.draft_tokens = draft_tokens
+        if self.draft_model is not None:
+            self._validate_speculative()
+
         # for debugging
         self.beam_trace = self.dump_beam != ""
         self.beam_accum = None
@@ -260,6 +295,19 @@ class Inference(object):
         """
         # TODO: maybe add dynamic part
         cls.validate_task(model_opt.model_task)
+        shortlist = None
+        if opt.shortlist:
+            if model_opt.model_task != ModelTask.SEQ2SEQ:
+                raise ValueError(
+                    "Shortlist is only supported for seq2seq models.")
+            shortlist = Shortlist.from_opt(opt, fields)
+        draft_model = None
+        if opt.draft_model:
+            if model_opt.model_task != ModelTask.SEQ2SEQ:
+                raise ValueError(
+                    "Speculative decoding is only supported for seq2seq "
+                    "models.")
+            draft_model = cls._load_draft_model(opt, fields)
 
         src_reader = inputters.str2reader[opt.data_type].from_opt(opt)
         tgt_reader = inputters.str2reader["text"].from_opt(opt)
@@ -276,7 +324,9 @@ class Inference(object):
             beam_size=opt.beam_size,
             random_sampling_topk=opt.random_sampling_topk,
             random_sampling_temp=opt.random_sampling_temp,
+            random_sampling_topp=opt.random_sampling_topp,
             stepwise_penalty=opt.stepwise_penalty,
+            early_stopping=opt.early_stopping,
             dump_beam=opt.dump_beam,
             block_ngram_repeat=opt.block_ngram_repeat,
             ignore_when_blocking=set(opt.ignore_when_blocking),
@@ -293,8 +343,44 @@ class Inference(object):
             report_score=report_score,
             logger=logger,
             seed=opt.seed,
+            shortlist=shortlist,
+            draft_model=draft_model,
+            draft_tokens=opt.draft_tokens,
         )
 
+    @staticmethod
+    def _load_draft_model(opt, fields):
+        draft_fields, draft_model, _ = onmt.model_builder.load_test_model(
+            opt, model_path=opt.draft_model)
+        for side in ("src", "tgt"):
+            vocab = dict(fields)[side].base_field.vocab
+            draft_vocab = dict(draft_fields)[side].base_field.vocab
+            if vocab.stoi != draft_vocab.stoi:
+                raise ValueError(
+                    "Draft model must use the same vocabularies.")
+        return draft_model
+
+    def _validate_speculative(self):
+        if self.beam_size != 1 or not (
+                self.sample_from_topk == 1 or self.random_sampling_temp == 0):
+            raise ValueError(
+                "Speculative decoding requires greedy search.")
+        if self.copy_attn or self.shortlist is not None:
+            raise ValueError(
+                "Speculative decoding is not compatible with copy_attn "
+                "or shortlist.")
+        if self.draft_tokens < 1:
+            raise ValueError("draft_tokens must be at least 1.")
+        for model in (self.model, self.draft_model):
+            decoder = model.decoder
+            if type(decoder) is not TransformerDecoder or any(
+                    not isinstance(layer.self_attn, MultiHeadedAttention)
+                    or layer.self_attn.max_relative_positions > 0
+                    for layer in decoder.transformer_layers):
+                raise ValueError(
+                    "Speculative decoding requires Transformer decoders "
+                    "with absolute positions and scaled-dot self-attention.")
+
     def _log(self, msg):
         if self.logger:
             self.logger.info(msg)
@@ -358,30 +444,8 @@ class Inference(object):
         if self.tgt_prefix and tgt is None:
             raise ValueError("Prefix should be feed to tgt if -tgt_prefix.")
 
-        src_data = {"reader": self.src_reader, "data": src}
-        tgt_data = {"reader": self.tgt_reader, "data": tgt}
-        _readers, _data = inputters.Dataset.config(
-            [("src", src_data), ("tgt", tgt_data)]
-        )
-
-        data = inputters.Dataset(
-            self.fields,
-            readers=_readers,
-            data=_data,
-            sort_key=inputters.str2sortkey[self.data_type],
-            filter_pred=self._filter_pred,
-        )
-
-        data_iter = inputters.OrderedIterator(
-            dataset=data,
-            device=self._dev,
-            batch_size=batch_size,
-            batch_size_fn=max_tok_len if batch_type == "tokens" else None,
-            train=False,
-            sort=False,
-            sort_within_batch=True,
-            shuffle=False,
-        )
+        data = self._build_dataset(src, tgt)
+        data_iter = self._build_data_iter(data, batch_size, batch_type)
 
         xlation_builder = onmt.translate.TranslationBuilder(
             data,
@@ -416,95 +480,356 @@ class Inference(object):
                     gold_score_total += trans.gold_score
                     gold_words_total += len(trans.gold_sent) + 1
 
-                n_best_preds = [
-                    " ".join(pred) for pred in trans.pred_sents[: self.n_best]
-                ]
-                if self.report_align:
-                    align_pharaohs = [
-                        build_align_pharaoh(align)
-                        for align in trans.word_aligns[: self.n_best]
-                    ]
-                    n_best_preds_align = [
-                        " ".join(align) for align in align_pharaohs
-                    ]
-                    n_best_preds = [
-                        pred + DefaultTokens.ALIGNMENT_SEPARATOR + align
-                        for pred, align in zip(
-                            n_best_preds, n_best_preds_align
-                        )
-                    ]
+                n_best_preds = self._build_n_best_preds(trans)
                 all_predictions += [n_best_preds]
                 self.out_file.write("\n".join(n_best_preds) + "\n")
                 self.out_file.flush()
 
-                if self.verbose:
-                    sent_number = next(counter)
-                    output = trans.log(sent_number)
-                    if self.logger:
-                        self.logger.info(output)
-                    else:
-                        os.write(1, output.encode("utf-8"))
-
-                if attn_debug:
-                    preds = trans.pred_sents[0]
-                    preds.append(DefaultTokens.EOS)
-                    attns = trans.attns[0].tolist()
-                    if self.data_type == "text":
-                        srcs = trans.src_raw
-                    else:
-                        srcs = [str(item) for item in range(len(attns[0]))]
-                    output = report_matrix(srcs, preds, attns)
-                    if self.logger:
-                        self.logger.info(output)
-                    else:
-                        os.write(1, output.encode("utf-8"))
-
-                if align_debug:
-                    tgts = trans.pred_sents[0]
-                    align = trans.word_aligns[0].tolist()
-                    if self.data_type == "text":
-                        srcs = trans.src_raw
-                    else:
-                        srcs = [str(item) for item in range(len(align[0]))]
-                    output = report_matrix(srcs, tgts, align)
-                    if self.logger:
-                        self.logger.info(output)
-                    else:
-                        os.write(1, output.encode("utf-8"))
+                self._log_translation(
+                    trans, next(counter), attn_debug, align_debug)
 
         end_time = time.time()
 
+        self._report_totals(
+            pred_score_total, pred_words_total,
+            gold_score_total if tgt is not None else None,
+            gold_words_total, len(all_predictions), end_time - start_time)
+
+        if self.dump_beam:
+            import json
+
+            json.dump(
+                self.translator.beam_accum,
+                codecs.open(self.dump_beam, "w", "utf-8"),
+            )
+        return all_scores, all_predictions
+
+    def translate_stream(
+        self,
+        shards,
+        batch_size=None,
+        batch_type="sents",
+        attn_debug=False,
+        align_debug=False,
+        prefetch=2,
+    ):
+        """Translate ``(src, tgt)`` shards, pipelining reading, decoding
+        and writing.
+
+        A reader thread builds the datasets of up to `prefetch` upcoming
+        shards while the current one is decoded. Examples of a shard are
+        decoded sorted by length, and a writer thread puts predictions
+        back in input order before writing them to ``self.out_file``.
+        Memory use only depends on the shard size, not on the input size.
+
+        Args:
+            shards: iterable of ``(src, tgt)`` pairs, see :func:`translate()`
+            batch_size (int): size of examples per mini-batch
+            batch_type (str): "sents" or "tokens"
+            attn_debug (bool): enables the attention logging
+            align_debug (bool): enables the word alignment logging
+            prefetch (int): number of shards read ahead
+
+        Returns:
+            `int`: number of translated examples
+        """
+
+        if batch_size is None:
+            raise ValueError("batch_size must be set")
+
+        datasets = queue.Queue(maxsize=prefetch)
+        outputs = queue.Queue()
+        errors = []
+        stop = threading.Event()
+
+        def read():
+            try:
+                for src, tgt in shards:
+                    if stop.is_set():
+                        break
+                    if self.tgt_prefix and tgt is None:
+                        raise ValueError(
+                            "Prefix should be feed to tgt if -tgt_prefix.")
+                    datasets.put((self._build_dataset(src, tgt), tgt))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                datasets.put(None)
+
+        def write():
+            pending = {}
+            next_index = 0
+            try:
+                while True:
+                    item = outputs.get()
+                    if item is None:
+                        break
+                    index, lines = item
+                    pending[index] = lines
+                    while next_index in pending:
+                        self.out_file.write(pending.pop(next_index))
+                        next_index += 1
+                self.out_file.flush()
+            except Exception as e:
+                errors.append(e)
+
+        reader = threading.Thread(target=read, daemon=True)
+        writer = threading.Thread(target=write, daemon=True)
+        reader.start()
+        writer.start()
+
+        pred_score_total, pred_words_total = 0, 0
+        gold_score_total, gold_words_total = 0, 0
+        has_tgt = False
+        offset = 0
+
+        start_time = time.time()
+
+        try:
+            while True:
+                item = datasets.get()
+                if item is None:
+                    break
+                data, tgt = item
+                has_tgt = tgt is not None
+                data_iter = self._build_data_iter(
+                    data, batch_size, batch_type, sort=True)
+                xlation_builder = onmt.translate.TranslationBuilder(
+                    data,
+                    self.fields,
+                    self.n_best,
+                    self.replace_unk,
+                    tgt,
+                    self.phrase_table,
+                )
+                for batch in data_iter:
+                    batch_data = self.translate_batch(
+                        batch, data.src_vocabs, attn_debug
+                    )
+                    translations = xlation_builder.from_batch(batch_data)
+                    indices = sorted(batch.indices.tolist())
+                    for index, trans in zip(indices, translations):
+                        pred_score_total += trans.pred_scores[0]
+                        pred_words_total += len(trans.pred_sents[0])
+                        if has_tgt:
+                            gold_score_total += trans.gold_score
+                            gold_words_total += len(trans.gold_sent) + 1
+
+                        n_best_preds = self._build_n_best_preds(trans)
+                        outputs.put((offset + index,
+                                     "\n".join(n_best_preds) + "\n"))
+
+                        self._log_translation(
+                            trans, offset + index + 1,
+                            attn_debug, align_debug)
+                offset += len(data)
+        finally:
+            stop.set()
+            # let the reader out if it waits for room in the queue
+            while reader.is_alive():
+                try:
+                    datasets.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            outputs.put(None)
+            writer.join()
+
+        if len(errors) > 0:
+            raise errors[0]
+
+        end_time = time.time()
+
+        self._report_totals(
+            pred_score_total, pred_words_total,
+            gold_score_total if has_tgt else None,
+            gold_words_total, offset, end_time - start_time)
+
+        return offset
+
+    def score(
+        self,
+        src,
+        tgt,
+        batch_size=None,
+        batch_type="sents",
+        token_scores=False,
+    ):
+        """Score ``tgt`` as the output for ``src`` without decoding.
+
+        Each batch goes through a single teacher-forced pass of the model
+        and no search is run. Examples of a call are sorted by length to
+        limit padding and the scores are written to ``self.out_file`` in
+        input order, one line per example.
+
+        Args:
+            src: See :func:`self.src_reader.read()`.
+            tgt: See :func:`self.tgt_reader.read()`.
+            batch_size (int): size of examples per mini-batch
+            batch_type (str): ``"sents"`` or ``"tokens"``
+            token_scores (bool): also write the log-probability of each
+                target token (and of the final eos), after a tab.
+
+        Returns:
+            all_scores (list): sentence log-probability of each example.
+        """
+
+        if batch_size is None:
+            raise ValueError("batch_size must be set")
+
+        if tgt is None:
+            raise ValueError("tgt must be set to be scored.")
+
+        data = self._build_dataset(src, tgt)
+        data_iter = self._build_data_iter(
+            data, batch_size, batch_type, sort=True)
+
+        gold_score_total, gold_words_total = 0, 0
+        all_scores = [None] * len(data)
+        all_token_scores = [None] * len(data)
+
+        start_time = time.time()
+
+        for batch in data_iter:
+            batch_token_scores, mask = self.score_batch(
+                batch, data.src_vocabs)
+            sent_scores = batch_token_scores.sum(dim=0).tolist()
+            lengths = mask.sum(dim=0).tolist()
+            gold_words_total += sum(lengths)
+            if token_scores:
+                batch_token_scores = batch_token_scores.t().tolist()
+            for i, index in enumerate(batch.indices.tolist()):
+                all_scores[index] = sent_scores[i]
+                gold_score_total += sent_scores[i]
+                if token_scores:
+                    all_token_scores[index] = \
+                        batch_token_scores[i][:lengths[i]]
+
+        for score, tok_scores in zip(all_scores, all_token_scores):
+            line = "%.6f" % score
+            if token_scores:
+                line += "\t" + " ".join("%.6f" % s for s in tok_scores)
+            self.out_file.write(line + "\n")
+        self.out_file.flush()
+
+        end_time = time.time()
+
+        if self.report_score:
+            self._log(self._report_score(
+                "GOLD", torch.tensor(gold_score_total), gold_words_total))
+        if self.report_time:
+            total_time = end_time - start_time
+            self._log("Total scoring time (s): %f" % total_time)
+            self._log(
+                "Tokens per second: %f" % (gold_words_total / total_time)
+            )
+        return all_scores
+
+    def _build_dataset(self, src, tgt=None):
+        src_data = {"reader": self.src_reader, "data": src}
+        tgt_data = {"reader": self.tgt_reader, "data": tgt}
+        _readers, _data = inputters.Dataset.config(
+            [("src", src_data), ("tgt", tgt_data)]
+        )
+
+        return inputters.Dataset(
+            self.fields,
+            readers=_readers,
+            data=_data,
+            sort_key=inputters.str2sortkey[self.data_type],
+            filter_pred=self._filter_pred,
+        )
+
+    def _build_data_iter(self, data, batch_size, batch_type, sort=False):
+        return inputters.OrderedIterator(
+            dataset=data,
+            device=self._dev,
+            batch_size=batch_size,
+            batch_size_fn=max_tok_len if batch_type == "tokens" else None,
+            train=False,
+            sort=sort,
+            sort_within_batch=True,
+            shuffle=False,
+        )
+
+    def _build_n_best_preds(self, trans):
+        n_best_preds = [
+            " ".join(pred) for pred in trans.pred_sents[: self.n_best]
+        ]
+        if self.report_align:
+            align_pharaohs = [
+                build_align_pharaoh(align)
+                for align in trans.word_aligns[: self.n_best]
+            ]
+            n_best_preds_align = [
+                " ".join(align) for align in align_pharaohs
+            ]
+            n_best_preds = [
+                pred + DefaultTokens.ALIGNMENT_SEPARATOR + align
+                for pred, align in zip(
+                    n_best_preds, n_best_preds_align
+                )
+            ]
+        return n_best_preds
+
+    def _log_translation(self, trans, sent_number, attn_debug, align_debug):
+        if self.verbose:
+            output = trans.log(sent_number)
+            if self.logger:
+                self.logger.info(output)
+            else:
+                os.write(1, output.encode("utf-8"))
+
+        if attn_debug:
+            preds = trans.pred_sents[0]
+            preds.append(DefaultTokens.EOS)
+            attns = trans.attns[0].tolist()
+            if self.data_type == "text":
+                srcs = trans.src_raw
+            else:
+                srcs = [str(item) for item in range(len(attns[0]))]
+            output = report_matrix(srcs, preds, attns)
+            if self.logger:
+                self.logger.info(output)
+            else:
+                os.write(1, output.encode("utf-8"))
+
+        if align_debug:
+            tgts = trans.pred_sents[0]
+            align = trans.word_aligns[0].tolist()
+            if self.data_type == "text":
+                srcs = trans.src_raw
+            else:
+                srcs = [str(item) for item in range(len(align[0]))]
+            output = report_matrix(srcs, tgts, align)
+            if self.logger:
+                self.logger.info(output)
+            else:
+                os.write(1, output.encode("utf-8"))
+
+    def _report_totals(self, pred_score_total, pred_words_total,
+                       gold_score_total, gold_words_total, n_translated,
+                       total_time):
         if self.report_score:
             msg = self._report_score(
                 "PRED", pred_score_total, pred_words_total
             )
             self._log(msg)
-            if tgt is not None:
+            if gold_score_total is not None:
                 msg = self._report_score(
                     "GOLD", gold_score_total, gold_words_total
                 )
                 self._log(msg)
 
         if self.report_time:
-            total_time = end_time - start_time
             self._log("Total translation time (s): %f" % total_time)
             self._log(
                 "Average translation time (s): %f"
-                % (total_time / len(all_predictions))
+                % (total_time / n_translated)
             )
             self._log(
                 "Tokens per second: %f" % (pred_words_total / total_time)
             )
 
-        if self.dump_beam:
-            import json
-
-            json.dump(
-                self.translator.beam_accum,
-                codecs.open(self.dump_beam, "w", "utf-8"),
-            )
-        return all_scores, all_predictions
-
     def _align_pad_prediction(self, predictions, bos, pad):
         """
         Padding predictions in batch and add BOS.
@@ -561,6 +886,7 @@ class Inference(object):
         src_map=None,
         step=None,
         batch_offset=None,
+        generator=None,
     ):
         if self.copy_attn:
             # Turn any copied words into UNKs.
@@ -582,7 +908,9 @@ class Inference(object):
                 attn = dec_attn["std"]
             else:
                 attn = None
-            log_probs = self.model.generator(dec_out.squeeze(0))
+            if generator is None:
+                generator = self.model.generator
+            log_probs = generator(dec_out.squeeze(0))
             # returns [(batch_size x beam_size) , vocab ] when 1 step
             # or [ tgt_len, batch_size, vocab ] when full sentence
         else:
@@ -616,8 +944,25 @@ class Inference(object):
         """Translate a batch of sentences."""
         raise NotImplementedError
 
+    def score_batch(self, batch, src_vocabs):
+        """Score the target of a batch in a single teacher-forced pass.
+
+        Returns:
+            (`FloatTensor`, `BoolTensor`): token scores and mask of the
+            non padding target tokens, both of size ``(tgt_len, batch)``.
+        """
+        raise NotImplementedError
+
     def _score_target(
         self, batch, memory_bank, src_lengths, src_vocabs, src_map
+    ):
+        token_scores, _ = self._score_target_tokens(
+            batch, memory_bank, src_lengths, src_vocabs, src_map
+        )
+        return token_scores.sum(dim=0)
+
+    def _score_target_tokens(
+        self, batch, memory_bank, src_lengths, src_vocabs, src_map
     ):
         raise NotImplementedError
 
@@ -712,6 +1057,17 @@ class Translator(Inference):
     def translate_batch(self, batch, src_vocabs, attn_debug):
         """Translate a batch of sentences."""
         with torch.no_grad():
+            candidates = None
+            exclusion_idxs = self._exclusion_idxs
+            if self.shortlist is not None:
+                src = batch.src[0] if isinstance(batch.src, tuple) \
+                    else batch.src
+                candidates = self.shortlist.candidates(src)
+                # decoding happens in the space of the candidates
+                exclusion_idxs = {
+                    i for i, idx in enumerate(candidates.tolist())
+                    if idx in self._exclusion_idxs
+                }
             if self.beam_size == 1:
                 decode_strategy = GreedySearch(
                     pad=self._tgt_pad_idx,
@@ -721,10 +1077,12 @@ class Translator(Inference):
                     min_length=self.min_length,
                     max_length=self.max_length,
                     block_ngram_repeat=self.block_ngram_repeat,
-                    exclusion_tokens=self._exclusion_idxs,
+                    exclusion_tokens=exclusion_idxs,
                     return_attention=attn_debug or self.replace_unk,
                     sampling_temp=self.random_sampling_temp,
                     keep_topk=self.sample_from_topk,
+                    keep_topp=self.sample_from_topp,
+                    n_samples=self.n_samples,
                 )
             else:
                 # TODO: support these blacklisted features
@@ -741,12 +1099,17 @@ class Translator(Inference):
                     max_length=self.max_length,
                     return_attention=attn_debug or self.replace_unk,
                     block_ngram_repeat=self.block_ngram_repeat,
-                    exclusion_tokens=self._exclusion_idxs,
+                    exclusion_tokens=exclusion_idxs,
                     stepwise_penalty=self.stepwise_penalty,
                     ratio=self.ratio,
+                    early_stopping=self.early_stopping,
+                )
+            if self.draft_model is not None:
+                return self._translate_batch_speculative(
+                    batch, src_vocabs, decode_strategy
                 )
             return self._translate_batch_with_strategy(
-                batch, src_vocabs, decode_strategy
+                batch, src_vocabs, decode_strategy, candidates
             )
 
     def _run_encoder(self, batch):
@@ -770,7 +1133,7 @@ class Translator(Inference):
         return src, enc_states, memory_bank, src_lengths
 
     def _translate_batch_with_strategy(
-        self, batch, src_vocabs, decode_strategy
+        self, batch, src_vocabs, decode_strategy, candidates=None
     ):
         """Translate a batch of sentences step by step using cache.
 
@@ -779,6 +1142,9 @@ class Translator(Inference):
             src_vocabs (list): list of torchtext.data.Vocab if can_copy.
             decode_strategy (DecodeStrategy): A decode strategy to use for
                 generate translation step by step.
+            candidates (LongTensor or NoneType): target ids to decode
+                with, see :class:`onmt.translate.shortlist.Shortlist`.
+                The strategy then works with positions in `candidates`.
 
         Returns:
             results (dict): The translation results.
@@ -787,6 +1153,10 @@ class Translator(Inference):
         use_src_map = self.copy_attn
         parallel_paths = decode_strategy.parallel_paths  # beam_size
         batch_size = batch.batch_size
+        generator = None
+        if candidates is not None:
+            generator = Shortlist.slice_generator(
+                self.model.generator, candidates)
 
         # (1) Run the encoder on the src.
         src, enc_states, memory_bank, src_lengths = self._run_encoder(batch)
@@ -820,6 +1190,8 @@ class Translator(Inference):
         # (3) Begin decoding step by step:
         for step in range(decode_strategy.max_length):
             decoder_input = decode_strategy.current_predictions.view(1, -1, 1)
+            if candidates is not None:
+                decoder_input = candidates[decoder_input]
 
             log_probs, attn = self._decode_and_generate(
                 decoder_input,
@@ -830,6 +1202,7 @@ class Translator(Inference):
                 src_map=src_map,
                 step=step,
                 batch_offset=decode_strategy.batch_offset,
+                generator=generator,
             )
 
             decode_strategy.advance(log_probs, attn)
@@ -860,6 +1233,12 @@ class Translator(Inference):
                     lambda state, dim: state.index_select(dim, select_indices)
                 )
 
+        if candidates is not None:
+            decode_strategy.predictions = [
+                [candidates[pred] for pred in preds]
+                for preds in decode_strategy.predictions
+            ]
+
         return self.report_results(
             gold_score,
             batch,
@@ -871,7 +1250,146 @@ class Translator(Inference):
             decode_strategy,
         )
 
-    def _score_target(
+    def _translate_batch_speculative(self, batch, src_vocabs, decode_strategy):
+        """Greedy decoding where the draft model proposes
+        ``self.draft_tokens`` tokens at a time, which the model checks in
+        a single teacher-forced pass.
+
+        Every token is still picked by `decode_strategy` from the scores
+        of the model, and only the proposals it agrees with are kept, so
+        predictions are the ones of plain greedy decoding.
+
+        Args:
+            batch: a batch of sentences, yield by data iterator.
+            src_vocabs (list): list of torchtext.data.Vocab if can_copy.
+            decode_strategy (GreedySearch): the greedy search to drive.
+
+        Returns:
+            results (dict): The translation results.
+        """
+        batch_size = batch.batch_size
+
+        # (1) Run the encoders on the src.
+        src, enc_states, memory_bank, src_lengths = self._run_encoder(batch)
+        self.model.decoder.init_state(src, memory_bank, enc_states)
+
+        gold_score = self._gold_score(
+            batch,
+            memory_bank,
+            src_lengths,
+            src_vocabs,
+            False,
+            enc_states,
+            batch_size,
+            src,
+        )
+
+        draft_enc_states, draft_memory_bank, _ = self.draft_model.encoder(
+            src, src_lengths
+        )
+        self.draft_model.decoder.init_state(
+            src, draft_memory_bank, draft_enc_states
+        )
+
+        # (2) prep decode_strategy.
+        target_prefix = batch.tgt if self.tgt_prefix else None
+        _, memory_bank, memory_lengths, _ = decode_strategy.initialize(
+            memory_bank, src_lengths, target_prefix=target_prefix
+        )
+
+        # number of target positions in the draft decoder cache, the
+        # model caches all but the last prediction
+        draft_len = 0
+        while not decode_strategy.done:
+            alive_seq = decode_strategy.alive_seq
+            pos = alive_seq.size(1) - 1
+
+            # (3) Draft the next tokens step by step.
+            draft_in = alive_seq[:, draft_len:]
+            drafts = []
+            for _ in range(self.draft_tokens):
+                dec_out, _ = self.draft_model.decoder(
+                    draft_in.t().unsqueeze(-1),
+                    draft_memory_bank,
+                    memory_lengths=memory_lengths,
+                    step=draft_len,
+                )
+                draft_len += draft_in.size(1)
+                draft_in = self.draft_model.generator(dec_out[-1]).argmax(
+                    dim=-1, keepdim=True
+                )
+                drafts.append(draft_in)
+            drafts = torch.cat(drafts, dim=1)
+
+            # (4) Score the last prediction and the drafts at once.
+            log_probs, attn = self._decode_and_generate(
+                torch.cat([alive_seq[:, -1:], drafts], 1).t().unsqueeze(-1),
+                memory_bank,
+                batch,
+                src_vocabs,
+                memory_lengths=memory_lengths,
+                step=pos,
+            )
+
+            # (5) Advance while the picked tokens are the drafted ones.
+            rows = torch.arange(drafts.size(0), device=drafts.device)
+            for i in range(self.draft_tokens + 1):
+                decode_strategy.advance(
+                    log_probs[i, rows],
+                    attn[i:i + 1, rows] if attn is not None else None,
+                )
+                accepted = i < self.draft_tokens and \
+                    decode_strategy.current_predictions.eq(drafts[rows, i])
+                if decode_strategy.is_finished.any():
+                    decode_strategy.update_finished()
+                    if decode_strategy.done:
+                        break
+                    rows = rows[decode_strategy.select_indices]
+                    if i < self.draft_tokens:
+                        accepted = accepted[decode_strategy.select_indices]
+                if i == self.draft_tokens or not accepted.all():
+                    break
+            if decode_strategy.done:
+                break
+
+            # (6) Drop the cache of rejected drafts and finished sentences.
+            self.model.decoder.truncate_cache(pos + i + 1)
+            draft_len = min(draft_len, pos + i + 1)
+            self.draft_model.decoder.truncate_cache(draft_len)
+            if rows.size(0) < drafts.size(0):
+                memory_bank = memory_bank.index_select(1, rows)
+                draft_memory_bank = draft_memory_bank.index_select(1, rows)
+                memory_lengths = memory_lengths.index_select(0, rows)
+                for decoder in (self.model.decoder, self.draft_model.decoder):
+                    decoder.map_state(
+                        lambda state, dim: state.index_select(dim, rows)
+                    )
+
+        return self.report_results(
+            gold_score,
+            batch,
+            batch_size,
+            src,
+            src_lengths,
+            src_vocabs,
+            False,
+            decode_strategy,
+        )
+
+    def score_batch(self, batch, src_vocabs):
+        with torch.no_grad():
+            src, enc_states, memory_bank, src_lengths = self._run_encoder(
+                batch)
+            self.model.decoder.init_state(src, memory_bank, enc_states)
+            return self._score_target_tokens(
+                batch,
+                memory_bank,
+                src_lengths,
+                src_vocabs,
+                batch.src_map if self.copy_attn else None,
+            )
+
+    def _score_target_tokens(
         self, batch, memory_bank, src_lengths, src_vocabs, src_map
     ):
         tgt = batch.tgt
@@ -888,10 +1406,9 @@ class Translator(Inference):
 
         log_probs[:, :, self._tgt_pad_idx] = 0
         gold = tgt[1:]
-        gold_scores = log_probs.gather(2, gold)
-        gold_scores = gold_scores.sum(dim=0).view(-1)
+        token_scores = log_probs.gather(2, gold).squeeze(2)
 
-        return gold_scores
+        return token_scores, gold.squeeze(2).ne(self._tgt_pad_idx)
 
 
 class GeneratorLM(Inference):
@@ -920,16 +1437,7 @@ class GeneratorLM(Inference):
         align_debug=False,
         phrase_table="",
     ):
-        if batch_size != 1:
-            warning_msg = ("GeneratorLM does not support batch_size != 1"
-                           " nicely. You can remove this limitation here."
-                           " With batch_size > 1 the end of each input is"
-                           " repeated until the input is finished. Then"
-                           " generation will start.")
-            if self.logger:
-                self.logger.info(warning_msg)
-            else:
-                os.write(1, warning_msg.encode("utf-8"))
+        self._warn_batch_size(batch_size)
 
         return super(GeneratorLM, self).translate(
             src,
@@ -941,6 +1449,38 @@ class GeneratorLM(Inference):
             phrase_table=phrase_table,
         )
 
+    def translate_stream(
+        self,
+        shards,
+        batch_size=None,
+        batch_type="sents",
+        attn_debug=False,
+        align_debug=False,
+        prefetch=2,
+    ):
+        self._warn_batch_size(batch_size)
+
+        return super(GeneratorLM, self).translate_stream(
+            shards,
+            batch_size=1,
+            batch_type=batch_type,
+            attn_debug=attn_debug,
+            align_debug=align_debug,
+            prefetch=prefetch,
+        )
+
+    def _warn_batch_size(self, batch_size):
+        if batch_size != 1:
+            warning_msg = ("GeneratorLM does not support batch_size != 1"
+                           " nicely. You can remove this limitation here."
+                           " With batch_size > 1 the end of each input is"
+                           " repeated until the input is finished. Then"
+                           " generation will start.")
+            if self.logger:
+                self.logger.info(warning_msg)
+            else:
+                os.write(1, warning_msg.encode("utf-8"))
+
     def translate_batch(self, batch, src_vocabs, attn_debug):
         """Translate a batch of sentences."""
         with torch.no_grad():
@@ -957,6 +1497,8 @@ class GeneratorLM(Inference):
                     return_attention=attn_debug or self.replace_unk,
                     sampling_temp=self.random_sampling_temp,
                     keep_topk=self.sample_from_topk,
+                    keep_topp=self.sample_from_topp,
+                    n_samples=self.n_samples,
                 )
             else:
                 # TODO: support these blacklisted features
@@ -976,6 +1518,7 @@ class GeneratorLM(Inference):
                     exclusion_tokens=self._exclusion_idxs,
                     stepwise_penalty=self.stepwise_penalty,
                     ratio=self.ratio,
+                    early_stopping=self.early_stopping,
                 )
             return self._translate_batch_with_strategy(
                 batch, src_vocabs, decode_strategy
@@ -1107,7 +1650,22 @@ class GeneratorLM(Inference):
             decode_strategy,
         )
 
-    def _score_target(
+    def score_batch(self, batch, src_vocabs):
+        with torch.no_grad():
+            src, src_lengths = (
+                batch.src if isinstance(batch.src, tuple)
+                else (batch.src, None)
+            )
+            self.model.decoder.init_state(src, None, None)
+            return self._score_target_tokens(
+                batch,
+                None,
+                src_lengths,
+                src_vocabs,
+                batch.src_map if self.copy_attn else None,
+            )
+
+    def _score_target_tokens(
         self, batch, memory_bank, src_lengths, src_vocabs, src_map
     ):
         tgt = batch.tgt
@@ -1125,7 +1683,6 @@ class GeneratorLM(Inference):
         )
 
         log_probs[:, :, self._tgt_pad_idx] = 0
-        gold_scores = log_probs.gather(2, tgt)
-        gold_scores = gold_scores.sum(dim=0).view(-1)
+        token_scores = log_probs.gather(2, tgt).squeeze(2)
 
-        return gold_scores
+        return token_scores, tgt.squeeze(2).ne(self._tgt_pad_idx)
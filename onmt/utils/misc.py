@@ -87,6 +87,24 @@ def tile(x, count, dim=0):
     return x
 
 
+def rank_in_groups(keys, groups, n_groups):
+    """Rank of each of `keys` among the keys of the same group.
+
+    Args:
+        keys (numpy.ndarray): sort keys in ``[0, 1]``, e.g. uniform random
+            numbers.
+        groups (numpy.ndarray): group id in ``[0, n_groups)`` of each key.
+        n_groups (int): number of groups.
+    """
+    # one float sort is much faster than np.lexsort((keys, groups))
+    order = np.argsort(groups * 2.0 + keys)
+    counts = np.bincount(groups, minlength=n_groups)
+    group_starts = np.cumsum(counts) - counts
+    ranks = np.empty(len(keys), dtype=np.int64)
+    ranks[order] = np.arange(len(keys)) - group_starts[groups[order]]
+    return ranks
+
+
 def use_gpu(opt):
     """
     Creates a boolean if gpu used
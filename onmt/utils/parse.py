@@ -4,7 +4,7 @@ import torch
 
 import onmt.opts as opts
 from onmt.utils.logging import logger
-from onmt.constants import CorpusName, ModelTask
+from onmt.constants import CorpusName, ModelTask, LangVocab
 from onmt.transforms import AVAILABLE_TRANSFORMS
 
 
@@ -17,6 +17,41 @@ class DataOptsCheckerMixin(object):
         if not os.path.isfile(file_path):
             raise IOError(f"Please check path of your {info} file!")
 
+    @classmethod
+    def _expand_corpora(cls, corpora):
+        """Replace corpora with a `path_corpora` manifest, such as the
+        one written by back-translation, with the corpora it lists. They
+        inherit the other settings of the corpus, but share its weight:
+        sampling them is as likely as sampling the corpus itself."""
+        import yaml
+        expanded = {}
+        for cname, corpus in corpora.items():
+            path_corpora = corpus.pop('path_corpora', None)
+            if path_corpora is None:
+                expanded[cname] = corpus
+                continue
+            cls._validate_file(path_corpora, info=f'{cname}/path_corpora')
+            with open(path_corpora) as f:
+                listed = yaml.safe_load(f) or {}
+            # not a corpus: back-translation settings, see backtranslate.py
+            listed.pop('settings', None)
+            if len(listed) == 0:
+                logger.warning(f"Corpus {cname} lists no corpora.")
+                continue
+            weight = int(corpus.get('weight', 1))
+            if weight < len(listed):
+                raise ValueError(
+                    f"Corpus {cname} lists {len(listed)} corpora, its weight"
+                    f" {weight} can't be split across them: it should be at"
+                    f" least {len(listed)}.")
+            # spread the remainder over the first corpora listed
+            share, remainder = divmod(weight, len(listed))
+            for i, (sub_cname, sub_corpus) in enumerate(listed.items()):
+                expanded[f'{cname}_{sub_cname}'] = {
+                    **corpus, **sub_corpus,
+                    'weight': share + (1 if i < remainder else 0)}
+        return expanded
+
     @classmethod
     def _validate_data(cls, opt):
         """Parse corpora specified in data field of YAML file."""
@@ -24,7 +59,7 @@ class DataOptsCheckerMixin(object):
         default_transforms = opt.transforms
         if len(default_transforms) != 0:
             logger.info(f"Default transforms: {default_transforms}.")
-        corpora = yaml.safe_load(opt.data)
+        corpora = cls._expand_corpora(yaml.safe_load(opt.data))
 
         for cname, corpus in corpora.items():
             # Check Transforms
@@ -107,15 +142,28 @@ class DataOptsCheckerMixin(object):
     @classmethod
     def _validate_fields_opts(cls, opt, build_vocab_only=False):
         """Check options relate to vocab and fields."""
+        lang_vocab = LangVocab.PLACEHOLDER in opt.src_vocab
+        if lang_vocab:
+            langs = set()
+            for cname, corpus in opt.data.items():
+                if not corpus.get('src_lang') or not corpus.get('tgt_lang'):
+                    raise ValueError(f'Corpus {cname} src_lang and tgt_lang '
+                                     'are required with per-language vocab.')
+                langs.update([corpus['src_lang'], corpus['tgt_lang']])
         if build_vocab_only:
-            if not opt.share_vocab:
+            if not opt.share_vocab and not lang_vocab:
                 assert opt.tgt_vocab, \
                     "-tgt_vocab is required if not -share_vocab."
             return
         # validation when train:
-        cls._validate_file(opt.src_vocab, info='src vocab')
-        if not opt.share_vocab:
-            cls._validate_file(opt.tgt_vocab, info='tgt vocab')
+        if lang_vocab:
+            for lang in sorted(langs):
+                cls._validate_file(opt.src_vocab.replace(
+                    LangVocab.PLACEHOLDER, lang), info=f'{lang} vocab')
+        else:
+            cls._validate_file(opt.src_vocab, info='src vocab')
+            if not opt.share_vocab:
+                cls._validate_file(opt.tgt_vocab, info='tgt vocab')
 
         if opt.dump_fields or opt.dump_transforms:
             assert opt.save_data, "-save_data should be set if set \
@@ -291,3 +339,38 @@ class ArgumentParser(cfargparse.ArgumentParser, DataOptsCheckerMixin):
     def validate_translate_opts(cls, opt):
         if opt.beam_size != 1 and opt.random_sampling_topk != 1:
             raise ValueError('Can either do beam search OR random sampling.')
+        if not 0 <= opt.random_sampling_topp < 1:
+            raise ValueError('-random_sampling_topp should be in [0, 1).')
+        if opt.random_sampling_topp > 0 and opt.random_sampling_topk == 1:
+            raise ValueError('-random_sampling_topp requires random '
+                             'sampling, set -random_sampling_topk.')
+        if opt.num_workers > 1:
+            if opt.gpu > -1:
+                raise ValueError('-num_workers is only supported on CPU.')
+            # workers only send back scores and predictions
+            unsupported = [name for name in
+                           ['verbose', 'attn_debug', 'align_debug']
+                           if getattr(opt, name)]
+            if opt.tgt is not None and not opt.tgt_prefix:
+                unsupported.append('tgt')
+            if len(unsupported) > 0:
+                raise ValueError(
+                    '-num_workers does not support %s.'
+                    % ', '.join('-' + name for name in unsupported))
+        if opt.stream and opt.dump_beam:
+            raise ValueError('-dump_beam is not supported with -stream.')
+
+    @classmethod
+    def validate_backtranslate_opts(cls, opt):
+        if opt.shard_size <= 0:
+            raise ValueError('-shard_size should be positive to '
+                             'back-translate.')
+        if opt.tgt is not None or opt.tgt_prefix:
+            raise ValueError('-tgt is not used to back-translate.')
+
+    @classmethod
+    def validate_score_opts(cls, opt):
+        if opt.tgt is None:
+            raise ValueError('-tgt is required to score.')
+        if opt.num_workers > 1:
+            raise ValueError('-num_workers is not supported to score.')
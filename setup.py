@@ -32,11 +32,19 @@ setup(
         "pyonmttok>=1.23,<2;platform_system=='Linux' or platform_system=='Darwin'",
         "pyyaml==5.3.1",
     ],
+    extras_require={
+        "async": ["aiohttp>=3.6,<4"],
+    },
     entry_points={
         "console_scripts": [
             "onmt_server=onmt.bin.server:main",
+            "onmt_server_async=onmt.bin.server_async:main",
             "onmt_train=onmt.bin.train:main",
             "onmt_translate=onmt.bin.translate:main",
+            "onmt_score=onmt.bin.score:main",
+            "onmt_backtranslate=onmt.bin.backtranslate:main",
+            "onmt_benchmark_precision=onmt.bin.benchmark_precision:main",
+            "onmt_benchmark_bart_noise=onmt.bin.benchmark_bart_noise:main",
             "onmt_release_model=onmt.bin.release_model:main",
             "onmt_average_models=onmt.bin.average_models:main",
             "onmt_build_vocab=onmt.bin.build_vocab:main"
@@ -21,16 +21,36 @@ import io
 import argparse
 import json
 import re
-from collections import defaultdict
+import multiprocessing
+from collections import OrderedDict, defaultdict
 
 # hack for python2/3 compatibility
 from io import open
 argparse.open = open
 
 
+class LRUCache(OrderedDict):
+    """Cache dict keeping its `maxsize` most recently used entries."""
+
+    def __init__(self, maxsize=100000):
+        super(LRUCache, self).__init__()
+        self.maxsize = maxsize
+
+    def __getitem__(self, key):
+        value = super(LRUCache, self).__getitem__(key)
+        self.move_to_end(key)
+        return value
+
+    def __setitem__(self, key, value):
+        super(LRUCache, self).__setitem__(key, value)
+        if len(self) > self.maxsize:
+            self.popitem(last=False)
+
+
 class BPE(object):
 
-    def __init__(self, codes, separator='@@', vocab=None, glossaries=None):
+    def __init__(self, codes, separator='@@', vocab=None, glossaries=None,
+                 cache_size=100000):
 
         # check version information
         firstline = codes.readline()
@@ -56,7 +76,7 @@ class BPE(object):
 
         self.glossaries = glossaries if glossaries else []
 
-        self.cache = {}
+        self.cache = LRUCache(cache_size)
 
     def segment(self, sentence):
         """segment single sentence (whitespace-tokenized string) with BPE encoding"""
@@ -114,6 +134,17 @@ def create_parser():
         '--vocabulary-threshold', type=int, default=None,
         metavar="INT",
         help="Vocabulary threshold. If vocabulary is provided, any word with frequency < threshold will be treated as OOV")
+    parser.add_argument(
+        '--num-workers', type=int, default=1, metavar="INT",
+        help="Number of processes segmenting chunks of the input in parallel. "
+             "The output keeps the input order (default: %(default)s)")
+    parser.add_argument(
+        '--chunk-size', type=int, default=10000, metavar="INT",
+        help="Number of lines of each chunk with --num-workers (default: %(default)s)")
+    parser.add_argument(
+        '--cache-size', type=int, default=100000, metavar="INT",
+        help="Number of most recent words whose segmentation is cached, "
+             "in each process (default: %(default)s)")
     parser.add_argument(
         '--glossaries', type=str, nargs='+', default=None,
         metavar="STR",
@@ -123,6 +154,49 @@ def create_parser():
     return parser
 
 
+_worker_bpe = None
+
+
+def _init_worker(bpe):
+    global _worker_bpe
+    _worker_bpe = bpe
+
+
+def _segment_chunk(lines):
+    return [_worker_bpe.segment(line).strip() + '\n' for line in lines]
+
+
+def _read_chunks(infile, chunk_size):
+    chunk = []
+    for line in infile:
+        chunk.append(line)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def segment_parallel(bpe, infile, outfile, num_workers, chunk_size=10000):
+    """Segment `infile` to `outfile` with `num_workers` processes.
+
+    Chunks of `chunk_size` lines are segmented in parallel and written in
+    input order. At most two chunks per worker are in flight, so memory
+    does not grow with the input.
+    """
+    pool = multiprocessing.Pool(num_workers, _init_worker, (bpe,))
+    try:
+        pending = []
+        for chunk in _read_chunks(infile, chunk_size):
+            pending.append(pool.apply_async(_segment_chunk, (chunk,)))
+            if len(pending) >= 2 * num_workers:
+                outfile.writelines(pending.pop(0).get())
+        for result in pending:
+            outfile.writelines(result.get())
+    finally:
+        pool.terminate()
+
+
 def get_pairs(word):
     """Return set of symbol pairs in a word.
 
@@ -318,8 +392,13 @@ if __name__ == '__main__':
     else:
         vocabulary = None
 
-    bpe = BPE(args.codes, args.separator, vocabulary, args.glossaries)
+    bpe = BPE(args.codes, args.separator, vocabulary, args.glossaries,
+              cache_size=args.cache_size)
 
-    for line in args.input:
-        args.output.write(bpe.segment(line).strip())
-        args.output.write('\n')
+    if args.num_workers > 1:
+        segment_parallel(bpe, args.input, args.output, args.num_workers,
+                         args.chunk_size)
+    else:
+        for line in args.input:
+            args.output.write(bpe.segment(line).strip())
+            args.output.write('\n')
@@ -12,13 +12,14 @@ Rico Sennrich, Barry Haddow and Alexandra Birch (2016). Neural Machine Translati
 Proceedings of the 54th Annual Meeting of the Association for Computational Linguistics (ACL 2016). Berlin, Germany.
 """
 # This file is retrieved from https://github.com/rsennrich/subword-nmt
+# The pair statistics are integer-encoded, indexed and kept in a priority
+# queue, so that each merge only updates the words containing the pair.
 
 from __future__ import unicode_literals
 
 import sys
 import codecs
-import re
-import copy
+import heapq
 import argparse
 from collections import defaultdict, Counter
 
@@ -70,128 +71,114 @@ def get_vocabulary(fobj, is_dict=False):
     return vocab
 
 
-def update_pair_statistics(pair, changed, stats, indices):
-    """Minimally update the indices and frequency of symbol pairs
+class _Desc(object):
+    """Reverse the order of `key`, so that a min-heap pops the largest pair
+    of symbols first among pairs of the same frequency."""
+    __slots__ = ('key',)
 
-    if we merge a pair of symbols, only pairs that overlap with occurrences
-    of this pair are affected, and need to be updated.
-    """
-    stats[pair] = 0
-    indices[pair] = defaultdict(int)
-    first, second = pair
-    new_pair = first + second
-    for j, word, old_word, freq in changed:
-
-        # find all instances of pair, and update frequency/indices around it
-        i = 0
-        while True:
-            # find first symbol
-            try:
-                i = old_word.index(first, i)
-            except ValueError:
-                break
-            # if first symbol is followed by second symbol, we've found an occurrence of pair (old_word[i:i+2])
-            if i < len(old_word) - 1 and old_word[i + 1] == second:
-                # assuming a symbol sequence "A B C", if "B C" is merged, reduce the frequency of "A B"
-                if i:
-                    prev = old_word[i - 1:i + 1]
-                    stats[prev] -= freq
-                    indices[prev][j] -= 1
-                if i < len(old_word) - 2:
-                    # assuming a symbol sequence "A B C B", if "B C" is merged, reduce the frequency of "C B".
-                    # however, skip this if the sequence is A B C B C, because the frequency of "C B" will be reduced by the previous code block
-                    if old_word[i + 2] != first or i >= len(old_word) - 3 or old_word[i + 3] != second:
-                        nex = old_word[i + 1:i + 3]
-                        stats[nex] -= freq
-                        indices[nex][j] -= 1
-                i += 2
-            else:
-                i += 1
-
-        i = 0
-        while True:
-            try:
-                # find new pair
-                i = word.index(new_pair, i)
-            except ValueError:
-                break
-            # assuming a symbol sequence "A BC D", if "B C" is merged, increase the frequency of "A BC"
-            if i:
-                prev = word[i - 1:i + 1]
-                stats[prev] += freq
-                indices[prev][j] += 1
-            # assuming a symbol sequence "A BC B", if "B C" is merged, increase the frequency of "BC B"
-            # however, if the sequence is A BC BC, skip this step because the count of "BC BC" will be incremented by the previous code block
-            if i < len(word) - 1 and word[i + 1] != new_pair:
-                nex = word[i:i + 2]
-                stats[nex] += freq
-                indices[nex][j] += 1
-            i += 1
-
-
-def get_pair_statistics(vocab):
-    """Count frequency of all symbol pairs, and create index"""
-
-    # data structure of pair frequencies
-    stats = defaultdict(int)
-
-    # index from pairs to words
-    indices = defaultdict(lambda: defaultdict(int))
-
-    for i, (word, freq) in enumerate(vocab):
-        prev_char = word[0]
-        for char in word[1:]:
-            stats[prev_char, char] += freq
-            indices[prev_char, char][i] += 1
-            prev_char = char
-
-    return stats, indices
-
-
-def replace_pair(pair, vocab, indices):
-    """Replace all occurrences of a symbol pair ('A', 'B') with a new symbol 'AB'"""
-    first, second = pair
-    pair_str = ''.join(pair)
-    pair_str = pair_str.replace('\\', '\\\\')
-    changes = []
-    pattern = re.compile(
-        r'(?<!\S)' + re.escape(first + ' ' + second) + r'(?!\S)')
-    if sys.version_info < (3, 0):
-        iterator = indices[pair].iteritems()
-    else:
-        iterator = indices[pair].items()
-    for j, freq in iterator:
-        if freq < 1:
-            continue
-        word, freq = vocab[j]
-        new_word = ' '.join(word)
-        new_word = pattern.sub(pair_str, new_word)
-        new_word = tuple(new_word.split())
+    def __init__(self, key):
+        self.key = key
 
-        vocab[j] = (new_word, freq)
-        changes.append((j, new_word, word, freq))
+    def __lt__(self, other):
+        return other.key < self.key
 
-    return changes
+    def __eq__(self, other):
+        return self.key == other.key
 
 
-def prune_stats(stats, big_stats, threshold):
-    """Prune statistics dict for efficiency of max()
+class PairStatistics(object):
+    """Frequencies of the symbol pairs of an integer-encoded vocabulary.
 
-    The frequency of a symbol pair never increases, so pruning is generally safe
-    (until we the most frequent pair is less frequent than a pair we previously pruned)
-    big_stats keeps full statistics for when we need to access pruned items
+    Each pair is indexed to the words containing it, so that merging a
+    pair only updates these words, and a priority queue of pair
+    frequencies gives the most frequent pair. Queue entries are updated
+    lazily: entries whose frequency has since decreased are pushed again
+    with their current frequency when popped.
     """
-    for item, freq in list(stats.items()):
-        if freq < threshold:
-            del stats[item]
-            if freq < 0:
-                big_stats[item] += freq
-            else:
-                big_stats[item] = freq
+
+    def __init__(self, vocab):
+        self.symbols = []
+        self.symbol_ids = {}
+        self.words = []
+        self.freqs = []
+        self.counts = defaultdict(int)
+        self.where = defaultdict(set)
+        for word, freq in vocab.items():
+            j = len(self.words)
+            ids = [self.symbol_id(symbol) for symbol in word]
+            self.words.append(ids)
+            self.freqs.append(freq)
+            for pair in zip(ids, ids[1:]):
+                self.counts[pair] += freq
+                self.where[pair].add(j)
+        self.heap = [self._entry(pair) for pair in self.counts]
+        heapq.heapify(self.heap)
+
+    def symbol_id(self, symbol):
+        if symbol not in self.symbol_ids:
+            self.symbol_ids[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+        return self.symbol_ids[symbol]
+
+    def _entry(self, pair):
+        strings = (self.symbols[pair[0]], self.symbols[pair[1]])
+        return (-self.counts[pair], _Desc(strings), pair)
+
+    def most_frequent(self):
+        """Return the most frequent pair and its frequency, or None."""
+        while self.heap:
+            neg_count, _, pair = self.heap[0]
+            count = self.counts.get(pair, 0)
+            if count == -neg_count:
+                return pair, count
+            heapq.heappop(self.heap)
+            if count > 0:
+                heapq.heappush(self.heap, self._entry(pair))
+        return None
+
+    def merge(self, pair):
+        """Replace all occurrences of `pair` by a new symbol, left to right,
+        and update the frequencies of the pairs of the changed words."""
+        first, second = pair
+        new_id = self.symbol_id(self.symbols[first] + self.symbols[second])
+        increased = set()
+        for j in self.where.pop(pair, ()):
+            word, freq = self.words[j], self.freqs[j]
+            new_word = []
+            i = 0
+            while i < len(word):
+                if i < len(word) - 1 and word[i] == first \
+                        and word[i + 1] == second:
+                    new_word.append(new_id)
+                    i += 2
+                else:
+                    new_word.append(word[i])
+                    i += 1
+            old_pairs = list(zip(word, word[1:]))
+            new_pairs = list(zip(new_word, new_word[1:]))
+            for old_pair in old_pairs:
+                self.counts[old_pair] -= freq
+            for new_pair in new_pairs:
+                self.counts[new_pair] += freq
+                if new_id in new_pair:
+                    increased.add(new_pair)
+            for old_pair in set(old_pairs).difference(new_pairs):
+                if old_pair != pair:
+                    self.where[old_pair].discard(j)
+            for new_pair in new_pairs:
+                self.where[new_pair].add(j)
+            self.words[j] = new_word
+        self.counts.pop(pair, None)
+        for new_pair in increased:
+            heapq.heappush(self.heap, self._entry(new_pair))
+        return new_id
 
 
 def main(infile, outfile, num_symbols, min_frequency=2, verbose=False, is_dict=False):
     """Learn num_symbols BPE operations from vocabulary, and write to outfile.
+
+    At each step, the most frequent pair is merged, ties going to the
+    largest pair of symbols.
     """
 
     # version 0.2 changes the handling of the end-of-word token ('</w>');
@@ -201,39 +188,22 @@ def main(infile, outfile, num_symbols, min_frequency=2, verbose=False, is_dict=F
     vocab = get_vocabulary(infile, is_dict)
     vocab = dict([(tuple(x[:-1]) + (x[-1] + '</w>',), y)
                   for (x, y) in vocab.items()])
-    sorted_vocab = sorted(vocab.items(), key=lambda x: x[1], reverse=True)
+    stats = PairStatistics(vocab)
 
-    stats, indices = get_pair_statistics(sorted_vocab)
-    big_stats = copy.deepcopy(stats)
-    # threshold is inspired by Zipfian assumption, but should only affect speed
-    threshold = max(stats.values()) / 10
     for i in range(num_symbols):
-        if stats:
-            most_frequent = max(stats, key=lambda x: (stats[x], x))
-
-        # we probably missed the best pair because of pruning; go back to full statistics
-        if not stats or (i and stats[most_frequent] < threshold):
-            prune_stats(stats, big_stats, threshold)
-            stats = copy.deepcopy(big_stats)
-            most_frequent = max(stats, key=lambda x: (stats[x], x))
-            # threshold is inspired by Zipfian assumption, but should only affect speed
-            threshold = stats[most_frequent] * i / (i + 10000.0)
-            prune_stats(stats, big_stats, threshold)
-
-        if stats[most_frequent] < min_frequency:
+        best = stats.most_frequent()
+        if best is None or best[1] < min_frequency:
             sys.stderr.write(
                 'no pair has frequency >= {0}. Stopping\n'.format(min_frequency))
             break
+        pair, freq = best
+        first, second = stats.symbols[pair[0]], stats.symbols[pair[1]]
 
         if verbose:
             sys.stderr.write('pair {0}: {1} {2} -> {1}{2} (frequency {3})\n'.format(
-                i, most_frequent[0], most_frequent[1], stats[most_frequent]))
-        outfile.write('{0} {1}\n'.format(*most_frequent))
-        changes = replace_pair(most_frequent, sorted_vocab, indices)
-        update_pair_statistics(most_frequent, changes, stats, indices)
-        stats[most_frequent] = 0
-        if not i % 100:
-            prune_stats(stats, big_stats, threshold)
+                i, first, second, freq))
+        outfile.write('{0} {1}\n'.format(first, second))
+        stats.merge(pair)
 
 
 if __name__ == '__main__':